@@ -22,34 +22,297 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
+import heapq
+import itertools
 import logging
+import os
 import threading
+import time
 import traceback
+from collections import namedtuple
+from typing import Callable, Dict, Hashable, List, Optional
 
 from gi.repository import GLib
 
+# Lower value runs first, like GLib source priorities
+PRIORITY_INTERACTIVE = -100
+PRIORITY_DEFAULT = 0
+PRIORITY_BACKGROUND = 100
 
-class GObjectWorker:
+TaskMetrics = namedtuple('TaskMetrics', ['calls', 'failed', 'cancelled', 'total_time', 'max_time', 'total_wait'])
 
-    @staticmethod
-    def call(command, args=(), callback=None, errorback=None):
-        def run(data):
-            command, args, callback, errorback = data
+
+class Task:
+    """A call queued in the `WorkerPool`.
+
+    Callbacks and errorbacks are invoked on the GLib main loop. Identical calls
+    submitted while the task is queued or running share the task and all their
+    callbacks are invoked with the same result.
+    """
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    FINISHED = 'finished'
+    CANCELLED = 'cancelled'
+
+    def __init__(self, pool: 'WorkerPool', command: Callable, args: tuple, priority: int,
+                 key: Optional[Hashable]):
+        self.pool = pool
+        self.command = command
+        self.args = args
+        self.priority = priority
+        self.key = key
+        self.name = getattr(command, '__qualname__', repr(command))
+        self.state = Task.PENDING
+        self.callbacks: List[tuple] = []
+        self.submitted = time.monotonic()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self._result = None
+        self._error: Optional[Exception] = None
+        self._done = threading.Event()
+
+    def __repr__(self):
+        return f'<Task {self.name} {self.state}>'
+
+    @property
+    def wait_time(self) -> float:
+        """Seconds the task spent in the queue.
+        """
+        return (self.started or time.monotonic()) - self.submitted
+
+    @property
+    def run_time(self) -> float:
+        """Seconds the command took or has been running so far.
+        """
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.monotonic()) - self.started
+
+    def cancel(self) -> bool:
+        """Cancels the task if it has not started yet. Returns `True` if the task is cancelled.
+        """
+        return self.pool.cancel(self)
+
+    def cancelled(self) -> bool:
+        return self.state == Task.CANCELLED
+
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    def result(self, timeout: float = None):
+        """Waits for the task and returns the command result or raises its exception.
+
+        Must not be called from the main loop for long running tasks, it blocks the UI.
+        """
+        if not self._done.wait(timeout):
+            raise TimeoutError(f'{self} is not finished in {timeout}s')
+        if self._error:
+            raise self._error
+        return self._result
+
+
+class WorkerPool:
+    """Bounded pool of reusable worker threads running queued tasks by priority.
+
+    Threads are started on demand up to `max_workers`. Background tasks never take
+    the last free worker, so interactive tasks like the preview are not stuck behind
+    a long backup or import.
+    """
+
+    def __init__(self, max_workers: int = None):
+        # Workers mostly wait for disk and network, and at least two are needed to keep
+        # one of them free for interactive tasks, so the count doesn't follow CPU count below that
+        self.max_workers = max_workers or max(2, min(4, os.cpu_count() or 1))
+        self.metrics: Dict[str, TaskMetrics] = {}
+        self._queue: List[tuple] = []
+        self._counter = itertools.count()
+        self._tasks: Dict[Hashable, Task] = {}
+        self._running: List[Task] = []
+        self._threads: List[threading.Thread] = []
+        self._idle = 0
+        self._pending = 0
+        self._stopped = False
+        self._condition = threading.Condition()
+
+    @property
+    def tasks(self) -> List[Task]:
+        """Returns running and queued tasks, running first.
+        """
+        with self._condition:
+            queued = []
+            for _, _, task in sorted(self._queue):
+                if task.state == Task.PENDING and task not in queued:
+                    queued.append(task)
+            return self._running + queued
+
+    def submit(self, command: Callable, args: tuple = (), callback: Callable = None, errorback: Callable = None,
+               priority: int = PRIORITY_DEFAULT, dedup: bool = True) -> Task:
+        key = None
+        if dedup:
             try:
-                result = command(*args)
-                if callback:
-                    GLib.idle_add(callback, result)
+                key = (command, args)
+                hash(key)
+            except TypeError:
+                key = None
+
+        with self._condition:
+            task = self._tasks.get(key) if key is not None else None
+            if task is None:
+                task = Task(self, command, args, priority, key)
+                if key is not None:
+                    self._tasks[key] = task
+                heapq.heappush(self._queue, (priority, next(self._counter), task))
+                self._pending += 1
+                if self._idle < self._pending and len(self._threads) < self.max_workers:
+                    self._start_thread()
+                self._condition.notify()
+            elif priority < task.priority and task.state == Task.PENDING:
+                # Raise the priority of the shared task, the old heap entry is skipped by workers
+                task.priority = priority
+                heapq.heappush(self._queue, (priority, next(self._counter), task))
+                self._condition.notify()
+
+            task.callbacks.append((callback, errorback))
+
+        return task
+
+    def cancel(self, task: Task) -> bool:
+        with self._condition:
+            if task.state != Task.PENDING:
+                return task.state == Task.CANCELLED
+            task.state = Task.CANCELLED
+            self._pending -= 1
+            task.finished = time.monotonic()
+            self._forget(task)
+            self._update_metrics(task)
+        task._done.set()
+        return True
+
+    def shutdown(self, wait: bool = False) -> None:
+        """Cancels queued tasks and stops worker threads once running tasks are finished.
+        """
+        with self._condition:
+            self._stopped = True
+            pending = [task for _, _, task in self._queue if task.state == Task.PENDING]
+            threads = list(self._threads)
+            self._condition.notify_all()
+
+        for task in pending:
+            self.cancel(task)
+
+        if wait:
+            for thread in threads:
+                thread.join()
+
+    def _start_thread(self) -> None:
+        thread = threading.Thread(target=self._work, name=f'norka-worker-{len(self._threads)}', daemon=True)
+        self._threads.append(thread)
+        thread.start()
+
+    def _next_task(self) -> Optional[Task]:
+        """Returns the next task to run, waiting for one if needed. Returns `None` when stopped.
+        """
+        with self._condition:
+            while True:
+                # Skip cancelled tasks and stale entries of tasks which priority was raised
+                while self._queue and (self._queue[0][2].state != Task.PENDING
+                                       or self._queue[0][0] != self._queue[0][2].priority):
+                    heapq.heappop(self._queue)
+
+                if self._stopped:
+                    return None
+
+                if self._queue:
+                    task = self._queue[0][2]
+                    background = sum(1 for running in self._running if running.priority >= PRIORITY_BACKGROUND)
+                    if task.priority < PRIORITY_BACKGROUND or background < self.max_workers - 1 \
+                            or self.max_workers == 1:
+                        heapq.heappop(self._queue)
+                        self._pending -= 1
+                        task.state = Task.RUNNING
+                        task.started = time.monotonic()
+                        self._running.append(task)
+                        return task
+
+                self._idle += 1
+                self._condition.wait()
+                self._idle -= 1
+
+    def _work(self) -> None:
+        while True:
+            task = self._next_task()
+            if task is None:
+                return
+
+            try:
+                task._result = task.command(*task.args)
             except Exception as e:
                 e.traceback = traceback.format_exc()
-                if errorback:
-                    GLib.idle_add(errorback, e)
-
-        if errorback is None:
-            errorback = GObjectWorker._default_errorback
-        data = command, args, callback, errorback
-        thread = threading.Thread(target=run, args=(data,))
-        thread.daemon = True
-        thread.start()
+                task._error = e
+
+            with self._condition:
+                task.finished = time.monotonic()
+                task.state = Task.FINISHED
+                self._running.remove(task)
+                self._forget(task)
+                self._update_metrics(task)
+                callbacks = list(task.callbacks)
+                # A finished background task may unblock the reserved worker rule
+                self._condition.notify()
+
+            logging.debug('%s finished in %.3fs after %.3fs in queue', task.name, task.run_time, task.wait_time)
+
+            for callback, errorback in callbacks:
+                if task._error is None:
+                    if callback:
+                        GLib.idle_add(callback, task._result)
+                else:
+                    GLib.idle_add(errorback or GObjectWorker._default_errorback, task._error)
+            task._done.set()
+
+    def _forget(self, task: Task) -> None:
+        if task.key is not None and self._tasks.get(task.key) is task:
+            del self._tasks[task.key]
+
+    def _update_metrics(self, task: Task) -> None:
+        metrics = self.metrics.get(task.name) or TaskMetrics(0, 0, 0, 0.0, 0.0, 0.0)
+        if task.state == Task.CANCELLED:
+            self.metrics[task.name] = metrics._replace(cancelled=metrics.cancelled + 1)
+            return
+
+        self.metrics[task.name] = TaskMetrics(
+            calls=metrics.calls + 1,
+            failed=metrics.failed + (task._error is not None),
+            cancelled=metrics.cancelled,
+            total_time=metrics.total_time + task.run_time,
+            max_time=max(metrics.max_time, task.run_time),
+            total_wait=metrics.total_wait + task.wait_time,
+        )
+
+
+class GObjectWorker:
+    _pool: Optional[WorkerPool] = None
+
+    @staticmethod
+    def pool() -> WorkerPool:
+        if GObjectWorker._pool is None:
+            GObjectWorker._pool = WorkerPool()
+        return GObjectWorker._pool
+
+    @staticmethod
+    def call(command, args=(), callback=None, errorback=None, priority=PRIORITY_DEFAULT, dedup=True) -> Task:
+        """Runs `command(*args)` in the worker pool and passes its result to `callback` on the main loop.
+
+        Identical calls already queued or running are not repeated unless `dedup` is `False`.
+        """
+        return GObjectWorker.pool().submit(command, args, callback, errorback, priority, dedup)
+
+    @staticmethod
+    def shutdown() -> None:
+        if GObjectWorker._pool is not None:
+            GObjectWorker._pool.shutdown()
+            GObjectWorker._pool = None
 
     @staticmethod
     def _default_errorback(error):
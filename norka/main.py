@@ -29,6 +29,8 @@ from typing import List
 from gi.repository import Gtk, Gio, Gdk, Granite, GLib, Handy
 
 from norka.define import APP_ID, RESOURCE_PREFIX, STORAGE_NAME, APP_TITLE
+from norka.gobject_worker import GObjectWorker
+from norka.services.importer import Importer
 from norka.services.logger import Logger
 from norka.services.settings import Settings
 from norka.services.storage import Storage
@@ -115,6 +117,12 @@ class Application(Gtk.Application):
         # self.set_app_menu(builder.get_object('app-menu'))
         self.settings.connect("changed", self.on_settings_changed)
 
+    def do_shutdown(self):
+        # Drop queued background tasks and wait for queued document writes before exit
+        GObjectWorker.shutdown()
+        self.storage.close()
+        Gtk.Application.do_shutdown(self)
+
     def do_activate(self):
         """Activates the application.
 
@@ -150,12 +158,14 @@ class Application(Gtk.Application):
         if n_files and not self.window:
             self.do_activate()
 
-        doc_id = None
-        for gfile in files:
-            path = gfile.get_path()
-            if not path:
-                continue
-            doc_id = self.window.import_document(file_path=path)
+        paths = [gfile.get_path() for gfile in files if gfile.get_path()]
+        if any(Importer.is_bulk_source(path) for path in paths):
+            # Folders and archives are imported in background
+            self.window.import_sources(paths)
+            return
+
+        doc_ids = self.window.import_documents(file_paths=paths) if paths else []
+        doc_id = doc_ids[-1] if doc_ids else None
 
         # Open last imported file
         if doc_id:
@@ -176,6 +186,10 @@ class Application(Gtk.Application):
         Logger.debug(f'SETTINGS: %s changed', key)
         if key == "autosave":
             self.window.autosave = settings.get_boolean(key)
+            if not self.window.autosave:
+                self.window.editor.saver.cancel()
+        if key in ('autosave-delay', 'autosave-max-latency'):
+            self.window.editor.update_autosave_timing()
         if key == "spellcheck":
             self.window.toggle_spellcheck(settings.get_boolean(key))
         if key == "spellcheck-language":
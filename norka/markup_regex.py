@@ -64,3 +64,29 @@ FOOTNOTE_ID = re.compile(
     r"[^\s]+\[\^(?P<id>(?P<text>[^\s]+))\]")
 FOOTNOTE = re.compile(
     r"(?:^\n*|\n\n)\[\^(?P<id>[^\s]+)\]: (?P<text>(?:[^\n]+|\n+(?=(?:\t| {4})))+)(?:\n+|$)", re.M)
+
+# Patterns used by the single-pass tokenizer in `norka.markup_tokenizer`.
+# Block patterns are matched against a single line, inline tokens are scanned with `finditer`,
+# none of them backtracks over the rest of the line.
+FENCE = re.compile(
+    r" {0,3}(?P<fence>`{3,}|~{3,})")
+RULE = re.compile(
+    r" {0,3}(?:(?:\* *){3,}|(?:- *){3,}|(?:_ *){3,}|[\-+]{5,}|=+ *)$")
+TABLE_DELIMITER = re.compile(
+    r" {0,3}\|?(?: *:?-+:? *\|)+(?: *:?-+:? *)?$")
+LINE_PREFIX = re.compile(
+    r"(?: {0,3}> ?)*"
+    r"(?: {0,3}#{1,6}(?: +|$)"
+    r"|[\t ]*(?:[\-*+]|\d+[.)]|[a-z][.)])[\t ]+(?:\[[ xX]\][\t ]+)?"
+    r"| {0,3}\[\^[^\s\]]+\]: *)?")
+HEADER_CLOSING = re.compile(
+    r"[\t ]+#+[\t ]*$")
+INLINE_TOKEN = re.compile(
+    r"\\(?P<escaped>[\\`*_{}\[\]()#+\-.!~$<>|])"
+    r"|(?P<code>`+)"
+    r"|(?P<math>\${1,2})"
+    r"|(?P<emphasis>\*+|_+|~~)"
+    r"|(?P<footnote>\[\^[^\s\]]+\])"
+    r"|(?P<open>!?\[)"
+    r"|\](?P<target>\([^()\s]*(?:[\t ]+\"[^\"]*\")?\))?"
+    r"|<(?P<url>[A-Za-z][A-Za-z0-9.+-]{1,31}:[^<>\x00-\x20]*|[^<>@\s]+@[^<>@\s]+)>")
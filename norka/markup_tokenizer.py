@@ -0,0 +1,188 @@
+# markup_tokenizer.py
+#
+# MIT License
+#
+# Copyright (c) 2020 Andrey Maksimov <meamka@ya.ru>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import re
+from typing import Dict, List, Tuple
+
+from norka.markup_regex import (
+    FENCE, RULE, TABLE_DELIMITER, LINE_PREFIX, HEADER_CLOSING, INLINE_TOKEN
+)
+
+# Regexp that matches any character, except for newlines and subsequent spaces.
+CHARACTERS = re.compile(r"[^\s]|(?:[^\S\n](?!\s))")
+
+# Regexp that matches Asian letters, general symbols and hieroglyphs,
+# as well as sequences of word characters optionally containing non-word characters in-between.
+WORDS = re.compile(r"[\u3040-\uffff]|(?:\w+\S?\w*)+", re.UNICODE)
+
+# Regexp that matches sentence-ending punctuation characters, ie. full stop, question mark,
+# exclamation mark, paragraph, and variants.
+SENTENCES = re.compile(r"[^\n][.。।෴۔።?՞;⸮؟？፧꘏⳺⳻⁇﹖⁈⁉‽!﹗！՜߹႟᥄\n]+")
+
+# Regexp that matches paragraphs, ie. anything separated by at least 2 newlines.
+PARAGRAPHS = re.compile(r"[^\n]+(\n{2,}|$)")
+
+
+def strip_markup(text: str) -> str:
+    """Returns `text` with markdown markup removed, keeping only what the reader sees.
+
+    The text is scanned once: block markup is recognized by the start of each line
+    and inline markup by a single `finditer` over the rest of it. Emphasis, code spans
+    and links are paired using stacks, so unbalanced markup never causes rescans.
+    """
+    output: List[str] = []
+    fence = None
+    previous = ''
+
+    for line in text.split('\n'):
+        if fence is not None:
+            match = FENCE.match(line)
+            if match and match.group('fence').startswith(fence) and not line[match.end():].strip():
+                fence = None
+                output.append('\n')
+            else:
+                output.append(line)
+                output.append('\n')
+            previous = ''
+            continue
+
+        match = FENCE.match(line)
+        if match:
+            fence = match.group('fence')
+            output.append('\n')
+            previous = ''
+            continue
+
+        if previous and TABLE_DELIMITER.match(line) and '|' in line:
+            # Table delimiter is dropped with its newline, so the table stays one paragraph
+            continue
+
+        if RULE.match(line):
+            # Horizontal rules and setext header underlines
+            output.append('\n')
+            previous = ''
+            continue
+
+        prefix = LINE_PREFIX.match(line).end()
+        if prefix and line[prefix - 1] == ' ' and '#' in line[:prefix]:
+            line = HEADER_CLOSING.sub('', line)
+        _strip_inline(line, prefix, output)
+        output.append('\n')
+        previous = line.strip()
+
+    # Drop the newline added after the last line
+    output.pop()
+    return ''.join(output)
+
+
+def _strip_inline(line: str, start: int, output: List[str]) -> None:
+    """Appends the text of `line` starting at `start` to `output` without inline markup.
+    """
+    # Indexes in `output` of unmatched emphasis runs per delimiter and of opening brackets
+    emphasis: Dict[str, List[Tuple[int, str]]] = {}
+    brackets: List[int] = []
+    # Closing runs of code spans and math known to be missing after the current position
+    missing = set()
+    position = start
+
+    while position < len(line):
+        token = INLINE_TOKEN.search(line, position)
+        if token is None:
+            output.append(line[position:])
+            return
+
+        output.append(line[position:token.start()])
+        position = token.end()
+        kind = token.lastgroup
+
+        if kind == 'escaped':
+            output.append(token.group('escaped'))
+
+        elif kind in ('code', 'math'):
+            run = token.group(kind)
+            end = -1 if run in missing else line.find(run, position)
+            if end == -1 or (kind == 'math' and line[position:position + 1] in ('', ' ')):
+                if end == -1:
+                    missing.add(run)
+                output.append(run)
+            else:
+                output.append(line[position:end])
+                position = end + len(run)
+
+        elif kind == 'emphasis':
+            run = token.group(kind)
+            before = line[token.start() - 1] if token.start() > start else ' '
+            after = line[position] if position < len(line) else ' '
+            can_open = not after.isspace()
+            can_close = not before.isspace()
+            if run[0] == '_':
+                # Underscores inside words are not emphasis
+                can_open = can_open and not before.isalnum()
+                can_close = can_close and not after.isalnum()
+
+            openers = emphasis.setdefault(run[0], [])
+            if can_close and openers:
+                index, _ = openers.pop()
+                output[index] = ''
+            elif can_open:
+                openers.append((len(output), run))
+                output.append(run)
+            else:
+                output.append(run)
+
+        elif kind == 'footnote':
+            pass
+
+        elif kind == 'open':
+            brackets.append(len(output))
+            output.append(token.group('open'))
+
+        elif kind == 'target':
+            if brackets:
+                output[brackets.pop()] = ''
+            else:
+                output.append(token.group())
+
+        elif kind == 'url':
+            output.append(token.group('url'))
+
+        else:
+            # Closing bracket without a link target
+            if brackets:
+                brackets.pop()
+            output.append(']')
+
+
+def count(text: str) -> Tuple[int, int, int, int]:
+    """Counts stats of `text` with markup removed.
+
+    The result is in the format: (characters, words, sentences, paragraphs)"""
+
+    text = strip_markup(text)
+    return (
+        sum(1 for _ in CHARACTERS.finditer(text)),
+        sum(1 for _ in WORDS.finditer(text)),
+        sum(1 for _ in SENTENCES.finditer(text)),
+        sum(1 for _ in PARAGRAPHS.finditer(text)),
+    )
@@ -36,10 +36,11 @@ class Document(GObject.GObject):
     modified = GObject.property(type=str)
     folder = GObject.property(type=str)
     encrypted = GObject.property(type=bool, default=False)
+    excerpt = GObject.property(type=str)
 
     def __init__(self, title: str, content: str = '', folder: str = '/', _id: int = -1,
                  archived=False, encrypted: bool = False,
-                 created: str = '-1', modified: str = '-1'):
+                 created: str = '-1', modified: str = '-1', excerpt: str = None):
         GObject.GObject.__init__(self)
         self.document_id = _id
         self.title = title
@@ -49,6 +50,7 @@ class Document(GObject.GObject):
         self.encrypted = encrypted
         self.created = created
         self.modified = modified
+        self.excerpt = excerpt or ''
 
     @classmethod
     def new_with_row(cls, row: list):
@@ -66,6 +68,26 @@ class Document(GObject.GObject):
             modified=row[5],
             folder=row[8],
             encrypted=row[9],
+            excerpt=row[10],
+        )
+
+    @classmethod
+    def new_with_summary_row(cls, row: list):
+        """Create :class:`Document` instance without content from sqlite row.
+
+        :param row: row with data from :const:`Storage.SUMMARY_COLUMNS` query
+        :type row: list
+        """
+        return cls(
+            _id=row[0],
+            title=row[1],
+            content=None,
+            folder=row[2],
+            archived=row[3],
+            created=row[4],
+            modified=row[5],
+            encrypted=row[6],
+            excerpt=row[7],
         )
 
     @property
@@ -0,0 +1,93 @@
+# document_record.py
+#
+# MIT License
+#
+# Copyright (c) 2020 Andrey Maksimov <meamka@ya.ru>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import os
+from datetime import datetime
+
+from norka.models.document import Document
+
+
+class DocumentRecord:
+    """Lightweight read-only document representation for bulk storage reads.
+
+    Unlike :class:`Document` it is a plain object with `__slots__`, so it is cheap
+    to create for thousands of rows. Use :func:`to_document` when a GObject is required.
+    """
+    __slots__ = ('document_id', 'title', 'content', 'archived', 'created', 'modified',
+                 'folder', 'encrypted', 'excerpt')
+
+    def __init__(self, document_id: int, title: str, content: str = None, folder: str = '/',
+                 archived: bool = False, encrypted: bool = False,
+                 created: str = '-1', modified: str = '-1', excerpt: str = None):
+        self.document_id = document_id
+        self.title = title
+        self.content = content
+        self.folder = folder
+        self.archived = bool(archived)
+        self.encrypted = bool(encrypted)
+        # Keep timestamps in the string form used by :class:`Document`
+        self.created = str(created) if isinstance(created, datetime) else created
+        self.modified = str(modified) if isinstance(modified, datetime) else modified
+        self.excerpt = excerpt or ''
+
+    @classmethod
+    def new_with_row(cls, row: list):
+        """Create :class:`DocumentRecord` instance from sqlite row.
+
+        :param row: row with data from sqlite storage
+        :type row: list
+        """
+        return cls(row[0], row[1], row[2], folder=row[8], archived=row[3], encrypted=row[9],
+                   created=row[4], modified=row[5], excerpt=row[10])
+
+    @classmethod
+    def new_with_summary_row(cls, row: list):
+        """Create :class:`DocumentRecord` instance without content from sqlite row.
+
+        :param row: row with data from :const:`Storage.SUMMARY_COLUMNS` query
+        :type row: list
+        """
+        return cls(row[0], row[1], None, folder=row[2], archived=row[3], encrypted=row[6],
+                   created=row[4], modified=row[5], excerpt=row[7])
+
+    def to_document(self) -> Document:
+        """Create :class:`Document` instance with the same data.
+        """
+        return Document(
+            _id=self.document_id,
+            title=self.title,
+            content=self.content,
+            folder=self.folder,
+            archived=self.archived,
+            encrypted=self.encrypted,
+            created=self.created,
+            modified=self.modified,
+            excerpt=self.excerpt,
+        )
+
+    @property
+    def absolute_path(self):
+        return os.path.join(self.folder, self.title)
+
+    def __repr__(self) -> str:
+        return f"{self.document_id}: {self.folder}/{self.title}"
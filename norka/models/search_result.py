@@ -0,0 +1,78 @@
+# search_result.py
+#
+# MIT License
+#
+# Copyright (c) 2020-2022 Andrey Maksimov <meamka@ya.ru>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+from gi.repository import GObject
+
+from norka.models.document import Document
+
+
+class SearchResult(GObject.GObject):
+    """Document found by full-text search along with the matched text snippet.
+    """
+    # Markers used to highlight matches inside the snippet.
+    MATCH_START = '\x02'
+    MATCH_END = '\x03'
+
+    document_id = GObject.property(type=int, default=-1)
+    title = GObject.property(type=str)
+    folder = GObject.property(type=str)
+    archived = GObject.property(type=bool, default=False)
+    snippet = GObject.property(type=str)
+
+    def __init__(self, title: str, folder: str = '/', _id: int = -1, archived: bool = False, snippet: str = ''):
+        GObject.GObject.__init__(self)
+        self.document_id = _id
+        self.title = title
+        self.folder = folder
+        self.archived = archived
+        self.snippet = snippet
+
+    @classmethod
+    def new_with_row(cls, row: list):
+        """Create :class:`SearchResult` instance from sqlite row.
+
+        :param row: row with (id, title, path, archived, snippet) from sqlite storage
+        :type row: list
+        """
+        return cls(
+            _id=row[0],
+            title=row[1],
+            folder=row[2],
+            archived=row[3],
+            snippet=row[4] or '',
+        )
+
+    @classmethod
+    def new_with_document(cls, document: Document):
+        """Create :class:`SearchResult` instance from :class:`Document` without snippet.
+        """
+        return cls(
+            _id=document.document_id,
+            title=document.title,
+            folder=document.folder,
+            archived=document.archived,
+        )
+
+    def __repr__(self) -> str:
+        return f"{self.document_id}: {self.folder}/{self.title}"
@@ -0,0 +1,151 @@
+# autosave.py
+#
+# MIT License
+#
+# Copyright (c) 2020 Andrey Maksimov <meamka@ya.ru>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import time
+from collections import namedtuple
+from typing import Callable, Optional
+
+from gi.repository import GLib
+
+from norka.services.logger import Logger
+
+AutosaveMetrics = namedtuple('AutosaveMetrics', ['saves', 'changes', 'last_duration', 'max_duration',
+                                                 'average_duration', 'last_latency', 'max_latency'])
+
+
+class AutosaveScheduler:
+    """Debounces document saving while the user is typing.
+
+    Changes are coalesced into a single pending save which runs after `idle_delay` seconds
+    without changes, but no later than `max_latency` seconds after the first unsaved change.
+    Only one GLib timeout exists at a time, no matter how many changes were scheduled.
+    """
+
+    def __init__(self, callback: Callable[[], Optional[bool]], idle_delay: float = 2.0, max_latency: float = 10.0):
+        self.callback = callback
+        self.idle_delay = idle_delay
+        self.max_latency = max_latency
+
+        self._timeout_id = 0
+        self._first_change = None
+        self._last_change = None
+
+        self._saves = 0
+        self._changes = 0
+        self._last_duration = 0.0
+        self._max_duration = 0.0
+        self._total_duration = 0.0
+        self._last_latency = 0.0
+        self._max_latency = 0.0
+
+    @property
+    def pending(self) -> bool:
+        """Whether there are unsaved changes waiting for the timeout.
+        """
+        return self._first_change is not None
+
+    @property
+    def metrics(self) -> AutosaveMetrics:
+        """Returns save timings in seconds. Latency is the time from the first change to the save.
+        """
+        return AutosaveMetrics(
+            saves=self._saves,
+            changes=self._changes,
+            last_duration=self._last_duration,
+            max_duration=self._max_duration,
+            average_duration=self._total_duration / self._saves if self._saves else 0.0,
+            last_latency=self._last_latency,
+            max_latency=self._max_latency,
+        )
+
+    def schedule(self) -> None:
+        """Registers a change. Cheap enough to be called on every keystroke.
+        """
+        now = time.monotonic()
+        self._changes += 1
+        self._last_change = now
+        if self._first_change is None:
+            self._first_change = now
+
+        if not self._timeout_id:
+            self._start_timeout(self.idle_delay)
+
+    def flush(self) -> None:
+        """Saves pending changes immediately.
+        """
+        if self.pending:
+            self._save()
+
+    def cancel(self) -> None:
+        """Drops pending changes without saving them.
+        """
+        self._stop_timeout()
+        self._first_change = None
+        self._last_change = None
+
+    def _due_time(self) -> float:
+        return min(self._last_change + self.idle_delay, self._first_change + self.max_latency)
+
+    def _start_timeout(self, delay: float) -> None:
+        self._timeout_id = GLib.timeout_add(max(int(delay * 1000), 1), self._on_timeout)
+
+    def _stop_timeout(self) -> None:
+        if self._timeout_id:
+            GLib.source_remove(self._timeout_id)
+            self._timeout_id = 0
+
+    def _on_timeout(self) -> bool:
+        self._timeout_id = 0
+        if not self.pending:
+            return False
+
+        # Changes arrived since the timeout was set, wait until the user is idle
+        # or the maximum latency is reached.
+        remaining = self._due_time() - time.monotonic()
+        if remaining > 0:
+            self._start_timeout(remaining)
+            return False
+
+        self._save()
+        return False
+
+    def _save(self) -> None:
+        self._stop_timeout()
+        first_change = self._first_change
+        self._first_change = None
+        self._last_change = None
+
+        started = time.monotonic()
+        try:
+            self.callback()
+        except Exception as e:
+            Logger.error(e)
+        finished = time.monotonic()
+
+        self._saves += 1
+        self._last_duration = finished - started
+        self._max_duration = max(self._max_duration, self._last_duration)
+        self._total_duration += self._last_duration
+        self._last_latency = finished - first_change
+        self._max_latency = max(self._max_latency, self._last_latency)
+        Logger.debug('Autosave took %.3fs, %.3fs after the first change', self._last_duration, self._last_latency)
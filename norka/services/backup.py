@@ -21,32 +21,55 @@
 # LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
+import hashlib
+import json
 import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from os import path
-from typing import Optional
+from typing import Dict, Optional
 
 from gi.repository import GObject
 
 from norka.define import STORAGE_NAME
-from norka.models.document import Document
+from norka.models.document_record import DocumentRecord
+from norka.services.logger import Logger
 from norka.services.settings import Settings
 from norka.services.storage import Storage
 
 
 class BackupService(GObject.GObject):
+    """Backups documents as Markdown files keeping the folder structure.
+
+    Backups are incremental: the manifest stored in the backup folder maps document ids
+    to their file path, content hash and modification time. Unchanged documents are not
+    even read from the storage, moved ones are renamed, deleted ones are removed
+    and only changed ones are written, in parallel and atomically.
+    """
     __gtype_name__ = 'BackupService'
     __gsignals__ = {
         'started': (GObject.SignalFlags.ACTION, None, (str, int,)),
         'finished': (GObject.SignalFlags.ACTION, None, ()),
     }
 
+    MANIFEST_NAME = '.norka-backup.json'
+    MANIFEST_VERSION = 1
+
+    # Number of threads writing files.
+    WRITERS_COUNT = 4
+
     storage: Storage
 
-    def __init__(self, settings: Settings):
+    def __init__(self, settings: Settings, storage: Storage = None):
         GObject.GObject.__init__(self)
 
         self.settings = settings
 
+        if storage is not None:
+            # Share the application storage, reads go through its read-only connections
+            self.storage = storage
+            return
+
         # Init storage location and SQL structure
         storage_path = self.settings.get_string("storage-path")
         if not storage_path:
@@ -54,7 +77,7 @@ class BackupService(GObject.GObject):
             self.settings.set_string("storage-path", storage_path)
 
         self.storage = Storage(storage_path)
-        self.storage.connect()
+        self.storage.open()
 
     def save(self, backup_dir: str) -> Optional[str]:
         if not path.exists(backup_dir):
@@ -62,38 +85,149 @@ class BackupService(GObject.GObject):
 
         # We have to implement the same folder structure as we have inside our storage.
         # Thus, we need to:
-        # - export all documents from the root `/`
         # - find all folders and recreate them on the real filesystem
-        # - export all the documents inside
+        # - compare documents with the manifest of the previous backup
+        # - write changed documents, rename moved ones and remove deleted ones
         self.emit('started', backup_dir, -1)
 
-        docs = self.storage.all(path='/', with_archived=True)
-
-        for doc in docs:
-            self._write_document(doc, backup_dir)
-
-        folders = self.storage.get_folders(path='%')
-        for folder in folders:
-            folder_path = os.path.join(backup_dir, folder.absolute_path[1:])
-            os.makedirs(folder_path, exist_ok=True)
-
-            docs = self.storage.all(path=folder.absolute_path, with_archived=True)
+        manifest = self._load_manifest(backup_dir)
+        # Files of the previous backup, a document is never renamed over a file of another one
+        owners = {entry['path']: key for key, entry in manifest.items()}
+        entries: Dict[str, dict] = {}
+        taken = set()
+        changed = []
+        renamed = written = removed = 0
+
+        def move(key: str, entry: dict, file_path: str) -> bool:
+            if entry['path'] == file_path:
+                return path.exists(path.join(backup_dir, file_path))
+            if owners.get(file_path, key) != key or not self._rename(backup_dir, entry['path'], file_path):
+                return False
+            owners.pop(entry['path'], None)
+            owners[file_path] = key
+            return True
 
-            for doc in docs:
-                self._write_document(doc, folder_path)
+        with self.storage.read_only() as reader:
+            # Recreate folders first, so empty ones are not lost
+            for folder in reader.all_folders():
+                os.makedirs(os.path.join(backup_dir, folder.absolute_path[1:]), exist_ok=True)
+
+            # Compare document summaries with the manifest, content is read for changed documents only
+            for doc in reader.iter_documents(path=None, with_archived=True):
+                key = str(doc.document_id)
+                file_path = self._unique_path(self._document_path(doc), taken)
+                entry = manifest.pop(key, None)
+
+                if entry and entry['modified'] == str(doc.modified) and move(key, entry, file_path):
+                    renamed += entry['path'] != file_path
+                    entries[key] = dict(entry, path=file_path)
+                    continue
+                changed.append((doc.document_id, file_path, entry))
+
+            with ThreadPoolExecutor(max_workers=self.WRITERS_COUNT, thread_name_prefix='Backup') as executor:
+                futures = []
+                for doc_id, file_path, entry in changed:
+                    doc = reader.get(doc_id)
+                    if doc is None:
+                        continue
+
+                    key = str(doc_id)
+                    content = doc.content or ''
+                    content_hash = hashlib.sha1(content.encode('utf-8')).hexdigest()
+                    entries[key] = {'path': file_path, 'hash': content_hash, 'modified': str(doc.modified)}
+
+                    # Same content, only the timestamp changed
+                    if entry and entry['hash'] == content_hash and move(key, entry, file_path):
+                        renamed += entry['path'] != file_path
+                        continue
+
+                    # Old file is not needed unless another document took its place
+                    if entry and entry['path'] != file_path and entry['path'] not in taken:
+                        self._remove(backup_dir, entry['path'])
+
+                    futures.append(executor.submit(self._write_file, path.join(backup_dir, file_path), content))
+
+                written = sum(future.result() for future in futures)
+
+        # Documents left in the manifest were deleted since the previous backup
+        for entry in manifest.values():
+            if entry['path'] not in taken:
+                removed += self._remove(backup_dir, entry['path'])
+
+        self._save_manifest(backup_dir, entries)
+        Logger.info('Backup to %s: %s written, %s renamed, %s removed, %s unchanged',
+                    backup_dir, written, renamed, removed, len(entries) - len(futures))
 
         self.emit('finished')
         return backup_dir
 
-    def _write_document(self, doc: Document, backup_dir: str) -> bool:
-        filename = path.join(backup_dir, doc.title)
+    @staticmethod
+    def _document_path(doc: DocumentRecord) -> str:
+        filename = path.join(doc.folder.lstrip('/'), doc.title.replace('/', '_'))
         if doc.archived:
             filename += '-archived'
-
+        return filename + '.md'
+
+    @staticmethod
+    def _unique_path(file_path: str, taken: set) -> str:
+        """Returns `file_path` or its numbered variant if another document already has it.
+        """
+        result = file_path
+        index = 1
+        while result in taken:
+            index += 1
+            result = f'{file_path[:-3]} ({index}).md'
+        taken.add(result)
+        return result
+
+    @staticmethod
+    def _write_file(file_path: str, content: str) -> bool:
+        """Writes `content` to a temporary file and atomically replaces `file_path` with it.
+        """
         try:
-            with open(filename + '.md', 'w') as fd:
-                fd.writelines(doc.content)
+            os.makedirs(path.dirname(file_path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=path.dirname(file_path), prefix='.', suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as tmp_file:
+                    tmp_file.write(content)
+                os.replace(tmp_path, file_path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
             return True
         except Exception as e:
-            print(e)
+            Logger.error(e)
             return False
+
+    @staticmethod
+    def _rename(backup_dir: str, old_path: str, new_path: str) -> bool:
+        try:
+            os.makedirs(path.dirname(path.join(backup_dir, new_path)), exist_ok=True)
+            os.replace(path.join(backup_dir, old_path), path.join(backup_dir, new_path))
+            return True
+        except OSError as e:
+            Logger.warning(str(e))
+            return False
+
+    @staticmethod
+    def _remove(backup_dir: str, file_path: str) -> bool:
+        try:
+            os.remove(path.join(backup_dir, file_path))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def _load_manifest(self, backup_dir: str) -> Dict[str, dict]:
+        try:
+            with open(path.join(backup_dir, self.MANIFEST_NAME), encoding='utf-8') as manifest_file:
+                manifest = json.load(manifest_file)
+        except (OSError, ValueError):
+            return {}
+
+        if manifest.get('version') != self.MANIFEST_VERSION:
+            return {}
+        return manifest.get('documents', {})
+
+    def _save_manifest(self, backup_dir: str, entries: Dict[str, dict]) -> None:
+        manifest = {'version': self.MANIFEST_VERSION, 'documents': entries}
+        self._write_file(path.join(backup_dir, self.MANIFEST_NAME), json.dumps(manifest, ensure_ascii=False))
@@ -0,0 +1,98 @@
+# connection_pool.py
+#
+# MIT License
+#
+# Copyright (c) 2020 Andrey Maksimov <meamka@ya.ru>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Callable, Iterator, List, Optional
+from urllib.request import pathname2url
+
+
+class ConnectionPool:
+    """Pool of read-only SQLite connections for background readers.
+
+    Connections are opened lazily up to `size`, callers wait for a free one when
+    all of them are in use. In WAL mode readers never block the writer and vice versa.
+    """
+
+    def __init__(self, file_path: str, size: int = 4,
+                 configure: Optional[Callable[[sqlite3.Connection], None]] = None):
+        self.file_path = file_path
+        self.size = size
+        self.configure = configure
+
+        self._lock = threading.Lock()
+        self._idle: queue.LifoQueue = queue.LifoQueue()
+        self._connections: List[sqlite3.Connection] = []
+
+    @contextmanager
+    def connection(self, timeout: float = None) -> Iterator[sqlite3.Connection]:
+        """Borrows a connection for the duration of the `with` block.
+        """
+        conn = self._acquire(timeout)
+        try:
+            yield conn
+        finally:
+            with self._lock:
+                # The connection is already closed if the pool was closed while it was borrowed
+                if conn in self._connections:
+                    # Do not leave read transactions open, they would prevent WAL checkpoints
+                    if conn.in_transaction:
+                        conn.rollback()
+                    self._idle.put(conn)
+
+    def close(self) -> None:
+        """Closes all connections, including the borrowed ones.
+        """
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+            self._idle = queue.LifoQueue()
+
+    def _acquire(self, timeout: float = None) -> sqlite3.Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            if len(self._connections) < self.size:
+                conn = self._open()
+                self._connections.append(conn)
+                return conn
+
+        try:
+            return self._idle.get(timeout=timeout)
+        except queue.Empty:
+            raise TimeoutError('No free storage connection') from None
+
+    def _open(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(f'file:{pathname2url(self.file_path)}?mode=ro', uri=True,
+                               detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES,
+                               check_same_thread=False)
+        if self.configure:
+            self.configure(conn)
+        conn.execute('PRAGMA query_only=ON')
+        return conn
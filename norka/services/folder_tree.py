@@ -0,0 +1,159 @@
+# folder_tree.py
+#
+# MIT License
+#
+# Copyright (c) 2020-2022 Andrey Maksimov <meamka@ya.ru>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import os
+from typing import Dict, Iterable, List, Optional, Set
+
+
+class FolderNode(object):
+    """Single folder inside :class:`FolderTree`."""
+
+    __slots__ = ('folder_id', 'parent_id', 'path', 'title')
+
+    def __init__(self, folder_id: int, parent_id: Optional[int], path: str, title: str):
+        self.folder_id = folder_id
+        self.parent_id = parent_id
+        self.path = path
+        self.title = title
+
+    @property
+    def absolute_path(self) -> str:
+        return os.path.join(self.path, self.title)
+
+    def __repr__(self) -> str:
+        return f"{self.folder_id}: {self.absolute_path}"
+
+
+class FolderTree(object):
+    """In-memory cache of the folders hierarchy.
+
+    Keeps folders by id, by absolute path and by parent id, so subtree lookups
+    don't need to touch the database at all. Root folder `/` has no node and its id is `None`.
+    """
+
+    def __init__(self):
+        self.nodes: Dict[int, FolderNode] = {}
+        self.paths: Dict[str, int] = {}
+        self.children: Dict[Optional[int], Set[int]] = {None: set()}
+
+    def load(self, rows: Iterable[tuple]) -> None:
+        """Fill the tree with `(id, parent_id, path, title)` rows ordered by path.
+
+        Rows without `parent_id` get their parent resolved by path.
+        """
+        self.nodes.clear()
+        self.paths.clear()
+        self.children = {None: set()}
+
+        for folder_id, parent_id, path, title in rows:
+            if parent_id is None:
+                parent_id = self.paths.get(path)
+            self._attach(FolderNode(folder_id, parent_id, path, title))
+
+    def get(self, path: str) -> Optional[FolderNode]:
+        """Returns folder with given absolute `path` or `None`.
+        """
+        folder_id = self.paths.get(self.normalize(path))
+        return self.nodes.get(folder_id) if folder_id is not None else None
+
+    def parent_id(self, path: str) -> Optional[int]:
+        """Returns id of the folder which absolute path is `path`, `None` for the root.
+        """
+        return self.paths.get(self.normalize(path))
+
+    def add(self, folder_id: int, path: str, title: str) -> FolderNode:
+        node = FolderNode(folder_id, self.parent_id(path), self.normalize(path), title)
+        self._attach(node)
+        return node
+
+    def subtree(self, folder_id: int) -> List[FolderNode]:
+        """Returns folder with given `folder_id` followed by all its descendants.
+        """
+        result = []
+        stack = [folder_id]
+        while stack:
+            node = self.nodes[stack.pop()]
+            result.append(node)
+            stack.extend(self.children.get(node.folder_id, ()))
+        return result
+
+    def is_descendant(self, folder_id: int, ancestor_id: int) -> bool:
+        """Checks whether `folder_id` is `ancestor_id` itself or nested into it.
+        """
+        while folder_id is not None:
+            if folder_id == ancestor_id:
+                return True
+            folder_id = self.nodes[folder_id].parent_id
+        return False
+
+    def move(self, folder_id: int, path: str, title: str) -> List[FolderNode]:
+        """Moves folder with given `folder_id` to `path` under new `title`.
+
+        Returns the list of affected nodes with their paths already updated.
+        """
+        nodes = self.subtree(folder_id)
+        old_prefix = nodes[0].absolute_path
+
+        for node in nodes:
+            del self.paths[node.absolute_path]
+
+        root = nodes[0]
+        self.children[root.parent_id].discard(folder_id)
+        root.parent_id = self.parent_id(path)
+        root.path = self.normalize(path)
+        root.title = title
+        self.children.setdefault(root.parent_id, set()).add(folder_id)
+
+        new_prefix = root.absolute_path
+        for node in nodes[1:]:
+            node.path = new_prefix + node.path[len(old_prefix):]
+
+        for node in nodes:
+            self.paths[node.absolute_path] = node.folder_id
+
+        return nodes
+
+    def remove(self, folder_id: int) -> List[FolderNode]:
+        """Removes folder with given `folder_id` and all its descendants.
+
+        Returns the list of removed nodes.
+        """
+        nodes = self.subtree(folder_id)
+        self.children[nodes[0].parent_id].discard(folder_id)
+        for node in nodes:
+            del self.nodes[node.folder_id]
+            del self.paths[node.absolute_path]
+            self.children.pop(node.folder_id, None)
+        return nodes
+
+    def _attach(self, node: FolderNode) -> None:
+        self.nodes[node.folder_id] = node
+        self.paths[node.absolute_path] = node.folder_id
+        self.children.setdefault(node.parent_id, set()).add(node.folder_id)
+
+    @staticmethod
+    def normalize(path: str) -> str:
+        if path != '/' and path.endswith('/'):
+            path = path[:-1]
+        return path or '/'
@@ -0,0 +1,299 @@
+# importer.py
+#
+# MIT License
+#
+# Copyright (c) 2020 Andrey Maksimov <meamka@ya.ru>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import codecs
+import glob
+import locale
+import os
+import sqlite3
+import tarfile
+import threading
+import time
+import zipfile
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+from gi.repository import GLib, GObject
+
+from norka.models.document import Document
+from norka.services.logger import Logger
+from norka.services.storage import Storage
+
+try:
+    from charset_normalizer import from_bytes as detect_charset
+except ImportError:
+    detect_charset = None
+
+# File to import: folders relative to the import target, document title and a function reading raw bytes.
+ImportItem = namedtuple('ImportItem', ['folders', 'title', 'read'])
+
+ImportResult = namedtuple('ImportResult', ['documents', 'folders', 'failed', 'elapsed'])
+
+
+class Importer(GObject.GObject):
+    """Imports directories, glob patterns, zip/tar archives and single files.
+
+    Source folder hierarchy is recreated as Norka folders. Files are read and decoded
+    in a thread pool while the decoded documents are written on a separate connection,
+    one transaction per chunk, so other writers are never locked out for long.
+    :func:`run` blocks, so call it from a worker thread.
+    Signals are emitted on the main loop:
+
+    - progress (imported, total, documents per second)
+    - finished (imported, elapsed seconds)
+    """
+    __gtype_name__ = 'Importer'
+    __gsignals__ = {
+        'progress': (GObject.SignalFlags.ACTION, None, (int, int, float,)),
+        'finished': (GObject.SignalFlags.ACTION, None, (int, float,)),
+    }
+
+    EXTENSIONS = ('.md', '.markdown', '.mdown', '.mkd', '.txt', '.text')
+    ARCHIVES = ('.zip', '.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz', '.txz')
+
+    # Number of files decoded ahead of the writer and committed in one transaction.
+    CHUNK_SIZE = 256
+
+    # Minimal interval between progress signals in seconds.
+    PROGRESS_INTERVAL = 0.2
+
+    def __init__(self, storage: Storage, workers: int = None):
+        GObject.GObject.__init__(self)
+        self.storage = storage
+        self.workers = workers or min(8, (os.cpu_count() or 1) + 2)
+
+    @classmethod
+    def is_bulk_source(cls, source: str) -> bool:
+        """Whether `source` is a directory, archive or glob pattern rather than a single file.
+        """
+        return os.path.isdir(source) or cls._is_archive(source) or glob.has_magic(source)
+
+    def run(self, sources: Iterable[str], path: str = '/') -> ImportResult:
+        """Imports all the files found in `sources` into the folder with given `path`.
+        """
+        started = time.monotonic()
+        try:
+            with ExitStack() as stack:
+                items = list(self.collect(sources, stack))
+                total = len(items)
+                Logger.info('Importing %s files into %s', total, path)
+
+                # Own connection, so the import transactions don't interfere with the UI
+                storage = Storage(self.storage.file_path)
+                storage.open()
+                stack.callback(storage.conn.close)
+
+                imported, folders, failed = self._write(storage, items, path, started)
+        finally:
+            # Chunks committed before a failure stay in the storage, so refresh it in any case
+            GLib.idle_add(self._on_storage_changed)
+
+        elapsed = time.monotonic() - started
+        Logger.info('Imported %s documents and %s folders in %.2fs', imported, folders, elapsed)
+        GLib.idle_add(self._on_finished, imported, elapsed)
+        return ImportResult(imported, folders, failed, elapsed)
+
+    def collect(self, sources: Iterable[str], stack: ExitStack) -> Iterator[ImportItem]:
+        """Yields files to import from the given `sources`.
+
+        Opened archives are registered in `stack` and stay open until it is closed.
+        """
+        for source in sources:
+            source = os.path.expanduser(source)
+            if glob.has_magic(source):
+                yield from self._collect_glob(source)
+            elif os.path.isdir(source):
+                base = os.path.dirname(os.path.normpath(source))
+                for root, dirs, files in os.walk(source):
+                    dirs.sort()
+                    for name in sorted(files):
+                        if self._is_text(name):
+                            yield self._file_item(os.path.join(root, name), base)
+            elif self._is_archive(source):
+                yield from self._collect_archive(source, stack)
+            elif os.path.isfile(source):
+                yield self._file_item(source, os.path.dirname(source))
+
+    def _collect_glob(self, pattern: str) -> Iterator[ImportItem]:
+        # Paths are kept relative to the part of the pattern before the first wildcard
+        parts = pattern.split(os.sep)
+        magic = next(i for i, part in enumerate(parts) if glob.has_magic(part))
+        base = os.sep.join(parts[:magic]) or os.curdir
+
+        for file_path in sorted(glob.iglob(pattern, recursive=True)):
+            if os.path.isfile(file_path) and self._is_text(file_path):
+                yield self._file_item(file_path, base)
+
+    def _collect_archive(self, archive_path: str, stack: ExitStack) -> Iterator[ImportItem]:
+        name = os.path.basename(archive_path)
+        root = name[:-len(next(ext for ext in self.ARCHIVES if name.lower().endswith(ext)))]
+
+        if zipfile.is_zipfile(archive_path):
+            archive = stack.enter_context(zipfile.ZipFile(archive_path))
+            for info in archive.infolist():
+                if not info.is_dir() and self._is_text(info.filename):
+                    yield self._archive_item(root, info.filename, lambda info=info: archive.read(info))
+        else:
+            archive = stack.enter_context(tarfile.open(archive_path))
+            # Tar members are read from a single stream, so reads are serialized
+            lock = threading.Lock()
+
+            def read(member: tarfile.TarInfo) -> bytes:
+                with lock:
+                    return archive.extractfile(member).read()
+
+            for member in archive.getmembers():
+                if member.isfile() and self._is_text(member.name):
+                    yield self._archive_item(root, member.name, lambda member=member: read(member))
+
+    def _file_item(self, file_path: str, base: str) -> ImportItem:
+        folder = os.path.relpath(os.path.dirname(file_path), base)
+        folders = tuple(part for part in folder.split(os.sep) if part not in ('', os.curdir))
+
+        def read() -> bytes:
+            with open(file_path, 'rb') as _file:
+                return _file.read()
+
+        return ImportItem(folders, self._title(file_path), read)
+
+    def _archive_item(self, root: str, name: str, read: Callable[[], bytes]) -> ImportItem:
+        folders = tuple(part for part in name.split('/')[:-1] if part not in ('', os.curdir, os.pardir))
+        return ImportItem((root,) + folders, self._title(name), read)
+
+    def _write(self, storage: Storage, items: List[ImportItem], path: str, started: float) -> Tuple[int, int, int]:
+        imported = folders = failed = 0
+        total = len(items)
+        folder_paths = {}
+        reported = 0.0
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='Importer') as executor:
+            chunks = (items[i:i + self.CHUNK_SIZE] for i in range(0, total, self.CHUNK_SIZE))
+            # Decode the next chunk while the current one is written
+            pending = [executor.submit(self._decode, item) for item in next(chunks, [])]
+
+            while pending:
+                current, pending = pending, [executor.submit(self._decode, item) for item in next(chunks, [])]
+
+                # Commit every chunk, so the UI and the storage writer can write in between
+                with storage.batch():
+                    for future in current:
+                        item, content = future.result()
+                        if content is None:
+                            failed += 1
+                            continue
+
+                        folder_path = folder_paths.get(item.folders)
+                        if folder_path is None:
+                            folder_path, created = self._ensure_folders(storage, path, item.folders)
+                            folder_paths[item.folders] = folder_path
+                            folders += created
+
+                        storage.add(Document(title=item.title, content=content, folder=folder_path))
+                        imported += 1
+
+                now = time.monotonic()
+                if now - reported >= self.PROGRESS_INTERVAL:
+                    reported = now
+                    GLib.idle_add(self._on_progress, imported + failed, total, imported / max(now - started, 1e-6))
+
+        return imported, folders, failed
+
+    @staticmethod
+    def _ensure_folders(storage: Storage, path: str, folders: Tuple[str, ...]) -> Tuple[str, int]:
+        """Returns absolute path of the nested `folders` inside `path`, creating the missing ones.
+        """
+        created = 0
+        current = path
+        for title in folders:
+            folder_path = os.path.join(current, title)
+            if not storage.folder_tree.get(folder_path):
+                try:
+                    storage.add_folder(title, current)
+                    created += 1
+                except sqlite3.IntegrityError:
+                    # The folder was created from the UI meanwhile, reload the cached tree
+                    storage.invalidate_folder_tree()
+            current = folder_path
+        return current, created
+
+    @classmethod
+    def _decode(cls, item: ImportItem) -> Tuple[ImportItem, Optional[str]]:
+        try:
+            return item, cls.decode(item.read())
+        except Exception as e:
+            Logger.error(e)
+            return item, None
+
+    @staticmethod
+    def decode(data: bytes) -> str:
+        """Decodes file contents detecting its charset.
+
+        Byte order marks and UTF-8 are checked first, then `charset_normalizer` is used when installed.
+        """
+        for bom, encoding in ((codecs.BOM_UTF32_LE, 'utf-32'), (codecs.BOM_UTF32_BE, 'utf-32'),
+                              (codecs.BOM_UTF8, 'utf-8-sig'),
+                              (codecs.BOM_UTF16_LE, 'utf-16'), (codecs.BOM_UTF16_BE, 'utf-16')):
+            if data.startswith(bom):
+                return data.decode(encoding)
+
+        try:
+            return data.decode('utf-8')
+        except UnicodeDecodeError:
+            pass
+
+        if detect_charset is not None:
+            match = detect_charset(data).best()
+            if match is not None:
+                return str(match)
+
+        try:
+            return data.decode(locale.getpreferredencoding(False))
+        except (UnicodeDecodeError, LookupError):
+            return data.decode('latin-1')
+
+    @classmethod
+    def _is_text(cls, name: str) -> bool:
+        return name.lower().endswith(cls.EXTENSIONS) and not os.path.basename(name).startswith('.')
+
+    @classmethod
+    def _is_archive(cls, name: str) -> bool:
+        return name.lower().endswith(cls.ARCHIVES) and os.path.isfile(name)
+
+    @staticmethod
+    def _title(name: str) -> str:
+        return os.path.splitext(os.path.basename(name))[0]
+
+    def _on_progress(self, done: int, total: int, rate: float) -> bool:
+        self.emit('progress', done, total, rate)
+        return False
+
+    def _on_storage_changed(self) -> bool:
+        self.storage.invalidate_folder_tree()
+        self.storage.emit('bulk-changed')
+        return False
+
+    def _on_finished(self, imported: int, elapsed: float) -> bool:
+        self.emit('finished', imported, elapsed)
+        return False
@@ -0,0 +1,113 @@
+# library_stats.py
+#
+# MIT License
+#
+# Copyright (c) 2020 Andrey Maksimov <meamka@ya.ru>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import hashlib
+from collections import namedtuple
+from typing import Iterable, List, Optional
+
+from gi.repository import GObject
+
+from norka import markup_tokenizer
+from norka.gobject_worker import GObjectWorker, Task, PRIORITY_BACKGROUND
+from norka.services.stats_counter import StatsCounter
+from norka.services.storage import Storage
+
+FolderStats = namedtuple('FolderStats', ['path', 'documents', 'words', 'read_time'])
+LongDocument = namedtuple('LongDocument', ['document_id', 'title', 'path', 'words', 'read_time'])
+
+
+class LibraryStats(GObject.GObject):
+    """Keeps stats of every document cached in the storage and answers library-wide queries.
+
+    Stats are counted in the background whenever documents are added or saved and stored
+    with the hash of the content they were counted for, so unchanged documents are
+    never parsed again. Queries only read the cached numbers.
+
+    Emits `changed` once new stats are stored.
+    """
+    __gtype_name__ = 'LibraryStats'
+    __gsignals__ = {
+        'changed': (GObject.SignalFlags.ACTION, None, ()),
+    }
+
+    def __init__(self, storage: Storage):
+        super().__init__()
+        self.storage = storage
+        self.storage.connect('document-added', self.on_document_changed)
+        self.storage.connect('document-updated', self.on_document_changed)
+        self.storage.connect('bulk-changed', self.on_bulk_changed)
+
+    def on_document_changed(self, storage: Storage, doc_id: int, *args) -> None:
+        self.refresh((doc_id,))
+
+    def on_bulk_changed(self, storage: Storage) -> None:
+        self.refresh()
+
+    def refresh(self, doc_ids: Iterable[int] = None) -> Task:
+        """Recounts stats of the given documents, or of all the documents, whose content has changed.
+        """
+        doc_ids = tuple(doc_ids) if doc_ids is not None else None
+        # Saves of the same document in a row must not share a task which has already read old content
+        return GObjectWorker.call(self.count, (doc_ids,), self.on_counted,
+                                  priority=PRIORITY_BACKGROUND, dedup=doc_ids is None)
+
+    def count(self, doc_ids: Optional[tuple] = None) -> List[tuple]:
+        """Counts stats of documents with stale or missing stats. Runs in a worker thread.
+
+        Returns a list of `(doc_id, content_hash, characters, words, sentences, paragraphs)`.
+        """
+        stats = []
+        with self.storage.read_only() as reader:
+            for doc_id, content, content_hash in reader.iter_stats_sources(doc_ids):
+                content = content or ''
+                new_hash = hashlib.sha1(content.encode('utf-8')).hexdigest()
+                if new_hash != content_hash:
+                    stats.append((doc_id, new_hash, *markup_tokenizer.count(content)))
+        return stats
+
+    def on_counted(self, stats: List[tuple]) -> None:
+        if stats and self.storage.save_stats(stats):
+            self.emit('changed')
+
+    def document(self, doc_id: int) -> Optional[tuple]:
+        """Returns cached `(characters, words, sentences, paragraphs)` of the document.
+        """
+        return self.storage.get_stats(doc_id)
+
+    def words(self, path: str = None) -> int:
+        """Returns the number of words in the `path` including subfolders, or in the whole library.
+        """
+        return self.storage.count_words(path)[1]
+
+    def folders(self) -> List[FolderStats]:
+        """Returns words and read time of every folder with documents.
+        """
+        return [FolderStats(path, documents, words, StatsCounter.read_time(words))
+                for path, documents, words in self.storage.words_by_folder()]
+
+    def longest(self, limit: int = 5) -> List[LongDocument]:
+        """Returns documents with the most words.
+        """
+        return [LongDocument(doc_id, title, path, words, StatsCounter.read_time(words))
+                for doc_id, title, path, words in self.storage.longest_documents(limit)]
@@ -0,0 +1,190 @@
+# outline.py
+#
+# MIT License
+#
+# Copyright (c) 2020 Andrey Maksimov <meamka@ya.ru>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+from typing import Callable, List, Optional, Tuple
+
+from norka.markup_regex import HEADER, HEADER_UNDER, FENCE
+
+Heading = namedtuple('Heading', ['line', 'level', 'title'])
+
+
+class Outline:
+    """Index of document headings, updated incrementally as lines are edited.
+
+    Headings are recognized with `HEADER` (`# Title`) and `HEADER_UNDER` (setext, title
+    underlined with `=` or `-`). Lines opening or closing fenced code are indexed too,
+    so headings inside code blocks are left out of the outline.
+
+    Edits only shift line numbers of the entries below them and mark the edited lines
+    dirty, which are then parsed again with :func:`rescan`. Lookups use binary search.
+    """
+
+    def __init__(self):
+        # Sorted line numbers of heading candidates and their (level, title)
+        self.lines: List[int] = []
+        self.entries: List[Tuple[int, str]] = []
+        # Sorted line numbers of code fences
+        self.fences: List[int] = []
+        # Range of lines to parse again as (first, last), inclusive
+        self.dirty: Optional[Tuple[int, int]] = None
+        self._headings: Optional[List[Heading]] = None
+        self._heading_lines: Optional[List[int]] = None
+
+    def reset(self, text: str) -> None:
+        """Indexes the whole `text`.
+        """
+        lines = text.split('\n')
+        self.lines, self.entries, self.fences = [], [], []
+        self.dirty = None
+        self._parse_range(0, len(lines) - 1, lines.__getitem__, len(lines))
+
+    def replace_lines(self, line: int, removed: int, added: int) -> None:
+        """Updates the index for an edit at `line`, before the edit is applied to the text.
+
+        `removed` is the number of newlines deleted and `added` is the number of newlines
+        inserted by the edit. Entries on the edited lines are dropped and the entries below
+        are shifted. Lines around the edit are marked dirty, because a setext heading depends
+        on the line after it and on the blank line before it.
+        """
+        delta = added - removed
+        for lines, values in ((self.lines, self.entries), (self.fences, None)):
+            start = bisect_left(lines, line)
+            end = bisect_right(lines, line + removed)
+            lines[start:] = [number + delta for number in lines[end:]]
+            if values is not None:
+                del values[start:end]
+
+        first, last = max(line - 1, 0), line + added + 1
+        if self.dirty:
+            dirty_first, dirty_last = self.dirty
+            first = min(first, self._shift(dirty_first, line, removed, added))
+            last = max(last, self._shift(dirty_last, line, removed, added))
+        self.dirty = (first, last)
+        self._headings = None
+
+    @staticmethod
+    def _shift(number: int, line: int, removed: int, added: int) -> int:
+        if number > line + removed:
+            return number + added - removed
+        return min(number, line + added)
+
+    def rescan(self, get_line: Callable[[int], str], line_count: int) -> bool:
+        """Parses dirty lines again. `get_line` returns text of the line by its number.
+
+        Returns True if anything was dirty.
+        """
+        if not self.dirty:
+            return False
+
+        first, last = self.dirty
+        self.dirty = None
+        last = min(last, line_count - 1)
+        if first > last:
+            return True
+
+        # Drop entries of dirty lines, they were possibly shifted into the range by edits
+        for lines, values in ((self.lines, self.entries), (self.fences, None)):
+            start = bisect_left(lines, first)
+            end = bisect_right(lines, last)
+            del lines[start:end]
+            if values is not None:
+                del values[start:end]
+
+        self._parse_range(first, last, get_line, line_count)
+        self._headings = None
+        return True
+
+    def _parse_range(self, first: int, last: int, get_line: Callable[[int], str], line_count: int) -> None:
+        lines, entries, fences = [], [], []
+        previous = get_line(first - 1) if first > 0 else ''
+        text = get_line(first) if first <= last else ''
+        for number in range(first, last + 1):
+            following = get_line(number + 1) if number + 1 < line_count else None
+
+            if FENCE.match(text):
+                fences.append(number)
+            else:
+                match = HEADER.match(text)
+                if match:
+                    lines.append(number)
+                    entries.append((len(match.group('level')), match.group('text').strip().rstrip('#').strip()))
+                elif following is not None and not previous.strip():
+                    match = HEADER_UNDER.match(f'\n\n{text}\n{following}')
+                    if match:
+                        lines.append(number)
+                        entries.append((1 if following.strip()[0] == '=' else 2, match.group('text').strip()))
+
+            previous, text = text, following
+
+        index = bisect_left(self.lines, first)
+        self.lines[index:index] = lines
+        self.entries[index:index] = entries
+        index = bisect_left(self.fences, first)
+        self.fences[index:index] = fences
+
+    @property
+    def headings(self) -> List[Heading]:
+        """Returns headings outside of fenced code, in the document order.
+        """
+        if self._headings is None:
+            headings = []
+            fence = 0
+            for line, (level, title) in zip(self.lines, self.entries):
+                # Headings after an odd number of fences are inside a code block
+                while fence < len(self.fences) and self.fences[fence] < line:
+                    fence += 1
+                if fence % 2 == 0:
+                    headings.append(Heading(line, level, title))
+            self._headings = headings
+            self._heading_lines = [heading.line for heading in headings]
+        return self._headings
+
+    @property
+    def heading_lines(self) -> List[int]:
+        """Returns line numbers of :attr:`headings`.
+        """
+        if self._headings is None:
+            self.headings
+        return self._heading_lines
+
+    def section_at(self, line: int) -> int:
+        """Returns the index of the heading of the section containing `line` or -1 if it is before any heading.
+        """
+        return bisect_right(self.heading_lines, line) - 1
+
+    def next_heading(self, line: int) -> Optional[Heading]:
+        """Returns the first heading below `line`.
+        """
+        headings = self.headings
+        index = bisect_right(self.heading_lines, line)
+        return headings[index] if index < len(headings) else None
+
+    def previous_heading(self, line: int) -> Optional[Heading]:
+        """Returns the last heading above `line`.
+        """
+        headings = self.headings
+        index = bisect_left(self.heading_lines, line) - 1
+        return headings[index] if index >= 0 else None
@@ -0,0 +1,116 @@
+# outline_handler.py
+#
+# MIT License
+#
+# Copyright (c) 2020 Andrey Maksimov <meamka@ya.ru>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+from typing import Optional
+
+from gi.repository import Gtk, GtkSource, GObject, GLib
+
+from norka.services.outline import Outline
+
+
+class OutlineHandler(GObject.GObject):
+    """Keeps :class:`Outline` of the buffer in sync with its edits.
+
+    Only lines touched by an edit are read from the buffer and parsed again.
+    Listeners are notified with `outline-changed` once the typing pauses.
+    """
+
+    # Delay in milliseconds before `outline-changed` is emitted after headings changed
+    NOTIFY_DELAY = 300
+
+    __gsignals__ = {
+        'outline-changed': (GObject.SignalFlags.ACTION, None, ()),
+    }
+
+    def __init__(self, buffer: GtkSource.Buffer):
+        super().__init__()
+
+        self.buffer = buffer
+        self.buffer.connect("insert-text", self.on_insert_text)
+        self.buffer.connect("delete-range", self.on_delete_range)
+        self.buffer.connect("changed", self.on_text_changed)
+
+        self.outline = Outline()
+        self.headings = []
+        self._notify_id: Optional[int] = None
+
+        # Edits are ignored while suspended, the buffer is indexed again on resume
+        self.suspended = False
+
+    def suspend(self) -> None:
+        """Stops tracking edits, e.g. while a document is being loaded into the buffer.
+        """
+        self.suspended = True
+
+    def resume(self) -> None:
+        if self.suspended:
+            self.suspended = False
+            self.reset()
+
+    def on_insert_text(self, _buf, location: Gtk.TextIter, text: str, _length: int):
+        if self.suspended:
+            return
+        self.outline.replace_lines(location.get_line(), 0, text.count('\n'))
+
+    def on_delete_range(self, _buf, start: Gtk.TextIter, end: Gtk.TextIter):
+        if self.suspended:
+            return
+        self.outline.replace_lines(start.get_line(), end.get_line() - start.get_line(), 0)
+
+    def on_text_changed(self, buf: GtkSource.Buffer):
+        if self.suspended or not self.outline.dirty:
+            return
+
+        # Read dirty lines with one line of context around them at once
+        line_count = buf.get_line_count()
+        first = max(self.outline.dirty[0] - 1, 0)
+        last = min(self.outline.dirty[1] + 1, line_count - 1)
+        start = buf.get_iter_at_line(first)
+        end = buf.get_iter_at_line(last)
+        if not end.ends_line():
+            end.forward_to_line_end()
+        lines = buf.get_text(start, end, False).split('\n')
+
+        self.outline.rescan(lambda number: lines[number - first], line_count)
+        self.schedule_notify()
+
+    def schedule_notify(self) -> None:
+        if self._notify_id is None:
+            self._notify_id = GLib.timeout_add(self.NOTIFY_DELAY, self.notify_changed)
+
+    def notify_changed(self) -> bool:
+        self._notify_id = None
+        headings = self.outline.headings
+        if headings != self.headings:
+            self.headings = headings
+            self.emit('outline-changed')
+        return False
+
+    def reset(self) -> None:
+        """Indexes the whole buffer again and notifies listeners right away.
+        """
+        self.outline.reset(self.buffer.get_text(self.buffer.get_start_iter(), self.buffer.get_end_iter(), False))
+        if self._notify_id is not None:
+            GLib.source_remove(self._notify_id)
+        self.notify_changed()
@@ -0,0 +1,179 @@
+# preview_renderer.py
+#
+# MIT License
+#
+# Copyright (c) 2020 Andrey Maksimov <meamka@ya.ru>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import hashlib
+import re
+import threading
+from collections import OrderedDict, namedtuple
+from typing import Callable, List, Optional, Tuple
+
+FENCE_RE = re.compile(r'^ {0,3}(`{3,}|~{3,})')
+LIST_RE = re.compile(r'^ {0,3}([*+-]|\d+[.)])\s')
+# Reference links and footnotes are resolved across the whole document
+REFERENCE_RE = re.compile(r'^ {0,3}\[\^?[^\]]+\]:', re.MULTILINE)
+
+# Replaces `count` blocks starting at `start` with the given rendered blocks
+PATCH_SCRIPT = """
+function norkaPatch(start, count, blocks) {
+    const main = document.querySelector('main');
+    for (let i = 0; i < count && main.children[start]; i++) {
+        main.children[start].remove();
+    }
+    const next = main.children[start] || null;
+    for (const html of blocks) {
+        const block = document.createElement('div');
+        block.className = 'norka-block';
+        block.innerHTML = html;
+        main.insertBefore(block, next);
+    }
+}
+"""
+
+RenderResult = namedtuple('RenderResult', ['generation', 'blocks'])
+
+
+class PreviewRenderer:
+    """Renders markdown for the preview block by block.
+
+    Rendered blocks are cached by the hash of their text, so after an edit only
+    the changed blocks go through markdown again. `patch` compares the new blocks
+    with the ones shown in the page and returns the smallest range to replace.
+
+    Every render request gets a generation number, renders of older generations
+    are abandoned as soon as a newer one is requested.
+    """
+
+    CACHE_SIZE = 2048
+
+    def __init__(self, render_block: Callable[[str], str], cache_size: int = CACHE_SIZE):
+        self.render_block = render_block
+        self.cache_size = cache_size
+        self.cache: OrderedDict = OrderedDict()
+        self.lock = threading.Lock()
+        self.generation = 0
+        # Keys of the blocks currently shown in the page
+        self.keys: List[str] = []
+
+    def next_generation(self) -> int:
+        self.generation += 1
+        return self.generation
+
+    def render(self, text: str, generation: int) -> Optional[RenderResult]:
+        """Returns rendered `(key, html)` blocks of the `text` or `None` if the render became stale.
+
+        Safe to call from a worker thread.
+        """
+        blocks = []
+        for block in self.split(text):
+            if generation != self.generation:
+                return None
+
+            key = hashlib.sha1(block.encode('utf-8')).hexdigest()
+            with self.lock:
+                html = self.cache.get(key)
+                if html is not None:
+                    self.cache.move_to_end(key)
+
+            if html is None:
+                html = self.render_block(block)
+                with self.lock:
+                    self.cache[key] = html
+                    if len(self.cache) > self.cache_size:
+                        self.cache.popitem(last=False)
+
+            blocks.append((key, html))
+
+        return RenderResult(generation, blocks)
+
+    def patch(self, blocks: List[Tuple[str, str]]) -> Tuple[int, int, List[str]]:
+        """Returns `(start, removed, added)` to turn the shown blocks into `blocks`.
+
+        `removed` blocks starting at `start` have to be replaced with `added` html blocks.
+        """
+        keys = [key for key, _ in blocks]
+        limit = min(len(keys), len(self.keys))
+
+        start = 0
+        while start < limit and keys[start] == self.keys[start]:
+            start += 1
+
+        end = 0
+        while end < limit - start and keys[-end - 1] == self.keys[-end - 1]:
+            end += 1
+
+        removed = len(self.keys) - start - end
+        added = [html for _, html in blocks[start:len(blocks) - end]]
+        self.keys = keys
+        return start, removed, added
+
+    def reset(self, blocks: List[Tuple[str, str]]) -> str:
+        """Marks `blocks` as shown and returns the page body with all of them.
+        """
+        self.keys = [key for key, _ in blocks]
+        return ''.join(f'<div class="norka-block">{html}</div>' for _, html in blocks)
+
+    @staticmethod
+    def split(text: str) -> List[str]:
+        """Splits markdown `text` into blocks that render the same separately as in the whole text.
+
+        Blocks are separated by blank lines outside of fenced code. Indented lines and list items
+        that follow a list stay in the same block, so lists are not broken apart.
+        Documents with reference links or footnotes are rendered as a single block.
+        """
+        if REFERENCE_RE.search(text):
+            return [text] if text.strip() else []
+
+        blocks: List[List[str]] = []
+        current: List[str] = []
+        fence = None
+
+        for line in text.split('\n'):
+            if fence:
+                current.append(line)
+                stripped = line.strip()
+                if stripped.startswith(fence) and not stripped.strip(fence[0]):
+                    fence = None
+                continue
+
+            if not line.strip():
+                if current:
+                    blocks.append(current)
+                    current = []
+                continue
+
+            if not current and blocks:
+                previous = blocks[-1]
+                if line[0] in ' \t' or (LIST_RE.match(line) and LIST_RE.match(previous[0])):
+                    current = blocks.pop()
+                    current.append('')
+
+            match = FENCE_RE.match(line)
+            if match:
+                fence = match.group(1)
+            current.append(line)
+
+        if current:
+            blocks.append(current)
+
+        return ['\n'.join(block) for block in blocks]
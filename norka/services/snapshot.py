@@ -0,0 +1,235 @@
+# snapshot.py
+#
+# MIT License
+#
+# Copyright (c) 2020 Andrey Maksimov <meamka@ya.ru>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import gzip
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+from collections import namedtuple
+from datetime import datetime
+from typing import BinaryIO, Callable, List, Optional
+
+from norka.services.logger import Logger
+from norka.services.storage import Storage
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+Snapshot = namedtuple('Snapshot', ['path', 'created', 'compression'])
+
+
+class SnapshotService:
+    """Makes consistent compressed single-file snapshots of the storage database.
+
+    The database is copied with the SQLite online backup API page by page, so writers are
+    only blocked for a single step. The copy is verified with `PRAGMA integrity_check`
+    and streamed through the compressor, memory usage doesn't depend on the database size.
+    Restoring goes the same path in reverse. Methods block, call them from a worker thread.
+    """
+
+    # Pages copied per backup step and pause between steps in seconds.
+    PAGES_PER_STEP = 1024
+    STEP_SLEEP = 0.005
+
+    # Chunk size used to stream data through the compressor.
+    CHUNK_SIZE = 1024 * 1024
+
+    PREFIX = 'norka-'
+    EXTENSIONS = {'zstd': '.db.zst', 'gzip': '.db.gz', None: '.db'}
+    # Snapshots made within the same second get a sequence number suffix
+    NAME_REGEXP = re.compile(r'^norka-(\d{8}-\d{6})(?:-(\d+))?\.db(\.gz|\.zst)?$')
+    TIME_FORMAT = '%Y%m%d-%H%M%S'
+
+    def __init__(self, storage: Storage, snapshot_dir: str = None, compression: Optional[str] = 'zstd',
+                 keep_daily: int = 7, keep_weekly: int = 4):
+        self.storage = storage
+        self.snapshot_dir = snapshot_dir or os.path.join(storage.base_path, 'snapshots')
+        if compression == 'zstd' and zstandard is None:
+            compression = 'gzip'
+        self.compression = compression
+        self.keep_daily = keep_daily
+        self.keep_weekly = keep_weekly
+
+    def create(self, progress: Callable[[int, int], None] = None) -> str:
+        """Makes a snapshot, verifies it and rotates old ones. Returns path to the snapshot.
+
+        `progress` is called with the number of remaining and total pages after each step.
+        """
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        created = datetime.now()
+
+        with tempfile.TemporaryDirectory(dir=self.snapshot_dir) as tmp_dir:
+            db_path = os.path.join(tmp_dir, 'snapshot.db')
+
+            with self.storage.readers.connection() as source:
+                self._copy(source, db_path, progress)
+            self.verify_database(db_path)
+
+            tmp_path = os.path.join(tmp_dir, 'snapshot' + self.EXTENSIONS[self.compression])
+            with open(db_path, 'rb') as src, self._open(tmp_path, 'wb', self.compression) as dst:
+                shutil.copyfileobj(src, dst, self.CHUNK_SIZE)
+            snapshot_path = self._snapshot_path(created)
+            os.replace(tmp_path, snapshot_path)
+
+        Logger.info('Snapshot %s created', snapshot_path)
+        self.rotate()
+        return snapshot_path
+
+    def _snapshot_path(self, created: datetime) -> str:
+        """Returns a path for the new snapshot which doesn't replace an existing one.
+        """
+        name = f'{self.PREFIX}{created.strftime(self.TIME_FORMAT)}'
+        extension = self.EXTENSIONS[self.compression]
+        snapshot_path = os.path.join(self.snapshot_dir, name + extension)
+        sequence = 1
+        while os.path.exists(snapshot_path):
+            snapshot_path = os.path.join(self.snapshot_dir, f'{name}-{sequence}{extension}')
+            sequence += 1
+        return snapshot_path
+
+    def restore(self, snapshot_path: str, progress: Callable[[int, int], None] = None) -> None:
+        """Replaces the storage content with the given snapshot.
+
+        The snapshot is verified before anything is changed.
+        """
+        compression = self._compression(snapshot_path)
+        with tempfile.TemporaryDirectory(dir=os.path.dirname(self.storage.file_path) or None) as tmp_dir:
+            db_path = os.path.join(tmp_dir, 'restore.db')
+            with self._open(snapshot_path, 'rb', compression) as src, open(db_path, 'wb') as dst:
+                shutil.copyfileobj(src, dst, self.CHUNK_SIZE)
+            self.verify_database(db_path)
+
+            # Queued editor saves belong to the state being replaced
+            self.storage.flush()
+
+            source = sqlite3.connect(db_path)
+            try:
+                # Own connection, so the UI connection is not used from this thread
+                target = sqlite3.connect(self.storage.file_path)
+                try:
+                    source.backup(target, pages=self.PAGES_PER_STEP, progress=self._progress(progress),
+                                  sleep=self.STEP_SLEEP)
+                finally:
+                    target.close()
+            finally:
+                source.close()
+
+        Logger.info('Snapshot %s restored', snapshot_path)
+
+    def verify(self, snapshot_path: str) -> None:
+        """Decompresses snapshot into a temporary file and checks its integrity.
+
+        Raises :class:`sqlite3.DatabaseError` if the snapshot is damaged.
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db_path = os.path.join(tmp_dir, 'verify.db')
+            with self._open(snapshot_path, 'rb', self._compression(snapshot_path)) as src, open(db_path, 'wb') as dst:
+                shutil.copyfileobj(src, dst, self.CHUNK_SIZE)
+            self.verify_database(db_path)
+
+    @staticmethod
+    def verify_database(db_path: str) -> None:
+        conn = sqlite3.connect(db_path)
+        try:
+            result = [row[0] for row in conn.execute('PRAGMA integrity_check')]
+        finally:
+            conn.close()
+
+        if result != ['ok']:
+            raise sqlite3.DatabaseError(f'Snapshot integrity check failed: {"; ".join(result)}')
+
+    def list(self) -> List[Snapshot]:
+        """Returns snapshots from the snapshot folder, the newest first.
+        """
+        if not os.path.isdir(self.snapshot_dir):
+            return []
+
+        snapshots = []
+        for name in os.listdir(self.snapshot_dir):
+            match = self.NAME_REGEXP.match(name)
+            if match:
+                snapshot_path = os.path.join(self.snapshot_dir, name)
+                snapshot = Snapshot(snapshot_path, datetime.strptime(match.group(1), self.TIME_FORMAT),
+                                    self._compression(snapshot_path))
+                snapshots.append((snapshot.created, int(match.group(2) or 0), snapshot))
+        return [snapshot for *_, snapshot in sorted(snapshots, key=lambda item: item[:2], reverse=True)]
+
+    def rotate(self) -> List[str]:
+        """Removes snapshots not needed by the retention policy. Returns removed paths.
+
+        The newest snapshot of each of the last `keep_daily` days and of each
+        of the last `keep_weekly` ISO weeks is kept.
+        """
+        days, weeks = set(), set()
+        removed = []
+        for snapshot in self.list():
+            day = snapshot.created.date()
+            week = snapshot.created.isocalendar()[:2]
+
+            keep = False
+            if day not in days and len(days) < self.keep_daily:
+                days.add(day)
+                keep = True
+            if week not in weeks and len(weeks) < self.keep_weekly:
+                weeks.add(week)
+                keep = True
+
+            if not keep:
+                os.remove(snapshot.path)
+                removed.append(snapshot.path)
+        return removed
+
+    def _copy(self, source: sqlite3.Connection, db_path: str, progress: Callable[[int, int], None] = None) -> None:
+        target = sqlite3.connect(db_path)
+        try:
+            source.backup(target, pages=self.PAGES_PER_STEP, progress=self._progress(progress), sleep=self.STEP_SLEEP)
+            # Snapshot has to be a single file
+            target.execute('PRAGMA journal_mode=DELETE')
+        finally:
+            target.close()
+
+    @staticmethod
+    def _progress(callback: Callable[[int, int], None] = None):
+        if callback is None:
+            return None
+        return lambda status, remaining, total: callback(remaining, total)
+
+    def _compression(self, snapshot_path: str) -> Optional[str]:
+        for compression, extension in self.EXTENSIONS.items():
+            if compression and snapshot_path.endswith(extension):
+                return compression
+        return None
+
+    @staticmethod
+    def _open(file_path: str, mode: str, compression: Optional[str]) -> BinaryIO:
+        if compression == 'gzip':
+            return gzip.open(file_path, mode)
+        if compression == 'zstd':
+            if zstandard is None:
+                raise RuntimeError('zstandard module is required to handle zstd snapshots')
+            return zstandard.open(file_path, mode)
+        return open(file_path, mode)
@@ -22,108 +22,165 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
-import re
-from multiprocessing import Process, Pipe
+import struct
+from multiprocessing import Process, Pipe, resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from typing import Dict, Optional, Tuple
 
 from gi.repository import GLib
 
-from norka.markup_regex import (
-    ITALIC_ASTERISK, ITALIC_UNDERSCORE, BOLD_ITALIC, BOLD, STRIKETHROUGH, IMAGE, LINK, LINK_ALT,
-    HORIZONTAL_RULE, LIST, MATH, TABLE, CODE_BLOCK, HEADER_UNDER, HEADER, BLOCK_QUOTE, ORDERED_LIST, FOOTNOTE_ID,
-    FOOTNOTE
-)
+from norka import markup_tokenizer
 
 
 class StatsCounter:
-    """Counts characters, words, sentences and read time using a worker process."""
+    """Counts characters, words, sentences and paragraphs of text blocks using a worker process.
 
-    # Regexp that matches any character, except for newlines and subsequent spaces.
-    CHARACTERS = re.compile(r"[^\s]|(?:[^\S\n](?!\s))")
+    Small requests are pickled through the pipe. Large ones are written as UTF-8 into a
+    shared memory segment, and only block offsets are sent, so the text is not pickled
+    and copied through the pipe. The segment is reused between requests and only grows.
+    """
 
-    # Regexp that matches Asian letters, general symbols and hieroglyphs,
-    # as well as sequences of word characters optionally containing non-word characters in-between.
-    WORDS = re.compile(r"[\u3040-\uffff]|(?:\w+\S?\w*)+", re.UNICODE)
+    # Total length of blocks text starting from which shared memory is used
+    SHARED_MEMORY_THRESHOLD = 64 * 1024
 
-    # Regexp that matches sentence-ending punctuation characters, ie. full stop, question mark,
-    # exclamation mark, paragraph, and variants.
-    SENTENCES = re.compile(r"[^\n][.。।෴۔።?՞;⸮؟？፧꘏⳺⳻⁇﹖⁈⁉‽!﹗！՜߹႟᥄\n]+")
+    # Header of the shared memory segment: generation of the request written to it
+    HEADER = struct.Struct('<Q')
 
-    # Regexp that matches paragraphs, ie. anything separated by at least 2 newlines.
-    PARAGRAPHS = re.compile(r"[^\n]+(\n{2,}|$)")
-
-    # List of regexp whose matches should be replaced by their "text" group. Order is important.
-    MARKUP_REGEXP_REPLACE = (
-        BOLD_ITALIC, ITALIC_ASTERISK, ITALIC_UNDERSCORE, BOLD, STRIKETHROUGH, IMAGE, LINK, LINK_ALT, LIST, ORDERED_LIST,
-        BLOCK_QUOTE, HEADER, HEADER_UNDER, CODE_BLOCK, TABLE, MATH, FOOTNOTE_ID, FOOTNOTE
-    )
-
-    # List of regexp whose matches should be removed. Order is important.
-    MARKUP_REGEXP_REMOVE = (
-        HORIZONTAL_RULE,
-    )
-
-    def __init__(self, callback):
+    def __init__(self, callback, shared_memory: bool = True):
         super().__init__()
 
         # Worker process to handle counting.
         self.counting = False
-        self.count_pending_text = None
+        self.count_pending_blocks = None
+        self.shared_memory = shared_memory
+        self.segment: Optional[SharedMemory] = None
+        self.generation = 0
+        if shared_memory:
+            # Start the tracker before forking, so the worker shares it and
+            # does not unlink segments it attaches to when it exits.
+            resource_tracker.ensure_running()
         self.parent_conn, child_conn = Pipe()
         Process(target=self.do_count, args=(child_conn,), daemon=True).start()
         GLib.io_add_watch(
             self.parent_conn.fileno(), GLib.PRIORITY_LOW, GLib.IO_IN, self.on_counted, callback)
 
-    def count(self, text):
-        """Count stats for text.
+    def count(self, blocks: Dict[int, str]):
+        """Count stats for text blocks given as a dict of `{key: text}`.
 
-        In case counting is already running, it will re-count once it finishes. This ensure that
-        the pipe doesn't fill (and block) if multiple requests are made in quick succession."""
+        In case counting is already running, blocks are queued and counted once it finishes.
+        This ensure that the pipe doesn't fill (and block) if multiple requests are made
+        in quick succession."""
 
         if not self.counting:
             self.counting = True
-            self.count_pending_text = None
-            self.parent_conn.send(text)
+            self.count_pending_blocks = None
+            if self.shared_memory and sum(map(len, blocks.values())) >= self.SHARED_MEMORY_THRESHOLD:
+                self.parent_conn.send(self.write_shared(blocks))
+            else:
+                self.parent_conn.send(blocks)
+        elif self.count_pending_blocks is None:
+            self.count_pending_blocks = dict(blocks)
         else:
-            self.count_pending_text = text
+            self.count_pending_blocks.update(blocks)
+
+    def write_shared(self, blocks: Dict[int, str]) -> Tuple[str, int, list]:
+        """Writes blocks to the shared memory segment and returns the message for the worker.
+
+        The message is `(segment_name, generation, [(key, offset, length), ...])`.
+        Must only be called while the worker is not reading the segment.
+        """
+        self.generation += 1
+        index = []
+        offset = self.HEADER.size
+        for key, text in blocks.items():
+            data = text.encode('utf-8')
+            self.reserve(offset, offset + len(data))
+            self.segment.buf[offset:offset + len(data)] = data
+            index.append((key, offset, len(data)))
+            offset += len(data)
+
+        self.reserve(offset, offset)
+        self.HEADER.pack_into(self.segment.buf, 0, self.generation)
+        return self.segment.name, self.generation, index
+
+    def reserve(self, used: int, size: int) -> None:
+        """Makes the segment at least `size` bytes long, keeping its first `used` bytes.
+        """
+        if self.segment is not None and self.segment.size >= size:
+            return
+
+        previous = self.segment
+        self.segment = SharedMemory(create=True, size=max(size, 2 * previous.size if previous else size, 1 << 20))
+        if previous is not None:
+            self.segment.buf[:used] = previous.buf[:used]
+            previous.close()
+            previous.unlink()
+
+    @staticmethod
+    def read_shared(message: Tuple[str, int, list], segment: Optional[SharedMemory]):
+        """Reads blocks of the `message` from the shared memory in the worker process.
+
+        Returns `(blocks, segment)`, where `segment` is the attached segment to reuse for the next message.
+        """
+        name, generation, index = message
+        if segment is None or segment.name != name:
+            if segment is not None:
+                segment.close()
+            segment = SharedMemory(name)
+
+        if StatsCounter.HEADER.unpack_from(segment.buf, 0)[0] != generation:
+            # The segment was overwritten by a newer request, it comes next
+            return {}, segment
+
+        # Decode straight from the shared buffer without copying it into bytes first
+        return {key: str(segment.buf[offset:offset + length], 'utf-8') for key, offset, length in index}, segment
+
+    @classmethod
+    def count_text(cls, text: str) -> Tuple[int, int, int, int]:
+        """Counts stats for the given `text`.
+
+        The result is in the format: (characters, words, sentences, paragraphs)"""
+
+        return markup_tokenizer.count(text)
+
+    @staticmethod
+    def read_time(word_count: int) -> Tuple[int, int, int]:
+        """Returns read time for the given `word_count` in the format: (hours, minutes, seconds)"""
+
+        read_m, read_s = divmod(word_count / 200 * 60, 60)
+        read_h, read_m = divmod(read_m, 60)
+        return int(read_h), int(read_m), int(read_s)
 
     def do_count(self, child_conn):
-        """Counts stats in a worker process.
+        """Counts stats of text blocks in a worker process.
 
-        The result is in the format: (characters, words, sentences, (hours, minutes, seconds))"""
+        The result is a dict of `{key: (characters, words, sentences, paragraphs)}`"""
 
+        segment = None
         while True:
+            blocks = {}
             while True:
                 try:
-                    text = child_conn.recv()
+                    message = child_conn.recv()
+                    if isinstance(message, tuple):
+                        message, segment = self.read_shared(message, segment)
+                    blocks.update(message)
                     if not child_conn.poll():
                         break
                 except EOFError:
                     child_conn.close()
+                    if segment is not None:
+                        segment.close()
                     return
 
-            for regexp in self.MARKUP_REGEXP_REPLACE:
-                text = re.sub(regexp, r"\g<text>", text)
-            for regexp in self.MARKUP_REGEXP_REMOVE:
-                text = re.sub(regexp, "", text)
-
-            character_count = len(re.findall(self.CHARACTERS, text))
-            word_count = len(re.findall(self.WORDS, text))
-            sentence_count = len(re.findall(self.SENTENCES, text))
-            paragraph_count = len(re.findall(self.PARAGRAPHS, text))
-
-            read_m, read_s = divmod(word_count / 200 * 60, 60)
-            read_h, read_m = divmod(read_m, 60)
-            read_time = (int(read_h), int(read_m), int(read_s))
-
-            child_conn.send(
-                (character_count, word_count, sentence_count, paragraph_count, read_time))
+            child_conn.send({key: self.count_text(text) for key, text in blocks.items()})
 
     def on_counted(self, _source, _condition, callback):
         """Reads the counting result from the pipe and triggers any pending count."""
 
         self.counting = False
-        if self.count_pending_text is not None:
-            self.count(self.count_pending_text)  # self.count clears the pending text.
+        if self.count_pending_blocks is not None:
+            self.count(self.count_pending_blocks)  # self.count clears the pending blocks.
 
         try:
             if self.parent_conn.poll():
@@ -135,3 +192,7 @@ class StatsCounter:
     def stop(self):
         """Stops the worker process. StatsCounter shouldn't be used after this."""
         self.parent_conn.close()
+        if self.segment is not None:
+            self.segment.close()
+            self.segment.unlink()
+            self.segment = None
@@ -26,9 +26,10 @@
 from collections import namedtuple
 from gettext import gettext as _
 
-from gi.repository import GtkSource, GObject
+from gi.repository import Gtk, GtkSource, GObject
 
 from norka.services.stats_counter import StatsCounter
+from norka.services.text_blocks import TextBlocks
 
 DocumentStats = namedtuple('Stats', ['characters', 'words', 'sentences', 'paragraphs', 'read_time'])
 
@@ -51,14 +52,64 @@ class StatsHandler(GObject.GObject):
         super().__init__()
 
         self.buffer = buffer
+        self.buffer.connect("insert-text", self.on_insert_text)
+        self.buffer.connect("delete-range", self.on_delete_range)
         self.buffer.connect("changed", self.on_text_changed)
 
         self.stats = DocumentStats(0, 0, 0, 0, (0, 0, 0))
 
+        # Paragraph blocks of the buffer and their counts by block hash.
+        # Only blocks touched by edits are read from the buffer and recounted.
+        self.blocks = TextBlocks()
+        self.blocks_stats = {}
+
         self.stats_counter = StatsCounter(self.update_stats)
 
+        # Edits are ignored while suspended, the buffer is recounted on resume
+        self.suspended = False
+
+    def suspend(self) -> None:
+        """Stops tracking edits, e.g. while a document is being loaded into the buffer.
+        """
+        self.suspended = True
+
+    def resume(self) -> None:
+        """Starts tracking edits again and recounts the whole buffer once.
+        """
+        if self.suspended:
+            self.suspended = False
+            self.blocks.reset(self.buffer.get_line_count())
+            self.on_text_changed(self.buffer)
+
+    def on_insert_text(self, _buf, location: Gtk.TextIter, text: str, _length: int):
+        if self.suspended:
+            return
+        self.blocks.replace_lines(location.get_line(), 0, text.count('\n'))
+
+    def on_delete_range(self, _buf, start: Gtk.TextIter, end: Gtk.TextIter):
+        if self.suspended:
+            return
+        self.blocks.replace_lines(start.get_line(), end.get_line() - start.get_line(), 0)
+
     def on_text_changed(self, buf):
-        self.stats_counter.count(buf.get_text(buf.get_start_iter(), buf.get_end_iter(), False))
+        if self.suspended:
+            return
+
+        pending = {}
+        for index, start_line, line_count in reversed(self.blocks.dirty()):
+            start = buf.get_iter_at_line(start_line)
+            end = buf.get_iter_at_line(start_line + line_count - 1)
+            if not end.ends_line():
+                end.forward_to_line_end()
+
+            for key, text in self.blocks.resolve(index, buf.get_text(start, end, False)):
+                if key not in self.blocks_stats:
+                    pending[key] = text
+
+        if pending:
+            self.stats_counter.count(pending)
+        else:
+            self.update_totals()
 
     # def get_text_for_stat(self, stat):
     #     if stat == self.CHARACTERS:
@@ -74,8 +125,27 @@ class StatsHandler(GObject.GObject):
     #     else:
     #         raise ValueError("Unknown stat {}".format(stat))
 
-    def update_stats(self, stats):
-        self.stats = DocumentStats(*stats)
+    def update_stats(self, blocks_stats):
+        self.blocks_stats.update(blocks_stats)
+
+        # Forget counts of blocks that are not in the text anymore
+        if len(self.blocks_stats) > 2 * len(self.blocks):
+            keys = set(self.blocks.keys)
+            self.blocks_stats = {key: value for key, value in self.blocks_stats.items() if key in keys}
+
+        self.update_totals()
+
+    def update_totals(self):
+        characters = words = sentences = paragraphs = 0
+        for key in self.blocks.keys:
+            block_stats = self.blocks_stats.get(key)
+            if block_stats is not None:
+                characters += block_stats[0]
+                words += block_stats[1]
+                sentences += block_stats[2]
+                paragraphs += block_stats[3]
+
+        self.stats = DocumentStats(characters, words, sentences, paragraphs, StatsCounter.read_time(words))
         self.emit('update-document-stats')
 
     def on_destroy(self, _widget):
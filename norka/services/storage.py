@@ -25,36 +25,237 @@
 
 import os
 import sqlite3
+import threading
 import traceback
+from contextlib import contextmanager
 from datetime import datetime
-from typing import List, Optional
+from typing import Iterable, Iterator, List, Optional, Tuple
 
-from gi.repository import GLib
+from gi.repository import GLib, GObject
 
 from norka.define import APP_TITLE
 from norka.models.document import Document
+from norka.models.document_record import DocumentRecord
 from norka.models.folder import Folder
+from norka.models.search_result import SearchResult
+from norka.services.connection_pool import ConnectionPool
+from norka.services.folder_tree import FolderTree
 from norka.services.logger import Logger
+from norka.services.storage_writer import StorageWriter
 
 
-class Storage(object):
+class Storage(GObject.GObject):
     """Class intended to handle data storage operations.
 
     Current implementation uses SQLite3 database.
+
+    Every successful change is announced with a signal, so views can update
+    themselves without reloading everything:
+
+    - document-added (doc_id, path)
+    - document-updated (doc_id)
+    - document-moved (doc_id, path)
+    - document-deleted (doc_id)
+    - folder-added (absolute_path)
+    - folder-moved (old_absolute_path, new_absolute_path), also emitted on rename
+    - folder-deleted (absolute_path)
+    - bulk-changed, emitted instead of the signals above after a large :func:`batch`
+
+    Document content saves from the editor go through :attr:`writer`, which commits them
+    on its own thread and emits the same signals once they are written.
     """
+    __gtype_name__ = 'Storage'
+    __gsignals__ = {
+        'document-added': (GObject.SignalFlags.ACTION, None, (int, str,)),
+        'document-updated': (GObject.SignalFlags.ACTION, None, (int,)),
+        'document-moved': (GObject.SignalFlags.ACTION, None, (int, str,)),
+        'document-deleted': (GObject.SignalFlags.ACTION, None, (int,)),
+        'folder-added': (GObject.SignalFlags.ACTION, None, (str,)),
+        'folder-moved': (GObject.SignalFlags.ACTION, None, (str, str,)),
+        'folder-deleted': (GObject.SignalFlags.ACTION, None, (str,)),
+        'bulk-changed': (GObject.SignalFlags.ACTION, None, ()),
+    }
+
+    # Length of the document excerpt stored alongside the content for listings.
+    EXCERPT_LENGTH = 200
+
+    # Columns fetched for document listings, everything except `content`.
+    SUMMARY_COLUMNS = 'id, title, path, archived, created, modified, encrypted, excerpt'
+
+    # Pragmas applied to every connection. WAL lets background readers work while the document
+    # is being saved, and with WAL `synchronous=NORMAL` is still safe against corruption.
+    PRAGMAS = (
+        ('journal_mode', 'WAL'),
+        ('synchronous', 'NORMAL'),
+        ('cache_size', -16000),  # KiB
+        ('mmap_size', 256 * 1024 * 1024),
+        ('temp_store', 'MEMORY'),
+        ('busy_timeout', 5000),
+    )
+
+    # Number of read-only connections available to background readers.
+    READERS_COUNT = 4
+
+    # A batch with more changes than this emits single `bulk-changed` signal.
+    BATCH_SIGNALS_LIMIT = 50
 
     def __init__(self, storage_path: str):
+        GObject.GObject.__init__(self)
         self.conn = None
         self.version = None
+        self._folder_tree: Optional[FolderTree] = None
+        self._writer: Optional[StorageWriter] = None
+        self._readers: Optional[ConnectionPool] = None
+        # Serializes changes on the shared connection, so other threads never write into an open batch
+        self._lock = threading.RLock()
+        self._batch_depth = 0
+        self._batch_signals = []
         self.base_path = os.path.join(GLib.get_user_data_dir(), APP_TITLE)
         self.file_path = storage_path
 
-    def connect(self):
+    def open(self):
         """Connect to the database.
         """
         self.conn = sqlite3.connect(self.file_path,
                                     detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES,
                                     check_same_thread=False)
+        self.configure(self.conn)
+
+    @classmethod
+    def configure(cls, conn: sqlite3.Connection) -> None:
+        """Applies :const:`PRAGMAS` to the given connection.
+        """
+        for name, value in cls.PRAGMAS:
+            conn.execute(f'PRAGMA {name}={value}')
+
+    @property
+    def readers(self) -> ConnectionPool:
+        """Returns pool of read-only connections for background readers.
+        """
+        if self._readers is None:
+            self._readers = ConnectionPool(self.file_path, size=self.READERS_COUNT, configure=self.configure)
+        return self._readers
+
+    @contextmanager
+    def read_only(self):
+        """Returns read-only :class:`Storage` bound to a pooled connection.
+
+        Use it from worker threads for long reads like backups and exports::
+
+            with storage.read_only() as reader:
+                for doc in reader.iter_documents(path=None, with_content=True):
+                    ...
+        """
+        with self.readers.connection() as conn:
+            reader = Storage(self.file_path)
+            reader.conn = conn
+            reader.version = self.version
+            yield reader
+
+    @property
+    def writer(self) -> StorageWriter:
+        """Returns :class:`StorageWriter` which updates documents off the main thread.
+
+        The writer thread with its own connection is started on first use.
+        """
+        if self._writer is None:
+            self._writer = StorageWriter(self)
+        return self._writer
+
+    def flush(self) -> None:
+        """Waits until queued background writes are committed.
+        """
+        if self._writer is not None:
+            self._writer.flush()
+
+    def close(self) -> None:
+        """Commits queued writes and closes the database connection.
+        """
+        if self._writer is not None:
+            self._writer.stop()
+            self._writer = None
+        if self._readers is not None:
+            self._readers.close()
+            self._readers = None
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    @contextmanager
+    def batch(self):
+        """Groups storage changes into a single transaction.
+
+        Mutators called inside the `with` block are committed together when the block exits,
+        or rolled back all at once if it raises. Signals are emitted after the commit.
+        Changes from other threads wait until the batch is finished.
+        Batches can be nested, the outermost one commits::
+
+            with storage.batch():
+                storage.add(document)
+                storage.move(doc_id, '/Folder')
+        """
+        with self._lock:
+            if self._batch_depth:
+                self._batch_depth += 1
+                try:
+                    yield self
+                finally:
+                    self._batch_depth -= 1
+                return
+
+            self._batch_depth = 1
+            self._batch_signals = []
+            try:
+                if not self.conn.in_transaction:
+                    self.conn.execute('BEGIN')
+                yield self
+                self.conn.commit()
+            except BaseException:
+                self.conn.rollback()
+                # Folder tree might be changed by the rolled back statements
+                self.invalidate_folder_tree()
+                raise
+            else:
+                signals = self._batch_signals
+            finally:
+                self._batch_depth = 0
+                self._batch_signals = []
+
+        # Emit without the lock, handlers may wait for other threads changing the storage
+        self._emit_batched(signals)
+
+    @contextmanager
+    def _transaction(self):
+        """Runs the block atomically, in a savepoint when inside of :func:`batch`.
+        """
+        with self._lock:
+            if not self._batch_depth:
+                with self.conn:
+                    yield
+                return
+
+            self.conn.execute('SAVEPOINT storage_change')
+            try:
+                yield
+            except BaseException:
+                self.conn.execute('ROLLBACK TO storage_change')
+                self.conn.execute('RELEASE storage_change')
+                raise
+            self.conn.execute('RELEASE storage_change')
+
+    def _emit(self, signal: str, *args) -> None:
+        if self._batch_depth:
+            self._batch_signals.append((signal, args))
+        else:
+            self.emit(signal, *args)
+
+    def _emit_batched(self, signals: list) -> None:
+        if len(signals) > self.BATCH_SIGNALS_LIMIT:
+            self.emit('bulk-changed')
+            return
+
+        for signal, args in signals:
+            self.emit(signal, *args)
 
     def init(self) -> None:
         """Initialize database and create tables.
@@ -70,7 +271,7 @@ class Storage(object):
 
         Logger.info(f'Storage located at %s', self.file_path)
 
-        self.connect()
+        self.open()
 
         self.conn.execute("""
                 CREATE TABLE IF NOT EXISTS `documents` (
@@ -105,6 +306,21 @@ class Storage(object):
         if not version or version[0] < 2:
             self.v2_upgrade()
 
+        if not version or version[0] < 3:
+            self.v3_upgrade()
+
+        if not version or version[0] < 4:
+            self.v4_upgrade()
+
+        if not version or version[0] < 5:
+            self.v5_upgrade()
+
+        if not version or version[0] < 6:
+            self.v6_upgrade()
+
+        if not version or version[0] < 7:
+            self.v7_upgrade()
+
     def v1_upgrade(self) -> bool:
         """Upgrades database to version 1.
 
@@ -170,6 +386,223 @@ class Storage(object):
                 Logger.error(traceback.format_exc())
                 return False
 
+    def v3_upgrade(self) -> bool:
+        """Upgrades database to version 3.
+
+        Add tables:
+            - documents_fts - FTS5 full-text index over documents title and content
+
+        Add triggers:
+            - documents_fts_ai, documents_fts_ad, documents_fts_au - keep the index in sync with `documents`
+
+        :return: True if upgrade was successful, otherwise False
+        """
+        version = 3
+        with self.conn:
+            try:
+                Logger.info(f'Upgrading storage to version: {version}')
+                self.conn.execute("""
+                    CREATE VIRTUAL TABLE IF NOT EXISTS `documents_fts` USING fts5(
+                        title,
+                        content,
+                        content='documents',
+                        content_rowid='id',
+                        tokenize='unicode61 remove_diacritics 2'
+                    )
+                """)
+                self.conn.execute("""
+                    CREATE TRIGGER IF NOT EXISTS `documents_fts_ai` AFTER INSERT ON `documents` BEGIN
+                        INSERT INTO documents_fts(rowid, title, content) VALUES (new.id, new.title, new.content);
+                    END
+                """)
+                self.conn.execute("""
+                    CREATE TRIGGER IF NOT EXISTS `documents_fts_ad` AFTER DELETE ON `documents` BEGIN
+                        INSERT INTO documents_fts(documents_fts, rowid, title, content)
+                        VALUES ('delete', old.id, old.title, old.content);
+                    END
+                """)
+                self.conn.execute("""
+                    CREATE TRIGGER IF NOT EXISTS `documents_fts_au` AFTER UPDATE OF title, content ON `documents` BEGIN
+                        INSERT INTO documents_fts(documents_fts, rowid, title, content)
+                        VALUES ('delete', old.id, old.title, old.content);
+                        INSERT INTO documents_fts(rowid, title, content) VALUES (new.id, new.title, new.content);
+                    END
+                """)
+                # Index documents created before the upgrade
+                self.conn.execute("""INSERT INTO documents_fts(documents_fts) VALUES ('rebuild')""")
+                self.conn.execute("""INSERT INTO `version` VALUES (?, ?)""", (version, datetime.now(),))
+                Logger.info(f'Successfully upgraded to v{version}')
+                self.version = version
+                return True
+            except Exception:
+                Logger.error(traceback.format_exc())
+                return False
+
+    def v4_upgrade(self) -> bool:
+        """Upgrades database to version 4.
+
+        Add fields:
+            - excerpt - beginning of the document content used for thumbnails
+
+        Add triggers:
+            - documents_excerpt_ai, documents_excerpt_au - keep excerpt in sync with content
+
+        :return: True if upgrade was successful, otherwise False
+        """
+        version = 4
+        with self.conn:
+            try:
+                Logger.info(f'Upgrading storage to version: {version}')
+                self.conn.execute("""ALTER TABLE `documents` ADD COLUMN `excerpt` TEXT""")
+                self.conn.execute(f"""
+                    CREATE TRIGGER IF NOT EXISTS `documents_excerpt_ai` AFTER INSERT ON `documents` BEGIN
+                        UPDATE documents SET excerpt=substr(new.content, 1, {self.EXCERPT_LENGTH}) WHERE id=new.id;
+                    END
+                """)
+                self.conn.execute(f"""
+                    CREATE TRIGGER IF NOT EXISTS `documents_excerpt_au` AFTER UPDATE OF content ON `documents` BEGIN
+                        UPDATE documents SET excerpt=substr(new.content, 1, {self.EXCERPT_LENGTH}) WHERE id=new.id;
+                    END
+                """)
+                self.conn.execute(f"""UPDATE `documents` SET excerpt=substr(content, 1, {self.EXCERPT_LENGTH})""")
+                self.conn.execute("""INSERT INTO `version` VALUES (?, ?)""", (version, datetime.now(),))
+                Logger.info(f'Successfully upgraded to v{version}')
+                self.version = version
+                return True
+            except Exception:
+                Logger.error(traceback.format_exc())
+                return False
+
+    def v5_upgrade(self) -> bool:
+        """Upgrades database to version 5.
+
+        Add indexes:
+            - idx_documents_path_archived_id - folder listings and counters
+
+        Folders lookups by `path` are already served by the `uniq_full_path` constraint index
+        on ("path", "title"), so no extra index is needed for them.
+
+        :return: True if upgrade was successful, otherwise False
+        """
+        version = 5
+        with self.conn:
+            try:
+                Logger.info(f'Upgrading storage to version: {version}')
+                self.conn.execute("""
+                    CREATE INDEX IF NOT EXISTS `idx_documents_path_archived_id`
+                    ON `documents` (`path`, `archived`, `id`)
+                """)
+                self.conn.execute("""ANALYZE""")
+                self.conn.execute("""INSERT INTO `version` VALUES (?, ?)""", (version, datetime.now(),))
+                Logger.info(f'Successfully upgraded to v{version}')
+                self.version = version
+                return True
+            except Exception:
+                Logger.error(traceback.format_exc())
+                return False
+
+    def v6_upgrade(self) -> bool:
+        """Upgrades database to version 6.
+
+        Add fields:
+            - folders.parent_id - id of the parent folder, NULL for folders in the root
+
+        Add indexes:
+            - idx_folders_parent_id - children lookups
+
+        :return: True if upgrade was successful, otherwise False
+        """
+        version = 6
+        with self.conn:
+            try:
+                Logger.info(f'Upgrading storage to version: {version}')
+                self.conn.execute("""ALTER TABLE `folders` ADD COLUMN `parent_id` INTEGER REFERENCES folders(id)""")
+                self.conn.execute("""CREATE INDEX IF NOT EXISTS `idx_folders_parent_id` ON `folders` (`parent_id`)""")
+
+                # Resolve parents by path of existing folders
+                tree = FolderTree()
+                tree.load(self.conn.execute("""SELECT id, parent_id, path, title FROM folders ORDER BY path, title"""))
+                self.conn.executemany("""UPDATE folders SET parent_id=? WHERE id=?""",
+                                      ((node.parent_id, node.folder_id) for node in tree.nodes.values()))
+
+                self.conn.execute("""INSERT INTO `version` VALUES (?, ?)""", (version, datetime.now(),))
+                Logger.info(f'Successfully upgraded to v{version}')
+                self.version = version
+                return True
+            except Exception:
+                Logger.error(traceback.format_exc())
+                return False
+
+    def v7_upgrade(self) -> bool:
+        """Upgrades database to version 7.
+
+        Add tables:
+            - document_stats - cached counts of the document content along with its hash
+
+        Add indexes:
+            - idx_document_stats_words - longest documents lookups
+
+        Add triggers:
+            - document_stats_ad - drops stats of deleted documents
+
+        :return: True if upgrade was successful, otherwise False
+        """
+        version = 7
+        with self.conn:
+            try:
+                Logger.info(f'Upgrading storage to version: {version}')
+                self.conn.execute("""
+                    CREATE TABLE IF NOT EXISTS `document_stats` (
+                        `document_id` INTEGER PRIMARY KEY,
+                        `content_hash` TEXT NOT NULL,
+                        `characters` INTEGER NOT NULL,
+                        `words` INTEGER NOT NULL,
+                        `sentences` INTEGER NOT NULL,
+                        `paragraphs` INTEGER NOT NULL,
+                        `updated` TIMESTAMP
+                    )
+                """)
+                self.conn.execute("""CREATE INDEX IF NOT EXISTS `idx_document_stats_words` ON `document_stats` (`words`)""")
+                self.conn.execute("""
+                    CREATE TRIGGER IF NOT EXISTS `document_stats_ad` AFTER DELETE ON `documents` BEGIN
+                        DELETE FROM document_stats WHERE document_id=old.id;
+                    END
+                """)
+                self.conn.execute("""INSERT INTO `version` VALUES (?, ?)""", (version, datetime.now(),))
+                Logger.info(f'Successfully upgraded to v{version}')
+                self.version = version
+                return True
+            except Exception:
+                Logger.error(traceback.format_exc())
+                return False
+
+    @property
+    def folder_tree(self) -> FolderTree:
+        """In-memory folders hierarchy, loaded from the database on first access.
+        """
+        if self._folder_tree is None:
+            tree = FolderTree()
+            tree.load(self.conn.execute("""SELECT id, parent_id, path, title FROM folders ORDER BY path, title"""))
+            self._folder_tree = tree
+        return self._folder_tree
+
+    def invalidate_folder_tree(self) -> None:
+        """Drops cached folders hierarchy, it will be reloaded on the next access.
+        """
+        self._folder_tree = None
+
+    @staticmethod
+    def _subtree_range(path: str) -> tuple:
+        """Returns (lower, upper) bounds matching every path nested into `path`.
+
+        Used as `path >= lower AND path < upper` which, unlike `LIKE 'path%'`, can use indexes
+        and doesn't match siblings sharing the same prefix.
+        """
+        if path.endswith('/'):
+            path = path[:-1]
+        # '0' is the character right after '/'
+        return f'{path}/', f'{path}0'
+
     def count_documents(self, path: str = '/', with_archived: bool = False) -> int:
         """Counts documents in the given path.
 
@@ -199,11 +632,33 @@ class Storage(object):
         
         If `with_archived` is True then archived documents and folders will be counted too.
         """
-        folders = self.count_folders(path, with_archived)
-        documents = self.count_documents(path, with_archived)
+        query = 'SELECT (SELECT COUNT (1) FROM folders WHERE path=?), (SELECT COUNT (1) FROM documents WHERE path=?'
+        if not with_archived:
+            query += " AND archived=0"
+        query += ')'
+        folders, documents = self.conn.cursor().execute(query, (path, path,)).fetchone()
         Logger.debug(f'{folders} folders + {documents} documents found in {path}')
         return folders + documents
 
+    def count_subtree(self, path: str, with_archived: bool = False) -> Tuple[int, int]:
+        """Counts folders and documents nested into the given `path` at any depth.
+
+        Returns a tuple of (folders, documents). Folders are counted using :class:`FolderTree`.
+        """
+        node = self.folder_tree.get(path)
+        if node:
+            folders = len(self.folder_tree.subtree(node.folder_id)) - 1
+        elif FolderTree.normalize(path) == '/':
+            folders = len(self.folder_tree.nodes)
+        else:
+            folders = 0
+
+        query = 'SELECT COUNT (1) FROM documents WHERE (path=? OR (path>=? AND path<?))'
+        if not with_archived:
+            query += " AND archived=0"
+        documents = self.conn.execute(query, (path, *self._subtree_range(path),)).fetchone()[0]
+        return folders, documents
+
     def add_folder(self, title: str, path: str = '/') -> Optional[int]:
         """Creates new folder in the given `path`. Returns ID of created folder.
 
@@ -211,14 +666,17 @@ class Storage(object):
         """
         if title == '..':
             return None
-        cursor = self.conn.cursor().execute(
-            "INSERT INTO folders(title, path, created, modified) VALUES (?, ?, ?, ?)",
-            (title,
-             path,
-             datetime.now(),
-             datetime.now()
-             ), )
-        self.conn.commit()
+        with self._transaction():
+            cursor = self.conn.cursor().execute(
+                "INSERT INTO folders(title, path, parent_id, created, modified) VALUES (?, ?, ?, ?, ?)",
+                (title,
+                 path,
+                 self.folder_tree.parent_id(path),
+                 datetime.now(),
+                 datetime.now()
+                 ), )
+        node = self.folder_tree.add(cursor.lastrowid, path, title)
+        self._emit('folder-added', node.absolute_path)
         return cursor.lastrowid
 
     def rename_folder(self, folder: Folder, title: str) -> bool:
@@ -227,38 +685,64 @@ class Storage(object):
         if title == '..':
             return False
 
-        query = f"UPDATE folders SET title=? WHERE path=? AND title=?"
+        if not self._relocate_folder(folder, folder.path, title):
+            return False
+
+        folder.title = title
+        return True
+
+    def _relocate_folder(self, folder: Folder, path: str, title: str) -> bool:
+        """Moves `folder` to the `path` under the new `title` with all its content.
 
-        try:
-            self.conn.execute(query, (title, folder.path, folder.title,))
-            self.conn.commit()
+        Folder, its descendants and their documents are updated in a single transaction.
+        """
+        tree = self.folder_tree
+        node = tree.get(folder.absolute_path)
+        if not node:
+            Logger.error(f'Folder {folder.absolute_path} not found')
+            return False
+
+        parent_id = tree.parent_id(path)
+        if parent_id is not None and tree.is_descendant(parent_id, node.folder_id):
+            Logger.error(f'Folder {folder.absolute_path} can not be moved into itself')
+            return False
 
-            # Store old path
-            old_path = folder.absolute_path
-            # Set new title to get the new path
-            folder.title = title
-            new_path = folder.absolute_path
+        old_path = node.absolute_path
+        new_path = os.path.join(FolderTree.normalize(path), title)
+        if old_path == new_path:
+            return True
 
-            self.move_folders(old_path, new_path)
-            self.move_documents(old_path, new_path)
+        descendants = tree.subtree(node.folder_id)[1:]
 
+        try:
+            with self._transaction():
+                self.conn.execute("UPDATE folders SET path=?, title=?, parent_id=?, modified=? WHERE id=?",
+                                  (FolderTree.normalize(path), title, parent_id, datetime.now(), node.folder_id,))
+                self.conn.executemany("UPDATE folders SET path=? WHERE id=?",
+                                      ((new_path + child.path[len(old_path):], child.folder_id)
+                                       for child in descendants))
+                self._move_documents(old_path, new_path)
         except Exception as e:
             Logger.error(e)
             return False
 
+        tree.move(node.folder_id, path, title)
+        self._emit('folder-moved', old_path, new_path)
         return True
 
     def delete_folders(self, path: str) -> bool:
         """Permanently deletes folders under given `path`
         """
-        query = f"DELETE FROM folders WHERE path LIKE ?"
+        query = f"DELETE FROM folders WHERE path=? OR (path>=? AND path<?)"
 
         try:
-            self.conn.execute(query, (f'{path}%',))
-            self.conn.commit()
+            with self._transaction():
+                self.conn.execute(query, (path, *self._subtree_range(path),))
         except Exception as e:
             Logger.error(e)
             return False
+        finally:
+            self.invalidate_folder_tree()
 
         return True
 
@@ -267,18 +751,25 @@ class Storage(object):
 
         :param folder: :class:`Folder` to be deleted.
         """
-        query = f"DELETE FROM folders WHERE path=? AND title=?"
+        node = self.folder_tree.get(folder.absolute_path)
+        if not node:
+            Logger.error(f'Folder {folder.absolute_path} not found')
+            return False
 
-        try:
-            self.conn.execute(query, (folder.path, folder.title,))
-            self.conn.commit()
+        nodes = self.folder_tree.subtree(node.folder_id)
 
-            self.delete_documents(folder.absolute_path)
-            self.delete_folders(folder.absolute_path)
+        try:
+            with self._transaction():
+                self.conn.execute('DELETE FROM documents WHERE path=? OR (path>=? AND path<?)',
+                                  (node.absolute_path, *self._subtree_range(node.absolute_path),))
+                self.conn.executemany('DELETE FROM folders WHERE id=?',
+                                      ((child.folder_id,) for child in nodes))
         except Exception as e:
             Logger.error(e)
             return False
 
+        self.folder_tree.remove(node.folder_id)
+        self._emit('folder-deleted', node.absolute_path)
         return True
 
     def add(self, document: Document, path: str = '/') -> int:
@@ -286,31 +777,40 @@ class Storage(object):
 
         By default, document is created in the root folder.
         """
-        cursor = self.conn.cursor().execute(
-            "INSERT INTO documents(title, content, path, archived, created, modified) VALUES (?, ?, ?, ?, ?, ?)",
-            (document.title,
-             document.content,
-             document.folder or path,
-             document.archived,
-             datetime.now(),
-             datetime.now()
-             ), )
-        self.conn.commit()
+        with self._transaction():
+            cursor = self.conn.cursor().execute(
+                "INSERT INTO documents(title, content, path, archived, created, modified) VALUES (?, ?, ?, ?, ?, ?)",
+                (document.title,
+                 document.content,
+                 document.folder or path,
+                 document.archived,
+                 datetime.now(),
+                 datetime.now()
+                 ), )
+        self._emit('document-added', cursor.lastrowid, document.folder or path)
         return cursor.lastrowid
 
+    def add_many(self, documents: Iterable[Document], path: str = '/') -> List[int]:
+        """Creates new documents in one transaction. Returns IDs of created documents.
+
+        Documents without folder are created in the given `path`.
+        """
+        with self.batch():
+            return [self.add(document, path) for document in documents]
+
     def all(self, path: str = '/', with_archived: bool = False, desc: bool = False) -> List[Document]:
         """Returns all documents in the given `path`.
 
         If `with_archived` is True then archived documents will be returned too.
         `desc` indicates whether to return documents in descending order or not.
         """
-        query = "SELECT * FROM documents WHERE path LIKE ?"
+        query = "SELECT * FROM documents WHERE path=?"
         if not with_archived:
             query += " AND archived=0"
 
         query += f" ORDER BY ID {'desc' if desc else 'asc'}"
 
-        cursor = self.conn.cursor().execute(query, (f'{path}',))
+        cursor = self.conn.cursor().execute(query, (path,))
         rows = cursor.fetchall()
 
         docs = []
@@ -335,9 +835,202 @@ class Storage(object):
 
         return docs
 
+    def list_documents(self, path: str = '/', with_archived: bool = False, desc: bool = False) -> List[Document]:
+        """Returns documents in the given `path` without their content.
+
+        Documents have `excerpt` filled instead of `content`, use :func:`get` to load the full document.
+        If `with_archived` is True then archived documents will be returned too.
+        `desc` indicates whether to return documents in descending order or not.
+        """
+        query = f"SELECT {self.SUMMARY_COLUMNS} FROM documents WHERE path=?"
+        if not with_archived:
+            query += " AND archived=0"
+
+        query += f" ORDER BY ID {'desc' if desc else 'asc'}"
+
+        cursor = self.conn.cursor().execute(query, (path,))
+        return [Document.new_with_summary_row(row) for row in cursor.fetchall()]
+
+    def list_archived(self, desc: bool = False) -> List[Document]:
+        """Returns all archived documents without their content.
+
+        `desc` indicates whether to return documents in descending order or not.
+        """
+        query = f"SELECT {self.SUMMARY_COLUMNS} FROM documents WHERE archived=1 ORDER BY ID {'desc' if desc else 'asc'}"
+
+        cursor = self.conn.cursor().execute(query)
+        return [Document.new_with_summary_row(row) for row in cursor.fetchall()]
+
+    def page_documents(self, path: Optional[str] = '/', after_id: int = None, limit: int = 100,
+                       with_archived: bool = False, only_archived: bool = False, desc: bool = False,
+                       with_content: bool = False) -> List[DocumentRecord]:
+        """Returns a page of documents in the given `path` using keyset pagination.
+
+        The page starts right after the document with `after_id`, pass the id of the last document
+        of the previous page to get the next one. If `path` is None documents from all folders are returned.
+        `only_archived` limits the page to archived documents.
+
+        Documents are returned as lightweight :class:`DocumentRecord` instances
+        without content unless `with_content` is True.
+        """
+        columns = '*' if with_content else self.SUMMARY_COLUMNS
+        conditions = []
+        params = []
+
+        if path is not None:
+            conditions.append('path=?')
+            params.append(path)
+        if only_archived:
+            conditions.append('archived=1')
+        elif not with_archived:
+            conditions.append('archived=0')
+        if after_id is not None:
+            conditions.append('id<?' if desc else 'id>?')
+            params.append(after_id)
+
+        query = f"SELECT {columns} FROM documents"
+        if conditions:
+            query += f" WHERE {' AND '.join(conditions)}"
+        query += f" ORDER BY ID {'desc' if desc else 'asc'} LIMIT ?"
+        params.append(limit)
+
+        cursor = self.conn.cursor().execute(query, params)
+        new_record = DocumentRecord.new_with_row if with_content else DocumentRecord.new_with_summary_row
+
+        docs = []
+        while True:
+            rows = cursor.fetchmany(64)
+            if not rows:
+                break
+            docs.extend(new_record(row) for row in rows)
+        return docs
+
+    def iter_documents(self, path: Optional[str] = '/', after_id: int = None, limit: int = None,
+                       with_archived: bool = False, only_archived: bool = False, desc: bool = False,
+                       with_content: bool = False, batch_size: int = 200) -> Iterator[DocumentRecord]:
+        """Iterates over documents in the given `path` keeping only one batch in memory.
+
+        Documents are fetched page by page with :func:`page_documents`, so no read transaction
+        is held open between batches. `limit` caps the total number of documents returned.
+        """
+        count = 0
+        while limit is None or count < limit:
+            size = batch_size if limit is None else min(batch_size, limit - count)
+            docs = self.page_documents(path=path, after_id=after_id, limit=size,
+                                       with_archived=with_archived, only_archived=only_archived,
+                                       desc=desc, with_content=with_content)
+            yield from docs
+
+            count += len(docs)
+            if len(docs) < size:
+                break
+            after_id = docs[-1].document_id
+
+    def get_summary(self, doc_id: int) -> Optional[Document]:
+        """Returns document with given `doc_id` without its content.
+
+        """
+        query = f"SELECT {self.SUMMARY_COLUMNS} FROM documents WHERE id=?"
+        cursor = self.conn.cursor().execute(query, (doc_id,))
+        row = cursor.fetchone()
+
+        if not row:
+            return None
+
+        document = Document.new_with_summary_row(row)
+        self._apply_pending(document, with_content=False)
+        return document
+
+    def get_content(self, doc_id: int) -> Optional[str]:
+        """Returns content of the document with given `doc_id` or None."""
+        row = self.conn.execute("SELECT content FROM documents WHERE id=?", (doc_id,)).fetchone()
+        return row[0] if row else None
+
+    def iter_stats_sources(self, doc_ids: Iterable[int] = None) -> Iterator[Tuple[int, str, Optional[str]]]:
+        """Yields `(doc_id, content, content_hash)` of documents to check whether their stats are stale.
+
+        `content_hash` is the hash stored with the cached stats or None if stats were never counted.
+        All documents are checked if `doc_ids` is not given.
+        """
+        query = """SELECT d.id, d.content, s.content_hash FROM documents d
+                   LEFT JOIN document_stats s ON s.document_id = d.id"""
+        params = ()
+        if doc_ids is not None:
+            params = tuple(doc_ids)
+            query += f" WHERE d.id IN ({', '.join('?' * len(params))})"
+
+        cursor = self.conn.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(64)
+            if not rows:
+                return
+            yield from rows
+
+    def save_stats(self, stats: Iterable[Tuple[int, str, int, int, int, int]]) -> bool:
+        """Stores `(doc_id, content_hash, characters, words, sentences, paragraphs)` of documents.
+
+        Stats are derived data, so no signals are emitted.
+        """
+        query = """INSERT OR REPLACE INTO document_stats
+                   (document_id, content_hash, characters, words, sentences, paragraphs, updated)
+                   SELECT ?, ?, ?, ?, ?, ?, ? WHERE EXISTS (SELECT 1 FROM documents WHERE id=?)"""
+        now = datetime.now()
+        try:
+            with self._transaction():
+                self.conn.executemany(query, ((*row, now, row[0]) for row in stats))
+        except Exception as e:
+            Logger.error(e)
+            return False
+        return True
+
+    def get_stats(self, doc_id: int) -> Optional[Tuple[int, int, int, int]]:
+        """Returns cached `(characters, words, sentences, paragraphs)` of the document or None.
+        """
+        query = "SELECT characters, words, sentences, paragraphs FROM document_stats WHERE document_id=?"
+        return self.conn.execute(query, (doc_id,)).fetchone()
+
+    def count_words(self, path: str = None, with_archived: bool = False) -> Tuple[int, int]:
+        """Sums cached stats of documents in the `path` and its subfolders, or in the whole library if `path` is None.
+
+        Returns a tuple of (documents, words).
+        """
+        query = """SELECT COUNT(s.document_id), COALESCE(SUM(s.words), 0)
+                   FROM documents d JOIN document_stats s ON s.document_id = d.id WHERE 1"""
+        params = ()
+        if path is not None and FolderTree.normalize(path) != '/':
+            query += " AND (d.path=? OR (d.path>=? AND d.path<?))"
+            params = (path, *self._subtree_range(path))
+        if not with_archived:
+            query += " AND d.archived=0"
+        return self.conn.execute(query, params).fetchone()
+
+    def words_by_folder(self, with_archived: bool = False) -> List[Tuple[str, int, int]]:
+        """Returns `(path, documents, words)` of every folder containing documents with cached stats.
+
+        Documents are counted in the folder they are in directly, not in its parents.
+        """
+        query = """SELECT d.path, COUNT(s.document_id), SUM(s.words)
+                   FROM documents d JOIN document_stats s ON s.document_id = d.id"""
+        if not with_archived:
+            query += " WHERE d.archived=0"
+        query += " GROUP BY d.path ORDER BY d.path"
+        return self.conn.execute(query).fetchall()
+
+    def longest_documents(self, limit: int = 5, with_archived: bool = False) -> List[Tuple[int, str, str, int]]:
+        """Returns `(doc_id, title, path, words)` of documents with the most words.
+        """
+        query = """SELECT d.id, d.title, d.path, s.words
+                   FROM document_stats s JOIN documents d ON d.id = s.document_id"""
+        if not with_archived:
+            query += " WHERE d.archived=0"
+        query += " ORDER BY s.words DESC LIMIT ?"
+        return self.conn.execute(query, (limit,)).fetchall()
+
     def get(self, doc_id: int) -> Optional[Document]:
         """Returns document with given `doc_id`.
 
+        Updates still queued in the :attr:`writer` are applied to the result, so the content
+        is never stale and the caller never waits for the commit.
         """
         query = "SELECT * FROM documents WHERE id=?"
         cursor = self.conn.cursor().execute(query, (doc_id,))
@@ -346,7 +1039,19 @@ class Storage(object):
         if not row:
             return None
 
-        return Document.new_with_row(row)
+        document = Document.new_with_row(row)
+        self._apply_pending(document)
+        return document
+
+    def _apply_pending(self, document: Document, with_content: bool = True) -> None:
+        if self._writer is None:
+            return
+
+        for field, value in self._writer.pending(document.document_id).items():
+            if field == 'path':
+                document.folder = value
+            elif field != 'content' or with_content:
+                setattr(document, field, value)
 
     def save(self, document: Document) -> bool:
         """Saves `document` to the database.
@@ -355,12 +1060,14 @@ class Storage(object):
         query = "UPDATE documents SET title=?, content=?, archived=?, modified=? WHERE id=?"
 
         try:
-            self.conn.execute(query, (document.title, document.content, document.archived, datetime.now()))
-            self.conn.commit()
+            with self._transaction():
+                self.conn.execute(query, (document.title, document.content, document.archived, datetime.now(),
+                                          document.document_id,))
         except Exception as e:
             Logger.error(e)
             return False
 
+        self._emit('document-updated', document.document_id)
         return True
 
     def update(self, doc_id: int, data: dict) -> bool:
@@ -381,12 +1088,16 @@ class Storage(object):
         query = f"UPDATE documents SET {','.join(f'{key}=?' for key in fields.keys())}, modified=? WHERE id=?"
 
         try:
-            self.conn.execute(query, tuple(fields.values()) + (datetime.now(), doc_id,))
-            self.conn.commit()
+            with self._transaction():
+                self.conn.execute(query, tuple(fields.values()) + (datetime.now(), doc_id,))
         except Exception as e:
             Logger.error(e)
             return False
 
+        if 'path' in fields:
+            self._emit('document-moved', doc_id, fields['path'])
+        else:
+            self._emit('document-updated', doc_id)
         return True
 
     def delete(self, doc_id: int) -> bool:
@@ -397,12 +1108,13 @@ class Storage(object):
         query = f"DELETE FROM documents WHERE id=?"
 
         try:
-            self.conn.execute(query, (doc_id,))
-            self.conn.commit()
+            with self._transaction():
+                self.conn.execute(query, (doc_id,))
         except Exception as e:
             Logger.error(e)
             return False
 
+        self._emit('document-deleted', doc_id)
         return True
 
     def delete_documents(self, path: str) -> bool:
@@ -410,10 +1122,10 @@ class Storage(object):
 
         Returns True if documents were deleted successfully.
         """
-        query = 'DELETE FROM documents WHERE path LIKE ?'
+        query = 'DELETE FROM documents WHERE path=? OR (path>=? AND path<?)'
         try:
-            self.conn.execute(query, (f'{path}%',))
-            self.conn.commit()
+            with self._transaction():
+                self.conn.execute(query, (path, *self._subtree_range(path),))
         except Exception as e:
             Logger.error(e)
             return False
@@ -425,25 +1137,10 @@ class Storage(object):
 
         Returns True if folder was moved successfully.
         """
-        query = 'UPDATE folders SET path=? WHERE path=? AND title=?'
-
-        try:
-            self.conn.execute(query, (path, folder.path, folder.title))
-            self.conn.commit()
-
-            # Store old path
-            old_path = folder.absolute_path
-            # Set new title to get the new path
-            folder.path = path
-            new_path = folder.absolute_path
-
-            self.move_folders(old_path, new_path)
-            self.move_documents(old_path, new_path)
-
-        except Exception as e:
-            Logger.error(e)
+        if not self._relocate_folder(folder, path, folder.title):
             return False
 
+        folder.path = path
         return True
 
     def move(self, doc_id: int, path: str = '/') -> bool:
@@ -454,51 +1151,103 @@ class Storage(object):
         query = 'UPDATE documents SET path=? WHERE id=?'
 
         try:
-            self.conn.execute(query, (path, doc_id,))
-            self.conn.commit()
+            with self._transaction():
+                self.conn.execute(query, (path, doc_id,))
         except Exception as e:
             Logger.error(e)
             return False
 
+        self._emit('document-moved', doc_id, path)
         return True
 
     def move_documents(self, old_path: str, new_path: str) -> bool:
-        query = f"UPDATE documents SET path=REPLACE(path, ?, ?) WHERE path lIKE ?"
-
+        """Moves documents nested into `old_path` to the `new_path` keeping their relative paths.
+        """
         try:
-            self.conn.execute(query, (old_path, new_path, f"{old_path}%",))
-            self.conn.commit()
+            with self._transaction():
+                self._move_documents(old_path, new_path)
         except Exception as e:
             Logger.error(e)
             return False
 
         return True
 
+    def _move_documents(self, old_path: str, new_path: str) -> None:
+        query = "UPDATE documents SET path=? || substr(path, ?) WHERE path=? OR (path>=? AND path<?)"
+        self.conn.execute(query, (new_path, len(old_path) + 1, old_path, *self._subtree_range(old_path),))
+
     def move_folders(self, old_path: str, new_path: str) -> bool:
-        query = f"UPDATE folders SET path=REPLACE(path, ?, ?) WHERE path LIKE ?"
+        """Moves folders nested into `old_path` to the `new_path` keeping their relative paths.
+        """
+        query = f"UPDATE folders SET path=? || substr(path, ?) WHERE path=? OR (path>=? AND path<?)"
 
         try:
-            self.conn.execute(query, (old_path, new_path, f"{old_path}%",))
-            self.conn.commit()
+            with self._transaction():
+                self.conn.execute(query, (new_path, len(old_path) + 1, old_path, *self._subtree_range(old_path),))
         except Exception as e:
             Logger.error(e)
             return False
+        finally:
+            self.invalidate_folder_tree()
 
         return True
 
     def find(self, search_text: str) -> List[Document]:
-        """Finds documents with given `search_text`.
+        """Finds documents with given `search_text` in the title.
+
+        Documents are returned without their content.
         """
-        query = f"SELECT * FROM documents WHERE lower(title) LIKE ? ORDER BY archived ASC"
+        query = f"SELECT {self.SUMMARY_COLUMNS} FROM documents WHERE lower(title) LIKE ? ORDER BY archived ASC"
 
         cursor = self.conn.cursor().execute(query, (f'%{search_text.lower()}%',))
-        rows = cursor.fetchall()
+        return [Document.new_with_summary_row(row) for row in cursor.fetchall()]
 
-        docs = []
-        for row in rows:
-            docs.append(Document.new_with_row(row))
+    def search(self, search_text: str, limit: int = 50) -> List[SearchResult]:
+        """Finds documents which title or content matches given `search_text`.
 
-        return docs
+        Every word of `search_text` is matched as a prefix, results are ranked by relevance
+        with title matches weighted higher than content ones. Each result carries a short
+        snippet of the matched text with matches wrapped into
+        :const:`SearchResult.MATCH_START` and :const:`SearchResult.MATCH_END` markers.
+
+        Falls back to :func:`find` if full-text index is not available.
+        """
+        match_query = self._fts_query(search_text)
+        if not match_query:
+            return []
+
+        query = f"""
+            SELECT d.id, d.title, d.path, d.archived,
+                   snippet(documents_fts, -1, ?, ?, '…', 12) AS snippet
+            FROM documents_fts
+            JOIN documents d ON d.id = documents_fts.rowid
+            WHERE documents_fts MATCH ?
+            ORDER BY d.archived ASC, bm25(documents_fts, 10.0, 1.0)
+            LIMIT ?
+        """
+
+        try:
+            cursor = self.conn.cursor().execute(
+                query, (SearchResult.MATCH_START, SearchResult.MATCH_END, match_query, limit,))
+        except sqlite3.OperationalError as e:
+            Logger.warning('Full-text search failed, fallback to title search: %s', e)
+            return [SearchResult.new_with_document(doc) for doc in self.find(search_text)[:limit]]
+
+        results = []
+        for row in cursor.fetchall():
+            results.append(SearchResult.new_with_row(row))
+
+        return results
+
+    @staticmethod
+    def _fts_query(search_text: str) -> str:
+        """Converts user input into FTS5 query where every word is a quoted prefix term.
+        """
+        terms = []
+        for word in search_text.split():
+            word = word.replace('"', '""')
+            terms.append(f'"{word}"*')
+        return ' '.join(terms)
 
     def get_folder(self, folder_id: int) -> Optional[Folder]:
         """Returns folder with given `folder_id`.
@@ -517,11 +1266,11 @@ class Storage(object):
 
         If `desc` is True then folders will be returned in descending order.
         """
-        query = "SELECT * FROM folders WHERE path LIKE ?"
+        query = "SELECT * FROM folders WHERE path=?"
 
         query += f" ORDER BY title {'desc' if desc else 'asc'}"
 
-        cursor = self.conn.cursor().execute(query, (f'{path}',))
+        cursor = self.conn.cursor().execute(query, (path,))
         rows = cursor.fetchall()
 
         folders = []
@@ -529,3 +1278,11 @@ class Storage(object):
             folders.append(Folder.new_with_row(row))
 
         return folders
+
+    def all_folders(self) -> List[Folder]:
+        """Returns all folders ordered by their path so parents go before children.
+        """
+        query = "SELECT * FROM folders ORDER BY path, title"
+
+        cursor = self.conn.cursor().execute(query)
+        return [Folder.new_with_row(row) for row in cursor.fetchall()]
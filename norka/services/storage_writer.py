@@ -0,0 +1,154 @@
+# storage_writer.py
+#
+# MIT License
+#
+# Copyright (c) 2020 Andrey Maksimov <meamka@ya.ru>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import sqlite3
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from gi.repository import GLib
+
+from norka.services.logger import Logger
+
+WriteCallback = Callable[[int, bool], None]
+
+
+class StorageWriter:
+    """Writes document updates to the storage on a dedicated thread.
+
+    Updates are queued per document id, so subsequent updates of the same document are merged
+    into one `UPDATE` statement. Everything queued since the previous write is committed
+    in a single transaction. Completion is reported on the main loop with `GLib.idle_add`,
+    where the storage `document-updated`/`document-moved` signals are emitted and callbacks are called.
+    """
+
+    def __init__(self, storage):
+        self.storage = storage
+
+        self._lock = threading.Condition()
+        self._pending: Dict[int, dict] = OrderedDict()
+        self._batch: Dict[int, dict] = {}
+        self._callbacks: Dict[int, List[WriteCallback]] = {}
+        self._writing = False
+        self._stopped = False
+
+        self._thread = threading.Thread(target=self._run, name='StorageWriter', daemon=True)
+        self._thread.start()
+
+    @property
+    def busy(self) -> bool:
+        """Whether there are queued or not yet committed updates.
+        """
+        with self._lock:
+            return bool(self._pending) or self._writing
+
+    def update(self, doc_id: int, data: dict, callback: Optional[WriteCallback] = None) -> None:
+        """Queues update of the document with given `doc_id` with given `data`.
+
+        Accepts the same `data` keys as :func:`Storage.update`. `callback` is called on the main loop
+        with `doc_id` and whether the update was committed successfully.
+        """
+        with self._lock:
+            if self._stopped:
+                raise RuntimeError('StorageWriter is stopped')
+
+            self._pending.setdefault(doc_id, {}).update(data)
+            if callback:
+                self._callbacks.setdefault(doc_id, []).append(callback)
+            self._lock.notify()
+
+    def pending(self, doc_id: int) -> dict:
+        """Returns fields of the document which are queued or being written, but not committed yet.
+        """
+        with self._lock:
+            fields = dict(self._batch.get(doc_id, ()))
+            fields.update(self._pending.get(doc_id, ()))
+            return fields
+
+    def flush(self, timeout: float = None) -> bool:
+        """Blocks until all the queued updates are committed.
+
+        Returns False if `timeout` expired before that.
+        """
+        with self._lock:
+            return self._lock.wait_for(lambda: not self._pending and not self._writing, timeout)
+
+    def stop(self, timeout: float = None) -> None:
+        """Commits queued updates and stops the writer thread.
+        """
+        with self._lock:
+            self._stopped = True
+            self._lock.notify_all()
+        self._thread.join(timeout)
+
+    def _run(self) -> None:
+        conn = sqlite3.connect(self.storage.file_path,
+                               detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES)
+        self.storage.configure(conn)
+        try:
+            while True:
+                with self._lock:
+                    self._lock.wait_for(lambda: self._pending or self._stopped)
+                    if not self._pending:
+                        return
+                    batch, self._pending = self._pending, OrderedDict()
+                    callbacks, self._callbacks = self._callbacks, {}
+                    self._batch = batch
+                    self._writing = True
+
+                success = self._write(conn, batch)
+
+                with self._lock:
+                    self._batch = {}
+                    self._writing = False
+                    self._lock.notify_all()
+
+                GLib.idle_add(self._on_written, batch, callbacks, success)
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _write(conn: sqlite3.Connection, batch: Dict[int, dict]) -> bool:
+        modified = datetime.now()
+        try:
+            with conn:
+                for doc_id, fields in batch.items():
+                    query = f"UPDATE documents SET {','.join(f'{key}=?' for key in fields.keys())}, modified=? WHERE id=?"
+                    conn.execute(query, tuple(fields.values()) + (modified, doc_id,))
+            return True
+        except Exception as e:
+            Logger.error(e)
+            return False
+
+    def _on_written(self, batch: Dict[int, dict], callbacks: Dict[int, List[WriteCallback]], success: bool) -> bool:
+        for doc_id, fields in batch.items():
+            if success:
+                if 'path' in fields:
+                    self.storage.emit('document-moved', doc_id, fields['path'])
+                else:
+                    self.storage.emit('document-updated', doc_id)
+
+            for callback in callbacks.get(doc_id, ()):
+                callback(doc_id, success)
+        return False
@@ -0,0 +1,118 @@
+# text_blocks.py
+#
+# MIT License
+#
+# Copyright (c) 2020 Andrey Maksimov <meamka@ya.ru>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+from typing import Iterator, List, Tuple
+
+
+class TextBlocks:
+    """Splits the text into paragraph blocks and tracks which of them were touched by edits.
+
+    Every line belongs to exactly one block: a block is a paragraph followed by its trailing
+    blank lines, so the sum of block line counts is always equal to the buffer line count.
+    Each block is stored as `[line_count, key]`, where `key` is the hash of the block text,
+    or `None` if the block was changed and its text has to be read again.
+    """
+
+    def __init__(self):
+        self.blocks: List[list] = [[1, None]]
+
+    def __len__(self) -> int:
+        return len(self.blocks)
+
+    @property
+    def keys(self) -> Iterator[int]:
+        """Yields keys of all the blocks that are not dirty.
+        """
+        return (key for _, key in self.blocks if key is not None)
+
+    def reset(self, line_count: int) -> None:
+        """Marks the whole text of `line_count` lines as a single dirty block.
+        """
+        self.blocks = [[max(line_count, 1), None]]
+
+    def find(self, line: int) -> int:
+        """Returns the index of the block containing the given `line`.
+        """
+        start = 0
+        for index, (line_count, _) in enumerate(self.blocks):
+            start += line_count
+            if line < start:
+                return index
+        return len(self.blocks) - 1
+
+    def replace_lines(self, line: int, removed: int, added: int) -> None:
+        """Marks blocks touched by the edit at `line` as dirty.
+
+        `removed` is the number of newlines deleted and `added` is the number of newlines
+        inserted by the edit. The block that follows the edit is also marked dirty, because
+        inserting or deleting blank lines can merge or split paragraphs.
+        """
+        first = self.find(line)
+        last = min(self.find(line + removed) + 2, len(self.blocks))
+
+        line_count = sum(count for count, _ in self.blocks[first:last]) - removed + added
+        self.blocks[first:last] = [[line_count, None]]
+
+    def dirty(self) -> List[Tuple[int, int, int]]:
+        """Returns the list of `(index, start_line, line_count)` of the dirty blocks.
+        """
+        result = []
+        start = 0
+        for index, (line_count, key) in enumerate(self.blocks):
+            if key is None:
+                result.append((index, start, line_count))
+            start += line_count
+        return result
+
+    def resolve(self, index: int, text: str) -> List[Tuple[int, str]]:
+        """Replaces the dirty block at `index` with the blocks found in its `text`.
+
+        Returns the list of `(key, text)` of the new blocks. Resolve dirty blocks starting
+        from the last one, so indexes returned by :func:`dirty` stay valid.
+        """
+        result = []
+        blocks = []
+        for block in self.split(text):
+            key = hash(block)
+            blocks.append([block.count('\n') + 1, key])
+            result.append((key, block))
+
+        self.blocks[index:index + 1] = blocks
+        return result
+
+    @staticmethod
+    def split(text: str) -> List[str]:
+        """Splits `text` into paragraphs, each keeps its trailing blank lines.
+        """
+        blocks = []
+        lines = []
+        blank = False
+        for line in text.split('\n'):
+            is_blank = not line.strip()
+            if blank and not is_blank:
+                blocks.append('\n'.join(lines))
+                lines = []
+            lines.append(line)
+            blank = is_blank
+        blocks.append('\n'.join(lines))
+        return blocks
@@ -0,0 +1,153 @@
+# thumbnail_cache.py
+#
+# MIT License
+#
+# Copyright (c) 2020-2022 Andrey Maksimov <meamka@ya.ru>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import hashlib
+import os
+import shutil
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+
+from gi.repository import GLib
+from gi.repository.GdkPixbuf import Pixbuf
+
+from norka.define import APP_TITLE
+from norka.services.logger import Logger
+
+
+class ThumbnailCache(object):
+    """Two-tier cache of document thumbnails.
+
+    Thumbnails are keyed by document id and hash of the rendered text, so a changed
+    document never gets a stale thumbnail. The first tier is a bounded in-memory LRU,
+    the second one keeps PNG files under the XDG cache dir to survive restarts.
+
+    Memory tier is not thread-safe and must be used from the main loop only (:func:`peek`, :func:`put`),
+    while :func:`load_or_render` touches disk tier and renderer only and can run in worker threads.
+    """
+
+    # Bump when thumbnails rendering changes to ignore previously cached files.
+    VERSION = 1
+
+    def __init__(self, renderer: Callable[[str], Pixbuf], capacity: int = 512, cache_dir: str = None):
+        self.renderer = renderer
+        self.capacity = capacity
+        self.cache_dir = cache_dir or os.path.join(GLib.get_user_cache_dir(), APP_TITLE,
+                                                   'thumbnails', f'v{self.VERSION}')
+
+        self._memory: OrderedDict = OrderedDict()
+        # Maps document id to its key in memory tier.
+        self._keys: Dict[int, str] = {}
+
+    def get(self, doc_id: int, text: str) -> Pixbuf:
+        """Returns thumbnail for the document with given `doc_id` and `text`.
+
+        Looks up memory tier, then disk tier and renders thumbnail only if both missed.
+        """
+        pixbuf = self.peek(doc_id, text)
+        if pixbuf is None:
+            pixbuf = self.load_or_render(doc_id, text)
+            self.put(doc_id, text, pixbuf)
+        return pixbuf
+
+    def peek(self, doc_id: int, text: str) -> Optional[Pixbuf]:
+        """Returns thumbnail from memory tier or `None`.
+        """
+        if self._keys.get(doc_id) != self.key(text):
+            return None
+
+        self._memory.move_to_end(doc_id)
+        return self._memory[doc_id]
+
+    def put(self, doc_id: int, text: str, pixbuf: Pixbuf) -> None:
+        """Puts thumbnail to memory tier evicting least recently used ones.
+        """
+        self._memory[doc_id] = pixbuf
+        self._memory.move_to_end(doc_id)
+        self._keys[doc_id] = self.key(text)
+
+        while len(self._memory) > self.capacity:
+            evicted_id, _ = self._memory.popitem(last=False)
+            self._keys.pop(evicted_id, None)
+
+    def load_or_render(self, doc_id: int, text: str) -> Pixbuf:
+        """Loads thumbnail from disk tier or renders and stores a new one.
+
+        Safe to call from worker threads.
+        """
+        key = self.key(text)
+        pixbuf = self._load(doc_id, key)
+        if pixbuf is None:
+            pixbuf = self.renderer(text)
+            self._store(doc_id, key, pixbuf)
+        return pixbuf
+
+    def invalidate(self, doc_id: int) -> None:
+        """Drops cached thumbnails of the document with given `doc_id` from both tiers.
+        """
+        self._memory.pop(doc_id, None)
+        self._keys.pop(doc_id, None)
+        shutil.rmtree(self._document_dir(doc_id), ignore_errors=True)
+
+    def clear(self) -> None:
+        """Drops all cached thumbnails.
+        """
+        self._memory.clear()
+        self._keys.clear()
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    @staticmethod
+    def key(text: str) -> str:
+        return hashlib.sha1((text or '').encode('utf-8')).hexdigest()
+
+    def _document_dir(self, doc_id: int) -> str:
+        return os.path.join(self.cache_dir, str(doc_id))
+
+    def _load(self, doc_id: int, key: str) -> Optional[Pixbuf]:
+        file_path = os.path.join(self._document_dir(doc_id), f'{key}.png')
+        if not os.path.exists(file_path):
+            return None
+
+        try:
+            return Pixbuf.new_from_file(file_path)
+        except GLib.Error as e:
+            Logger.warning('Broken thumbnail %s: %s', file_path, e)
+            return None
+
+    def _store(self, doc_id: int, key: str, pixbuf: Pixbuf) -> None:
+        document_dir = self._document_dir(doc_id)
+        file_name = f'{key}.png'
+
+        try:
+            os.makedirs(document_dir, exist_ok=True)
+
+            # Only the latest thumbnail of the document is kept on disk
+            for entry in os.scandir(document_dir):
+                if entry.name != file_name:
+                    os.remove(entry.path)
+
+            tmp_path = os.path.join(document_dir, f'.{file_name}.tmp')
+            pixbuf.savev(tmp_path, 'png', [], [])
+            os.replace(tmp_path, os.path.join(document_dir, file_name))
+        except (OSError, GLib.Error) as e:
+            Logger.warning('Unable to cache thumbnail for document %s: %s', doc_id, e)
@@ -22,21 +22,27 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from functools import partial
 from gettext import gettext as _
-from typing import Optional
+from typing import Optional, Union
 from urllib.parse import urlparse, unquote_plus
 
 import cairo
-from gi.repository import Gtk, GObject, Gdk, Gio
+from gi.repository import Gtk, GObject, Gdk, Gio, GLib
 from gi.repository.GdkPixbuf import Pixbuf, Colorspace
 
 from norka.define import TARGET_ENTRY_TEXT, TARGET_ENTRY_REORDER, RESOURCE_PREFIX
 from norka.models.document import Document
+from norka.models.document_record import DocumentRecord
 from norka.models.folder import Folder
+from norka.services.library_stats import LibraryStats
 from norka.services.logger import Logger
 from norka.services.settings import Settings
+from norka.services.stats_counter import StatsCounter
 from norka.services.storage import Storage
+from norka.services.thumbnail_cache import ThumbnailCache
 from norka.utils import find_child
 from norka.widgets.folder_create_dialog import FolderCreateDialog
 
@@ -44,6 +50,10 @@ from norka.widgets.folder_create_dialog import FolderCreateDialog
 class DocumentGrid(Gtk.Grid):
     __gtype_name__ = 'DocumentGrid'
 
+    # Number of previews rendered by a single background task.
+    THUMBNAILS_BATCH = 24
+    THUMBNAILS_WORKERS = 2
+
     __gsignals__ = {
         'path-changed': (GObject.SIGNAL_RUN_FIRST, None, (str, str)),
         'document-create': (GObject.SIGNAL_RUN_FIRST, None, (int,)),
@@ -54,16 +64,39 @@ class DocumentGrid(Gtk.Grid):
 
     show_archived = GObject.Property(type=bool, default=False)
 
-    def __init__(self, settings: Settings, storage: Storage):
+    def __init__(self, settings: Settings, storage: Storage, library_stats: LibraryStats = None):
         super().__init__()
 
         self.last_selected_path = None
         self.settings = settings
         self.storage = storage
+        self.library_stats = library_stats
         self.settings.connect("changed", self.on_settings_changed)
 
+        # Apply storage changes to the model in place instead of reloading it.
+        self.storage.connect('document-added', self.on_storage_document_changed)
+        self.storage.connect('document-updated', self.on_storage_document_changed)
+        self.storage.connect('document-moved', self.on_storage_document_changed)
+        self.storage.connect('document-deleted', self.on_storage_document_deleted)
+        self.storage.connect('folder-added', self.on_storage_folder_added)
+        self.storage.connect('folder-moved', self.on_storage_folder_moved)
+        self.storage.connect('folder-deleted', self.on_storage_folder_deleted)
+        self.storage.connect('bulk-changed', self.on_storage_bulk_changed)
+
         self.model = Gtk.ListStore(Pixbuf, str, str, int, str)
 
+        # Rendered previews, reused between reloads and app launches.
+        self.thumbnails = ThumbnailCache(renderer=self.gen_preview)
+        # Documents are shown with placeholder first, real previews rendered in background.
+        self.placeholder_icon = self.gen_preview('')
+        self.thumbnails_executor = ThreadPoolExecutor(max_workers=self.THUMBNAILS_WORKERS,
+                                                      thread_name_prefix='norka-thumbnails')
+        # doc_id -> (excerpt, Gtk.TreeRowReference) of rows waiting for preview
+        self.pending_thumbnails = {}
+        self.rendering_batches = 0
+        # Incremented on every reload to drop results for the previous folder.
+        self.thumbnails_generation = 0
+
         self.selected_path = None
         # self.selected_document = None
 
@@ -81,7 +114,9 @@ class DocumentGrid(Gtk.Grid):
         self.view.set_model(self.model)
         self.view.set_pixbuf_column(0)
         self.view.set_text_column(1)
-        self.view.set_tooltip_column(4)
+        # Tooltips are built on hover to include up to date document stats
+        self.view.set_has_tooltip(True)
+        self.view.connect('query-tooltip', self.on_query_tooltip)
         self.view.set_item_width(80)
         self.view.set_activate_on_single_click(True)
         self.view.set_selection_mode(Gtk.SelectionMode.SINGLE)
@@ -110,6 +145,8 @@ class DocumentGrid(Gtk.Grid):
         scrolled.set_hexpand(True)
         scrolled.set_vexpand(True)
         scrolled.add(self.view)
+        # Render previews of the rows coming into view first
+        scrolled.get_vadjustment().connect('value-changed', lambda x: self.schedule_thumbnails())
 
         main_box = Gtk.Box(orientation=Gtk.Orientation.VERTICAL)
         main_box.add(self.infobar)
@@ -158,6 +195,20 @@ class DocumentGrid(Gtk.Grid):
         doc_id = self.model.get_value(model_iter, 3)
         return self.storage.get(doc_id)
 
+    @property
+    def selected_document_summary(self) -> Optional[Document]:
+        """Returns selected :model:`Document` without content or `None`
+        """
+        if self.is_folder_selected:
+            return None
+
+        if self.selected_path is None:
+            return None
+
+        model_iter = self.model.get_iter(self.selected_path)
+        doc_id = self.model.get_value(model_iter, 3)
+        return self.storage.get_summary(doc_id)
+
     @property
     def selected_folder(self) -> Optional[Folder]:
         """Returns selected :model:`Folder` or `None` if :model:`Document` selected.
@@ -183,6 +234,8 @@ class DocumentGrid(Gtk.Grid):
     def reload_items(self, sender: Gtk.Widget = None, path: str = None) -> None:
         order_desc = self.settings.get_boolean('sort-desc')
         self.model.clear()
+        self.pending_thumbnails.clear()
+        self.thumbnails_generation += 1
 
         _old_path = self.current_path
 
@@ -207,39 +260,244 @@ class DocumentGrid(Gtk.Grid):
 
         # Then load documents, not before foldes.
         if self.show_archived:
-            documents = self.storage.archived(desc=order_desc)
+            documents = self.storage.iter_documents(path=None, only_archived=True, desc=order_desc)
         else:
-            documents = self.storage.all(path=self.current_folder_path,
-                                         with_archived=self.show_archived,
-                                         desc=order_desc)
+            documents = self.storage.iter_documents(path=self.current_folder_path,
+                                                    with_archived=self.show_archived,
+                                                    desc=order_desc)
 
         for document in documents:
-            # icon = Gtk.IconTheme.get_default().load_icon('text-x-generic', 64, 0)
+            self.request_thumbnail(document, self.model.append(self.document_row(document)))
 
-            # generate icon. It needs to stay in cache
-            icon = self.gen_preview(document.content[:200])
+        if self.selected_path:
+            self.view.select_path(self.selected_path)
 
-            # Generate tooltip
-            tooltip = f"{document.title}"
+        # Wait for layout to know which rows are visible
+        GLib.idle_add(self.schedule_thumbnails, priority=GLib.PRIORITY_LOW)
 
-            if document.created:
-                created = datetime.strptime(document.created, "%Y-%m-%d %H:%M:%S.%f")
-                tooltip += f"\n<span weight='600' size='smaller' alpha='75%'>" \
-                           + _('Created') + f": {created.strftime('%x')}</span>"
+    def document_row(self, document: Union[Document, DocumentRecord]) -> list:
+        """Builds model row for the given `document`.
+        """
+        # icon = Gtk.IconTheme.get_default().load_icon('text-x-generic', 64, 0)
 
-            if document.modified:
-                modified = datetime.strptime(document.modified, "%Y-%m-%d %H:%M:%S.%f")
-                tooltip += f"\n<span weight='600' size='smaller' alpha='75%'>" \
-                           + _('Modified') + f": {modified.strftime('%x')}</span>"
+        # Get icon from cache or use placeholder until preview rendered in background
+        icon = self.thumbnails.peek(document.document_id, document.excerpt) or self.placeholder_icon
 
-            self.model.append([icon,
-                               document.title,
-                               document.content,
-                               document.document_id,
-                               tooltip])
+        # Generate tooltip
+        tooltip = f"{document.title}"
 
-        if self.selected_path:
-            self.view.select_path(self.selected_path)
+        if document.created:
+            created = datetime.fromisoformat(str(document.created))
+            tooltip += f"\n<span weight='600' size='smaller' alpha='75%'>" \
+                       + _('Created') + f": {created.strftime('%x')}</span>"
+
+        if document.modified:
+            modified = datetime.fromisoformat(str(document.modified))
+            tooltip += f"\n<span weight='600' size='smaller' alpha='75%'>" \
+                       + _('Modified') + f": {modified.strftime('%x')}</span>"
+
+        return [icon,
+                document.title,
+                document.excerpt,
+                document.document_id,
+                tooltip]
+
+    def is_document_visible(self, document: Document) -> bool:
+        """Checks whether `document` belongs to the currently displayed list.
+        """
+        if self.show_archived:
+            return document.archived
+        return not document.archived and document.folder == self.current_folder_path
+
+    def find_document_iter(self, doc_id: int) -> Optional[Gtk.TreeIter]:
+        for row in self.model:
+            if row[3] == doc_id:
+                return row.iter
+        return None
+
+    def find_folder_iter(self, title: str) -> Optional[Gtk.TreeIter]:
+        for row in self.model:
+            if row[3] == -1 and row[1] == title:
+                return row.iter
+        return None
+
+    def insert_document_row(self, document: Document) -> None:
+        """Inserts `document` keeping the current sort order.
+        """
+        order_desc = self.settings.get_boolean('sort-desc')
+        row = self.document_row(document)
+        for item in self.model:
+            if item[3] == -1:
+                continue
+            if (item[3] < document.document_id) if order_desc else (item[3] > document.document_id):
+                self.request_thumbnail(document, self.model.insert_before(item.iter, row))
+                return
+        self.request_thumbnail(document, self.model.append(row))
+
+    def insert_folder_row(self, title: str, path: str) -> None:
+        """Inserts folder after the other folders keeping titles order.
+        """
+        icon = Pixbuf.new_from_resource(RESOURCE_PREFIX + '/icons/folder.svg')
+        row = [icon, title, path, -1, title]
+        for item in self.model:
+            if item[3] == -1 and item[1] == '..':
+                continue
+            if item[3] != -1 or item[1] > title:
+                self.model.insert_before(item.iter, row)
+                return
+        self.model.append(row)
+
+    def request_thumbnail(self, document: Union[Document, DocumentRecord], model_iter: Gtk.TreeIter) -> None:
+        """Queues preview rendering for the row if it shows a placeholder.
+        """
+        if self.thumbnails.peek(document.document_id, document.excerpt) is not None:
+            return
+
+        row_ref = Gtk.TreeRowReference.new(self.model, self.model.get_path(model_iter))
+        self.pending_thumbnails[document.document_id] = (document.excerpt, row_ref)
+
+    def schedule_thumbnails(self) -> bool:
+        """Sends the next batches of pending previews to the worker pool.
+
+        Rows around the visible area go first, rows far away wait until the user scrolls to them.
+        """
+        while self.rendering_batches < self.THUMBNAILS_WORKERS:
+            batch = self.next_thumbnails_batch()
+            if not batch:
+                break
+
+            self.rendering_batches += 1
+            row_refs = {doc_id: row_ref for doc_id, _excerpt, row_ref in batch}
+            future = self.thumbnails_executor.submit(self.render_thumbnails,
+                                                     [(doc_id, excerpt) for doc_id, excerpt, _ in batch])
+            # Bind the batch now, the callback runs after the loop moved on to the next one
+            future.add_done_callback(
+                partial(self.on_thumbnails_done, self.thumbnails_generation, row_refs))
+
+        return GLib.SOURCE_REMOVE
+
+    def next_thumbnails_batch(self) -> list:
+        visible_range = self.view.get_visible_range()
+        if visible_range:
+            start = visible_range[0].get_indices()[0]
+            end = visible_range[1].get_indices()[0]
+        else:
+            start, end = 0, self.THUMBNAILS_BATCH
+
+        # Prefetch one screen above and below the visible area.
+        page = max(end - start, self.THUMBNAILS_BATCH)
+        low, high = start - page, end + page
+
+        candidates = []
+        for doc_id, (excerpt, row_ref) in list(self.pending_thumbnails.items()):
+            path = row_ref.get_path()
+            if path is None:
+                del self.pending_thumbnails[doc_id]
+                continue
+
+            index = path.get_indices()[0]
+            if low <= index <= high:
+                # Visible rows first, then the closest to the visible area
+                distance = 0 if start <= index <= end else min(abs(index - start), abs(index - end))
+                candidates.append((distance, index, doc_id))
+
+        candidates.sort()
+        batch = []
+        for _distance, _index, doc_id in candidates[:self.THUMBNAILS_BATCH]:
+            excerpt, row_ref = self.pending_thumbnails.pop(doc_id)
+            batch.append((doc_id, excerpt, row_ref))
+        return batch
+
+    def render_thumbnails(self, batch: list) -> list:
+        """Loads or renders previews in a worker thread.
+        """
+        return [(doc_id, excerpt, self.thumbnails.load_or_render(doc_id, excerpt)) for doc_id, excerpt in batch]
+
+    def on_thumbnails_done(self, generation: int, row_refs: dict, future) -> None:
+        # Called in a worker thread, the model is updated on the main loop
+        GLib.idle_add(self.on_thumbnails_rendered, generation, row_refs, future)
+
+    def on_thumbnails_rendered(self, generation: int, row_refs: dict, future) -> bool:
+        self.rendering_batches -= 1
+
+        try:
+            results = future.result()
+        except Exception as e:
+            Logger.error('Thumbnails rendering failed: %s', e)
+            results = []
+
+        for doc_id, excerpt, pixbuf in results:
+            self.thumbnails.put(doc_id, excerpt, pixbuf)
+            if generation != self.thumbnails_generation:
+                continue
+
+            path = row_refs[doc_id].get_path()
+            if path is None:
+                continue
+
+            # Document might be changed while preview was rendering
+            model_iter = self.model.get_iter(path)
+            if self.model.get_value(model_iter, 3) == doc_id and self.model.get_value(model_iter, 2) == excerpt:
+                self.model.set_value(model_iter, 0, pixbuf)
+
+        self.schedule_thumbnails()
+        return GLib.SOURCE_REMOVE
+
+    def on_storage_document_changed(self, storage: Storage, doc_id: int, *args) -> None:
+        """Adds, updates or removes document row according to its current state in the storage.
+        """
+        document = self.storage.get_summary(doc_id)
+        model_iter = self.find_document_iter(doc_id)
+
+        if document and self.is_document_visible(document):
+            if model_iter:
+                self.model.set_row(model_iter, self.document_row(document))
+                self.request_thumbnail(document, model_iter)
+            else:
+                self.insert_document_row(document)
+            self.schedule_thumbnails()
+        elif model_iter:
+            self.model.remove(model_iter)
+
+    def on_storage_document_deleted(self, storage: Storage, doc_id: int) -> None:
+        self.thumbnails.invalidate(doc_id)
+        model_iter = self.find_document_iter(doc_id)
+        if model_iter:
+            self.model.remove(model_iter)
+
+    def on_storage_bulk_changed(self, storage: Storage) -> None:
+        # Too many changes to apply one by one
+        path = self.current_folder_path
+        if path != '/' and not storage.folder_tree.get(path):
+            path = '/'
+        self.reload_items(path=path)
+
+    def on_storage_folder_added(self, storage: Storage, folder_path: str) -> None:
+        path, title = os.path.split(folder_path)
+        if not self.show_archived and path == self.current_folder_path:
+            self.insert_folder_row(title, path)
+
+    def on_storage_folder_moved(self, storage: Storage, old_path: str, new_path: str) -> None:
+        # Currently displayed folder was moved itself, follow it.
+        current_path = self.current_folder_path
+        if current_path == old_path or current_path.startswith(old_path + '/'):
+            self.reload_items(path=new_path + current_path[len(old_path):])
+            return
+
+        self.on_storage_folder_deleted(storage, old_path)
+        self.on_storage_folder_added(storage, new_path)
+
+    def on_storage_folder_deleted(self, storage: Storage, folder_path: str) -> None:
+        current_path = self.current_folder_path
+        if self.show_archived or current_path == folder_path or current_path.startswith(folder_path + '/'):
+            self.reload_items(path=os.path.dirname(folder_path) if not self.show_archived else None)
+            return
+
+        path, title = os.path.split(folder_path)
+        if path == current_path:
+            model_iter = self.find_folder_iter(title)
+            if model_iter:
+                self.model.remove(model_iter)
 
     def create_folder_model(self, title: str, path: str, tooltip: str = None, icon: Pixbuf = None):
         icon = icon or Pixbuf.new_from_resource(RESOURCE_PREFIX + '/icons/folder.svg')
@@ -304,6 +562,34 @@ class DocumentGrid(Gtk.Grid):
         self.selected_path = path
         self.emit('document-activated')
 
+    def on_query_tooltip(self, view: Gtk.IconView, x: int, y: int, keyboard_mode: bool, tooltip: Gtk.Tooltip) -> bool:
+        found, x, y, model, path, model_iter = view.get_tooltip_context(x, y, keyboard_mode)
+        if not found:
+            return False
+
+        markup = model.get_value(model_iter, 4)
+        doc_id = model.get_value(model_iter, 3)
+        if self.library_stats:
+            if doc_id == -1:
+                # Folder rows keep the parent path, except for the "upper" folder
+                title, folder_path = model.get_value(model_iter, 1), model.get_value(model_iter, 2)
+                if title != '..':
+                    folder_path = os.path.join(folder_path, title)
+                words = self.library_stats.words(folder_path)
+            else:
+                stats = self.library_stats.document(doc_id)
+                words = stats[1] if stats else None
+
+            if words is not None:
+                hours, minutes, seconds = StatsCounter.read_time(words)
+                markup += f"\n<span weight='600' size='smaller' alpha='75%'>" \
+                          + _("{:n} words, {:d}h {:02d}m {:02d}s read").format(words, hours, minutes, seconds) \
+                          + "</span>"
+
+        tooltip.set_markup(markup)
+        view.set_tooltip_item(tooltip, path)
+        return True
+
     def on_button_pressed(self, widget: Gtk.Widget, event: Gdk.EventButton):
         """Handle mouse button press event and display context menu if needed.
         """
@@ -317,7 +603,7 @@ class DocumentGrid(Gtk.Grid):
         if event.button == Gdk.BUTTON_SECONDARY:
             self.view.select_path(self.selected_path)
 
-            origin_item = self.selected_folder if self.is_folder_selected else self.selected_document
+            origin_item = self.selected_folder if self.is_folder_selected else self.selected_document_summary
             if isinstance(origin_item, Folder) and origin_item.title == "..":
                 print('System @UP folder. Action declined.')
                 return
@@ -336,8 +622,8 @@ class DocumentGrid(Gtk.Grid):
                 menu_popover: Gtk.PopoverMenu = builder.get_object('folder-popover-menu')
             else:
                 menu_popover: Gtk.PopoverMenu = builder.get_object('document-popover-menu')
-                find_child(menu_popover, "archive").set_visible(not self.selected_document.archived)
-                find_child(menu_popover, "unarchive").set_visible(self.selected_document.archived)
+                find_child(menu_popover, "archive").set_visible(not origin_item.archived)
+                find_child(menu_popover, "unarchive").set_visible(origin_item.archived)
 
             menu_popover.set_relative_to(self.view)
             menu_popover.set_pointing_to(rect)
@@ -404,7 +690,7 @@ class DocumentGrid(Gtk.Grid):
 
         # Handle reordering and moving inside Norka's virtual filesystem
         elif info == TARGET_ENTRY_REORDER:
-            origin_item = self.selected_folder if self.is_folder_selected else self.selected_document
+            origin_item = self.selected_folder if self.is_folder_selected else self.selected_document_summary
 
             dest_path = self.view.get_path_at_pos(x, y)
             if not dest_path:
@@ -420,7 +706,7 @@ class DocumentGrid(Gtk.Grid):
                     path=self.model.get_value(dest_iter, 2)
                 )
             else:
-                dest_item = self.storage.get(dest_item_id)
+                dest_item = self.storage.get_summary(dest_item_id)
 
             # Don't move item to itself :)
             if origin_item.absolute_path == dest_item.absolute_path:
@@ -435,9 +721,9 @@ class DocumentGrid(Gtk.Grid):
 
                 if folder_id:
                     folder = self.storage.get_folder(folder_id)
-                    self.storage.move(origin_item.document_id, folder.absolute_path)
-                    self.storage.move(dest_item.document_id, folder.absolute_path)
-                    self.reload_items()
+                    with self.storage.batch():
+                        self.storage.move(origin_item.document_id, folder.absolute_path)
+                        self.storage.move(dest_item.document_id, folder.absolute_path)
                 return
 
                 # For folders, we have to move folder and its content to destination
@@ -445,12 +731,10 @@ class DocumentGrid(Gtk.Grid):
                 print(f'Folder "{origin_item.title}": "{origin_item.path}" -> "{dest_item.absolute_path}"')
 
                 self.storage.move_folder(origin_item, dest_item.absolute_path)
-                self.reload_items()
             # For regular documents it is easy to move - just update the `path`.
             else:
                 if self.storage.update(origin_item.document_id, {'path': dest_item.absolute_path}):
                     print(f'Moved {origin_item.title} to {dest_item.absolute_path}')
-                    self.reload_items()
 
         Gtk.drag_finish(drag_context, True, drag_context.get_selected_action() == Gdk.DragAction.MOVE, time)
 
@@ -467,8 +751,8 @@ class DocumentGrid(Gtk.Grid):
         sender.destroy()
 
         folder = self.document_grid.selected_folder
-        if folder and self.storage.rename_folder(folder, title):
-            self.document_grid.reload_items()
+        if folder:
+            self.storage.rename_folder(folder, title)
 
     def filter_model_by_value(self, model, path, iter):
         print(f'filter_model_by_value: {model}; {path}; {iter};')
@@ -24,18 +24,22 @@
 
 import re
 from gettext import gettext as _
-from typing import Tuple
+from typing import Iterator, Tuple
 
 from gi.repository import Gtk, GtkSource, Gdk, Gspell, Pango, Granite, GObject, GLib
 
+from norka.gobject_worker import GObjectWorker, PRIORITY_INTERACTIVE
 from norka.models.document import Document
+from norka.services.autosave import AutosaveScheduler
 from norka.services.logger import Logger
 from norka.services.markup_formatter import MarkupFormatter
+from norka.services.outline_handler import OutlineHandler
 from norka.services.settings import Settings
 from norka.services.stats_handler import StatsHandler
 from norka.services.storage import Storage
 from norka.widgets.image_link_popover import ImageLinkPopover
 from norka.widgets.link_popover import LinkPopover
+from norka.widgets.outline_sidebar import OutlineSidebar
 from norka.widgets.search_bar import SearchBar
 
 
@@ -59,9 +63,13 @@ class Editor(Gtk.Grid):
         'insert-image': (GObject.SignalFlags.ACTION, None, ()),
         'update-document-stats': (GObject.SignalFlags.ACTION, None, ()),
         'loading': (GObject.SignalFlags.ACTION, None, (bool,)),
+        'document-load-failed': (GObject.SignalFlags.ACTION, None, (int,)),
         'document-changed': (GObject.SignalFlags.ACTION, None, (bool,)),
     }
 
+    # Document content is inserted into the buffer in chunks of about this many characters
+    LOAD_CHUNK_SIZE = 256 * 1024
+
     def __init__(self, storage: Storage, settings: Settings):
         super().__init__()
 
@@ -69,6 +77,15 @@ class Editor(Gtk.Grid):
         self.storage = storage
         self.settings = settings
 
+        # Background fetch and idle insertion of the document being loaded
+        self.load_task = None
+        self.load_source_id = None
+        self.load_generation = 0
+
+        # Single debounced autosave timer for all the buffer changes
+        self.saver = AutosaveScheduler(self.save_document)
+        self.update_autosave_timing()
+
         self.buffer = GtkSource.Buffer()
         self.buffer.connect('changed', self.on_buffer_changed)
         self.manager = GtkSource.LanguageManager()
@@ -144,6 +161,19 @@ class Editor(Gtk.Grid):
         self.stats_handler.connect('update-document-stats', self.update_stats)
         self.stats = self.stats_handler.stats
 
+        # Outline of the document headings, kept up to date incrementally
+        self.outline_handler = OutlineHandler(buffer=self.buffer)
+        self.outline_handler.connect('outline-changed', self.on_outline_changed)
+        self.outline = self.outline_handler.outline
+        self.buffer.connect('notify::cursor-position', self.on_cursor_position_changed)
+
+        self.outline_sidebar = OutlineSidebar()
+        self.outline_sidebar.connect('heading-activated', lambda _, line: self.jump_to_line(line))
+        self.outline_revealer = Gtk.Revealer(transition_type=Gtk.RevealerTransitionType.SLIDE_RIGHT)
+        self.outline_revealer.add(self.outline_sidebar)
+        self.outline_revealer.show_all()
+
+        self.add(self.outline_revealer)
         self.add(self.overlay)
 
         # SpellChecker
@@ -163,11 +193,20 @@ class Editor(Gtk.Grid):
                                                       settings=self.search_settings)
         self.search_iter = None
 
+    @property
+    def is_loading(self) -> bool:
+        """True while the document content is fetched or inserted into the buffer.
+        """
+        return self.load_task is not None or self.load_source_id is not None
+
     def on_buffer_changed(self, buffer: Gtk.TextBuffer):
+        if self.is_loading:
+            return
+
         self.buffer.set_modified(True)
         self.emit('document-changed', True)
         if self.settings.get_boolean('autosave'):
-            self.start_saver()
+            self.saver.schedule()
 
     def create_document(self, title: str = None, folder_path: str = '/') -> None:
         """Create new document and put it to storage
@@ -178,38 +217,141 @@ class Editor(Gtk.Grid):
         if not title:
             title = _('Nameless')
         self.document = Document(title=title, folder=folder_path)
+        self.view.set_editable(True)
         self.view.grab_focus()
-        if self.settings.get_boolean('autosave'):
-            # Begin autosaving timer
-            self.start_saver()
         self.emit('document-load', self.document.document_id)
 
     def load_document(self, doc_id: int) -> None:
         """Load :model:`Document` from storage with given `doc_id`.
 
+        The content is fetched in a worker thread and inserted into the buffer in chunks
+        when the main loop is idle, so huge documents do not freeze the window.
+        Stats and outline are updated once, when the whole content is inserted.
+
         :param doc_id: id of the document to load
         :type doc_id: int
         :return: None
         """
+        self.cancel_loading()
         self.emit('loading', True)
         self.view.set_editable(False)
 
-        self.document = self.storage.get(doc_id)
+        # Title and folder are needed right away, content is fetched in background
+        self.document = self.storage.get_summary(doc_id)
+        if not self.document:
+            Logger.error('Document %s not found', doc_id)
+            self.view.set_editable(True)
+            self.emit('loading', False)
+            return
+
+        self.load_generation += 1
+        generation = self.load_generation
+        self.load_task = GObjectWorker.call(self.fetch_content, (doc_id,),
+                                            lambda content: self.on_content_fetched(content, generation),
+                                            lambda error: self.on_content_failed(error, generation),
+                                            priority=PRIORITY_INTERACTIVE, dedup=False)
 
+        self.saver.cancel()
+        self.stats_handler.suspend()
+        self.outline_handler.suspend()
         self.buffer.begin_not_undoable_action()
-        self.buffer.set_text(self.document.content)
+        self.buffer.set_text('')
+
+    def fetch_content(self, doc_id: int) -> str:
+        """Returns content of the document. Runs in a worker thread.
+        """
+        # Wait for the autosave of the document queued on unload
+        self.storage.flush()
+        with self.storage.read_only() as reader:
+            return reader.get_content(doc_id) or ''
+
+    def on_content_fetched(self, content: str, generation: int) -> None:
+        if generation != self.load_generation:
+            # Another document is being loaded
+            return
+
+        self.load_task = None
+        self.document.content = content
+        self.load_source_id = GLib.idle_add(self.insert_chunk, self.iter_chunks(content, self.LOAD_CHUNK_SIZE),
+                                            priority=GLib.PRIORITY_LOW)
+
+    def on_content_failed(self, error: Exception, generation: int) -> None:
+        if generation != self.load_generation:
+            return
+
+        Logger.error(getattr(error, 'traceback', error))
+        self.load_task = None
+        doc_id = self.document.document_id
+
+        # Never leave an empty buffer which could be saved over the document.
+        # The view stays read-only until another document is loaded or created.
+        self.buffer.set_modified(False)
+        self.buffer.end_not_undoable_action()
+        self.unload_document(save=False)
+        self.emit('document-load-failed', doc_id)
+
+    def insert_chunk(self, chunks: Iterator[str]) -> bool:
+        chunk = next(chunks, None)
+        if chunk is None:
+            self.load_source_id = None
+            self.finish_loading()
+            return False
+
+        self.buffer.insert(self.buffer.get_end_iter(), chunk)
+        return True
+
+    @staticmethod
+    def iter_chunks(text: str, size: int) -> Iterator[str]:
+        """Splits `text` into chunks of about `size` characters, preferably at line ends.
+        """
+        start = 0
+        while start < len(text):
+            end = text.find('\n', start + size, start + 2 * size)
+            end = start + size if end == -1 else end + 1
+            # Keep CRLF line ends in one chunk
+            if text[end - 1:end] == '\r':
+                end += 1
+            yield text[start:end]
+            start = end
+
+    def finish_loading(self) -> None:
         self.buffer.set_modified(False)
-        self.emit('document-changed', False)
         self.buffer.place_cursor(self.buffer.get_start_iter())
         self.buffer.end_not_undoable_action()
+        self.stats_handler.resume()
+        self.outline_handler.resume()
+        self.saver.cancel()
+        self.emit('document-changed', False)
         self.view.set_editable(True)
+        self.emit('loading', False)
 
         self.view.grab_focus()
-        if self.settings.get_boolean('autosave'):
-            # Begin autosaving timer
-            self.start_saver()
         self.emit('document-load', self.document.document_id)
 
+    def cancel_loading(self) -> bool:
+        """Stops loading of the document, the buffer keeps the content inserted so far.
+
+        Stats and outline stay suspended until the next document is loaded or unloaded.
+        Returns True if the document was loading.
+        """
+        if not self.is_loading:
+            return False
+
+        self.load_generation += 1
+        if self.load_task:
+            self.load_task.cancel()
+            self.load_task = None
+        if self.load_source_id:
+            GLib.source_remove(self.load_source_id)
+            self.load_source_id = None
+
+        # Partial content must never be saved over the document
+        self.buffer.set_modified(False)
+        self.buffer.end_not_undoable_action()
+        self.view.set_editable(True)
+        self.emit('loading', False)
+        return True
+
     def unload_document(self, save=True) -> None:
         """Save current document and clear text buffer
         """
@@ -217,16 +359,21 @@ class Editor(Gtk.Grid):
         if not self.document:
             return
 
+        self.cancel_loading()
         if save:
             self.save_document()
         self.buffer.set_text('')
+        self.stats_handler.resume()
+        self.outline_handler.resume()
+        self.saver.cancel()
         self.emit('document-close', self.document.document_id)
         self.document = None
         self.hide_search_bar()
         self.emit('loading', False)
 
-    def start_saver(self):
-        GLib.timeout_add_seconds(interval=2, function=self.save_document)
+    def update_autosave_timing(self) -> None:
+        self.saver.idle_delay = self.settings.get_int('autosave-delay') / 1000
+        self.saver.max_latency = self.settings.get_int('autosave-max-latency') / 1000
 
     def hide_search_bar(self):
         self.search_revealer.set_reveal_child(False)
@@ -249,7 +396,7 @@ class Editor(Gtk.Grid):
         return True
 
     def save_document(self) -> bool:
-        if not self.document or not self.buffer.get_modified():
+        if not self.document or self.is_loading or not self.buffer.get_modified():
             return False
 
         self.emit('loading', True)
@@ -276,14 +423,25 @@ class Editor(Gtk.Grid):
         if self.document.document_id == -1:
             self.document.document_id = self.storage.add(self.document)
 
-        if self.storage.update(self.document.document_id,
-                               {"content": text, 'title': self.document.title}):
-            self.document.content = text
-            self.buffer.set_modified(False)
-            self.emit('document-changed', False)
-            Logger.debug('Document %s saved', self.document.document_id)
+        # Write in background, the buffer is considered saved unless the write fails
+        self.storage.writer.update(self.document.document_id,
+                                   {"content": text, 'title': self.document.title},
+                                   callback=self.on_document_saved)
+        self.document.content = text
+        self.buffer.set_modified(False)
+        self.emit('document-changed', False)
+        return True
+
+    def on_document_saved(self, doc_id: int, success: bool) -> None:
+        if success:
+            Logger.debug('Document %s saved', doc_id)
+        elif self.document and self.document.document_id == doc_id:
+            Logger.error('Document %s was not saved', doc_id)
+            self.buffer.set_modified(True)
+            self.emit('document-changed', True)
+
+        if not self.storage.writer.busy:
             self.emit('loading', False)
-            return True
 
     def get_text(self) -> str:
         return self.buffer.get_text(
@@ -387,6 +545,49 @@ class Editor(Gtk.Grid):
         self.stats_overlay.set_label(_("{:d}:{:02d}:{:02d} Read Time").format(*self.stats.read_time))
         self.emit('update-document-stats')
 
+    def on_outline_changed(self, outline_handler: OutlineHandler):
+        if self.outline_revealer.get_reveal_child():
+            self.update_outline()
+
+    def update_outline(self) -> None:
+        self.outline_sidebar.update(self.outline_handler.headings)
+        self.on_cursor_position_changed(self.buffer)
+
+    def on_cursor_position_changed(self, buffer: Gtk.TextBuffer, *args) -> None:
+        if self.outline_revealer.get_reveal_child():
+            cursor = buffer.get_iter_at_mark(buffer.get_insert())
+            self.outline_sidebar.select(self.outline.section_at(cursor.get_line()))
+
+    def toggle_outline(self) -> None:
+        reveal = not self.outline_revealer.get_reveal_child()
+        self.outline_revealer.set_reveal_child(reveal)
+        if reveal:
+            self.update_outline()
+        else:
+            self.view.grab_focus()
+
+    def jump_to_line(self, line: int) -> None:
+        """Place cursor at the start of `line` and scroll it to the top of the view.
+        """
+        line_iter = self.buffer.get_iter_at_line(line)
+        self.buffer.place_cursor(line_iter)
+        self.view.scroll_to_iter(line_iter, 0.0, True, 0.0, 0.0)
+        self.view.grab_focus()
+
+    def jump_to_next_section(self) -> bool:
+        cursor = self.buffer.get_iter_at_mark(self.buffer.get_insert())
+        heading = self.outline.next_heading(cursor.get_line())
+        if heading:
+            self.jump_to_line(heading.line)
+        return heading is not None
+
+    def jump_to_previous_section(self) -> bool:
+        cursor = self.buffer.get_iter_at_mark(self.buffer.get_insert())
+        heading = self.outline.previous_heading(cursor.get_line())
+        if heading:
+            self.jump_to_line(heading.line)
+        return heading is not None
+
     def do_stop_search(self, event: Gdk.Event = None) -> None:
         self.search_revealer.set_reveal_child(False)
         self.view.grab_focus()
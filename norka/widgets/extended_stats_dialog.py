@@ -28,6 +28,7 @@ from gi.repository import Gtk, Granite, Handy
 
 from norka.define import RESOURCE_PREFIX
 from norka.models.document import Document
+from norka.services.library_stats import LibraryStats
 from norka.services.stats_handler import DocumentStats
 
 
@@ -45,6 +46,9 @@ class ExtendedStatsWindow(Handy.Window):
     paragraphs_count_label: Gtk.Label = Gtk.Template.Child()
     created_date_label: Gtk.Label = Gtk.Template.Child()
     modified_date_label: Gtk.Label = Gtk.Template.Child()
+    folder_words_label: Gtk.Label = Gtk.Template.Child()
+    library_words_label: Gtk.Label = Gtk.Template.Child()
+    longest_document_label: Gtk.Label = Gtk.Template.Child()
     export_text: Gtk.Button = Gtk.Template.Child()
     export_markdown: Gtk.Button = Gtk.Template.Child()
     export_html: Gtk.Button = Gtk.Template.Child()
@@ -82,5 +86,25 @@ class ExtendedStatsWindow(Handy.Window):
         self.paragraphs_count_label.set_label(f"{stats.paragraphs}")
         self.read_time_label.set_label(_("{:d}h {:02d}m {:02d}s").format(*stats.read_time))
 
+    def update_library_stats(self, library_stats: LibraryStats, path: str = '/'):
+        """Shows cached stats of the document folder and of the whole library.
+        """
+        folder_words = library_stats.words(path)
+        self.folder_words_label.set_label(f"{folder_words}")
+        self.folder_words_label.set_tooltip_text(path)
+
+        library_words = library_stats.words()
+        self.library_words_label.set_label(f"{library_words}")
+
+        longest = library_stats.longest(limit=1)
+        if longest:
+            document = longest[0]
+            self.longest_document_label.set_label(_("{} – {} words").format(document.title, document.words))
+            self.longest_document_label.set_tooltip_text(
+                _("{:d}h {:02d}m {:02d}s").format(*document.read_time))
+        else:
+            self.longest_document_label.set_label("–")
+            self.longest_document_label.set_tooltip_text(None)
+
     def on_close_activated(self, sender: Gtk.Widget):
         self.hide()
@@ -162,8 +162,10 @@ class Header(Gtk.Box):
         self.subtitle_label.set_label(label)
         self.subtitle_label.set_tooltip_markup(label + tooltip)
 
-    def show_spinner(self, state: bool = False) -> None:
+    def show_spinner(self, state: bool = False, tooltip: str = None) -> None:
         # Gonna fix this double spinners
+        self.loader_spinner.set_tooltip_text(tooltip if state else None)
+        self.editor_spinner.set_tooltip_text(tooltip if state else None)
         if state:
             self.loader_spinner.start()
             self.editor_spinner.start()
@@ -78,6 +78,10 @@ class MenuPopover(Gtk.Popover):
         backup_label.set_valign(Gtk.Align.CENTER)
         backup_menuitem.add(backup_label)
 
+        snapshot_menuitem = Gtk.ModelButton(text=_("Make snapshot"), action_name='document.snapshot')
+        restore_snapshot_menuitem = Gtk.ModelButton(text=_("Restore snapshot…"),
+                                                    action_name='document.restore-snapshot')
+
         quit_menuitem = Gtk.ModelButton(text=_("Quit"), action_name='app.quit')
         quit_menuitem.get_child().destroy()
         quit_label = Granite.AccelLabel.from_action_name("Quit", "app.quit")
@@ -96,8 +100,10 @@ class MenuPopover(Gtk.Popover):
         menu_grid.attach(about_menuitem, 0, 7, 3, 1)
         menu_grid.attach(self.make_sep(), 0, 8, 3, 1)
         menu_grid.attach(backup_menuitem, 0, 9, 3, 1)
-        menu_grid.attach(self.make_sep(), 0, 10, 3, 1)
-        menu_grid.attach(quit_menuitem, 0, 11, 3, 1)
+        menu_grid.attach(snapshot_menuitem, 0, 10, 3, 1)
+        menu_grid.attach(restore_snapshot_menuitem, 0, 11, 3, 1)
+        menu_grid.attach(self.make_sep(), 0, 12, 3, 1)
+        menu_grid.attach(quit_menuitem, 0, 13, 3, 1)
 
         self.add(menu_grid)
 
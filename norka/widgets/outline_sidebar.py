@@ -0,0 +1,80 @@
+# outline_sidebar.py
+#
+# MIT License
+#
+# Copyright (c) 2020 Andrey Maksimov <meamka@ya.ru>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+from gettext import gettext as _
+from typing import List
+
+from gi.repository import Gtk, GObject, Pango
+
+from norka.services.outline import Heading
+
+
+class OutlineSidebar(Gtk.ScrolledWindow):
+    """List of document headings. Activating a heading emits `heading-activated` with its line.
+    """
+    __gtype_name__ = 'OutlineSidebar'
+
+    __gsignals__ = {
+        'heading-activated': (GObject.SignalFlags.ACTION, None, (int,)),
+    }
+
+    def __init__(self):
+        super().__init__(hscrollbar_policy=Gtk.PolicyType.NEVER)
+        self.set_size_request(220, -1)
+        self.get_style_context().add_class('outline-sidebar')
+
+        placeholder = Gtk.Label(label=_('No headings'), margin=12)
+        placeholder.get_style_context().add_class('dim-label')
+        placeholder.show()
+
+        self.list_box = Gtk.ListBox(selection_mode=Gtk.SelectionMode.SINGLE)
+        self.list_box.set_placeholder(placeholder)
+        self.list_box.connect('row-activated', self.on_row_activated)
+        self.add(self.list_box)
+
+        self.lines: List[int] = []
+
+    def update(self, headings: List[Heading]) -> None:
+        for row in self.list_box.get_children():
+            row.destroy()
+
+        self.lines = [heading.line for heading in headings]
+        for heading in headings:
+            label = Gtk.Label(label=heading.title, xalign=0, ellipsize=Pango.EllipsizeMode.END,
+                              tooltip_text=heading.title,
+                              margin_start=6 + 12 * (heading.level - 1), margin_end=6, margin_top=4, margin_bottom=4)
+            self.list_box.add(label)
+        self.list_box.show_all()
+
+    def select(self, index: int) -> None:
+        """Highlights heading at `index`, or nothing if `index` is -1.
+        """
+        row = self.list_box.get_row_at_index(index) if index >= 0 else None
+        if row:
+            self.list_box.select_row(row)
+        else:
+            self.list_box.unselect_all()
+
+    def on_row_activated(self, list_box: Gtk.ListBox, row: Gtk.ListBoxRow) -> None:
+        self.emit('heading-activated', self.lines[row.get_index()])
@@ -21,14 +21,15 @@
 # LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
-import tempfile
+import json
 from gettext import gettext as _
 
 from norka.define import RESOURCE_PREFIX
-from norka.gobject_worker import GObjectWorker
+from norka.gobject_worker import GObjectWorker, PRIORITY_INTERACTIVE
 from norka.services.export import Exporter
+from norka.services.preview_renderer import PreviewRenderer, RenderResult, PATCH_SCRIPT
 
-from gi.repository import WebKit2, Gtk, Granite, Handy, Gdk
+from gi.repository import WebKit2, Gtk, Granite, Handy, Gdk, GLib
 
 
 @Gtk.Template(resource_path=f"{RESOURCE_PREFIX}/ui/preview_window.ui")
@@ -44,6 +45,9 @@ class Preview(Handy.Window):
     spinner: Gtk.Spinner = Gtk.Template.Child()
     content_deck: Handy.Deck = Gtk.Template.Child()
 
+    # Delay in milliseconds between the last buffer change and the render
+    RENDER_DELAY = 250
+
     def __init__(self, parent: Gtk.Widget, text: str = None):
         super().__init__(modal=False)
         self.set_default_size(800, 600)
@@ -68,11 +72,12 @@ class Preview(Handy.Window):
 
         # self.set_titlebar(header)
 
-        self.temp_file = tempfile.NamedTemporaryFile(prefix='norka-', delete=False)
-
-        # Render in thread
-        if text:
-            GObjectWorker.call(Exporter.export_html_preview, (self.temp_file.name, text, True), self.update_html)
+        self.renderer = PreviewRenderer(Exporter.render_body)
+        self.render_timeout = None
+        self.render_task = None
+        self.dark_mode = Gtk.Settings.get_default().props.gtk_application_prefer_dark_theme
+        # Blocks are patched only into a fully loaded page, otherwise the whole page is loaded again
+        self.loaded = False
 
         ctx = WebKit2.WebContext.get_default()
         self.web: WebKit2.WebView = WebKit2.WebView.new_with_context(ctx)
@@ -95,21 +100,65 @@ class Preview(Handy.Window):
 
         self.connect('enter-notify-event', self.on_enter_notify)
         self.connect('leave-notify-event', self.on_leave_notify)
+        self.connect('destroy', self.on_destroy)
+
+        # Render in thread
+        if text:
+            self.render(text)
 
     def buffer_changed(self, buffer: Gtk.TextBuffer):
+        """Restarts the render timer, so the preview is rendered once the typing pauses.
+        """
+        if self.render_timeout:
+            GLib.source_remove(self.render_timeout)
+        self.render_timeout = GLib.timeout_add(self.RENDER_DELAY, self.on_render_timeout, buffer)
+
+    def on_render_timeout(self, buffer: Gtk.TextBuffer) -> bool:
+        self.render_timeout = None
+        self.render(buffer.get_text(buffer.get_start_iter(), buffer.get_end_iter(), True))
+        return False
+
+    def render(self, text: str) -> None:
+        """Renders `text` in a worker thread, abandoning any render still in progress.
+        """
         self.show_spinner(True)
-        text = buffer.get_text(buffer.get_start_iter(), buffer.get_end_iter(), True)
-        GObjectWorker.call(Exporter.export_html_preview, (self.temp_file.name, text,), self.update_html)
+        generation = self.renderer.next_generation()
+        if self.render_task:
+            self.render_task.cancel()
+        self.render_task = GObjectWorker.call(self.renderer.render, (text, generation), self.update_blocks,
+                                              priority=PRIORITY_INTERACTIVE)
 
     def on_load_changed(self, webview: WebKit2.WebView, event: WebKit2.LoadEvent):
-        if event.STARTED:
+        if event == WebKit2.LoadEvent.STARTED:
+            self.loaded = False
             self.show_spinner(True)
-        if event.FINISHED:
+        elif event == WebKit2.LoadEvent.FINISHED:
+            self.loaded = True
             self.show_spinner(False)
 
-    def update_html(self, html: str):
-        # self.web.load_uri('file://' + html)
-        self.web.load_html(html)
+    def update_blocks(self, result: RenderResult):
+        if result is None or result.generation != self.renderer.generation:
+            # A newer render has been requested
+            return
+
+        if not self.loaded:
+            body = self.renderer.reset(result.blocks)
+            self.web.load_html(''.join(Exporter.iter_page((body,), dark_mode=self.dark_mode, script=PATCH_SCRIPT)))
+            return
+
+        start, removed, added = self.renderer.patch(result.blocks)
+        if removed or added:
+            self.web.run_javascript(f'norkaPatch({start}, {removed}, {json.dumps(added)});', None, None)
+        self.show_spinner(False)
+
+    def on_destroy(self, widget: Gtk.Widget):
+        if self.render_timeout:
+            GLib.source_remove(self.render_timeout)
+            self.render_timeout = None
+        # Make renders in progress stale
+        self.renderer.next_generation()
+        if self.render_task:
+            self.render_task.cancel()
 
     def show_spinner(self, state: bool = False) -> None:
         if state:
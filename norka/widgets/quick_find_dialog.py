@@ -24,9 +24,9 @@
 
 from gettext import gettext as _
 
-from gi.repository import Gtk, Gdk, Gio, GObject, Granite
+from gi.repository import Gtk, Gdk, Gio, GObject, GLib, Granite, Pango
 
-from norka.models.document import Document
+from norka.models.search_result import SearchResult
 from norka.services.storage import Storage
 
 
@@ -61,7 +61,7 @@ class QuickFindDialog(Gtk.Dialog):
         placeholder_image = Gtk.Image.new_from_icon_name("folder-saved-search-symbolic",
                                                          Gtk.IconSize.LARGE_TOOLBAR)
 
-        placeholder_label = Gtk.Label(label=_("Quickly find documents, just start typing its name."),
+        placeholder_label = Gtk.Label(label=_("Quickly find documents, just start typing its name or text."),
                                       wrap=True,
                                       max_width_chars=32,
                                       justify=Gtk.Justification.CENTER,
@@ -115,9 +115,9 @@ class QuickFindDialog(Gtk.Dialog):
         if not search_text:
             return
 
-        documents = self.storage.find(search_text=search_text)
-        for document in documents:
-            self.result_store.append(document)
+        results = self.storage.search(search_text=search_text)
+        for result in results:
+            self.result_store.append(result)
 
     def row_activated(self, sender: Gtk.ListBox, row: Gtk.ListBoxRow):
         self.document_id = row.document_id
@@ -131,7 +131,7 @@ class QuickFindDialog(Gtk.Dialog):
 class QuickFindRow(Gtk.ListBoxRow):
     document_id = GObject.property(type=int)
 
-    def __init__(self, item: Document):
+    def __init__(self, item: SearchResult):
         super().__init__()
 
         self.document_id = item.document_id
@@ -141,13 +141,36 @@ class QuickFindRow(Gtk.ListBoxRow):
                       spacing=6,
                       margin=6)
 
-        doc_label = Gtk.Label(label=item.title)
+        labels_box = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=2)
+
+        doc_label = Gtk.Label(label=item.title, xalign=0)
+        labels_box.pack_start(doc_label, False, True, 0)
+
+        if item.snippet:
+            snippet_label = Gtk.Label(xalign=0,
+                                      wrap=True,
+                                      max_width_chars=48,
+                                      lines=2,
+                                      ellipsize=Pango.EllipsizeMode.END)
+            snippet_label.set_markup(self.snippet_markup(item.snippet))
+            snippet_label.get_style_context().add_class('dim-label')
+            labels_box.pack_start(snippet_label, False, True, 0)
+
         archive_icon = Gtk.Image.new_from_icon_name('user-trash-symbolic', Gtk.IconSize.SMALL_TOOLBAR)
         archive_icon.get_style_context().add_class('muted')
 
-        box.pack_start(doc_label, False, True, 0)
+        box.pack_start(labels_box, True, True, 0)
         if item.archived:
             box.pack_end(archive_icon, False, False, 0)
 
         self.add(box)
         self.show_all()
+
+    @staticmethod
+    def snippet_markup(snippet: str) -> str:
+        """Converts search snippet to Pango markup with matches in bold.
+        """
+        snippet = ' '.join(snippet.split())
+        return GLib.markup_escape_text(snippet) \
+            .replace(SearchResult.MATCH_START, '<b>') \
+            .replace(SearchResult.MATCH_END, '</b>')
@@ -23,18 +23,22 @@
 # SOFTWARE.
 import os
 from gettext import gettext as _
+from typing import List
 
 from gi.repository import Gtk, Gio, GLib, Gdk, Granite, Handy
 from gi.repository.GdkPixbuf import Pixbuf
 
 from norka.define import FONT_SIZE_MIN, FONT_SIZE_MAX, FONT_SIZE_FAMILY, FONT_SIZE_DEFAULT, RESOURCE_PREFIX
-from norka.gobject_worker import GObjectWorker
+from norka.gobject_worker import GObjectWorker, PRIORITY_BACKGROUND
 from norka.models.document import Document
 from norka.services import distro
 from norka.services.backup import BackupService
+from norka.services.importer import Importer, ImportResult
+from norka.services.snapshot import SnapshotService
 from norka.services.export import Exporter, PDFExporter, Printer
 from norka.services.logger import Logger
 from norka.services.medium import Medium, PublishStatus
+from norka.services.library_stats import LibraryStats
 from norka.services.storage import Storage
 from norka.services.writeas import Writeas
 from norka.widgets.document_grid import DocumentGrid
@@ -95,7 +99,12 @@ class NorkaWindow(Handy.ApplicationWindow):
         # self.welcome_grid.connect('activated', self.on_welcome_activated)
         self.welcome_grid.connect('document-import', self.on_document_import)
 
-        self.document_grid = DocumentGrid(self.settings, storage=self.storage)
+        # Cached stats of all documents, counted in background after saves
+        self.library_stats = LibraryStats(self.storage)
+        self.library_stats.connect('changed', self.on_library_stats_changed)
+        self.library_stats.refresh()
+
+        self.document_grid = DocumentGrid(self.settings, storage=self.storage, library_stats=self.library_stats)
         self.document_grid.connect('path-changed', self.on_path_changed)
         self.document_grid.connect('document-create', self.on_document_create_activated)
         self.document_grid.connect('document-import', self.on_document_import)
@@ -106,6 +115,9 @@ class NorkaWindow(Handy.ApplicationWindow):
         self.editor.connect('document-changed', self.on_document_changed)
         self.editor.connect('update-document-stats', self.update_document_stats)
         self.editor.connect('loading', self.editor_loading)
+        self.editor.connect('document-load', self.on_editor_document_load)
+        self.editor.connect('document-load-failed', self.on_editor_document_load_failed)
+        self.editor.buffer.connect('changed', self.on_editor_buffer_changed)
 
         self.screens = Gtk.Stack()
         self.screens.set_transition_duration(400)
@@ -261,6 +273,16 @@ class NorkaWindow(Handy.ApplicationWindow):
                     'action': self.on_backup,
                     'accels': (None,)
                 },
+                {
+                    'name': 'snapshot',
+                    'action': self.on_snapshot,
+                    'accels': (None,)
+                },
+                {
+                    'name': 'restore-snapshot',
+                    'action': self.on_restore_snapshot,
+                    'accels': (None,)
+                },
                 {
                     'name': 'preview',
                     'action': self.on_preview,
@@ -306,6 +328,21 @@ class NorkaWindow(Handy.ApplicationWindow):
                     'action': self.on_text_search_backward,
                     'accels': ('<Control><Shift>g',)
                 },
+                {
+                    'name': 'outline',
+                    'action': self.on_toggle_outline,
+                    'accels': ('<Control><Shift>o',)
+                },
+                {
+                    'name': 'next_section',
+                    'action': self.on_next_section,
+                    'accels': ('<Control><Alt>Down',)
+                },
+                {
+                    'name': 'prev_section',
+                    'action': self.on_previous_section,
+                    'accels': ('<Control><Alt>Up',)
+                },
                 {
                     'name': 'toggle_archived',
                     'action': self.on_toggle_archive,
@@ -409,8 +446,6 @@ class NorkaWindow(Handy.ApplicationWindow):
                 self.extended_stats_dialog.close()
                 self.extended_stats_dialog = None
 
-            self.document_grid.reload_items(
-                path=self.document_grid.current_folder_path)
             self.header.toggle_document_mode()
             self.header.update_title()
             self.settings.set_int('last-document-id', -1)
@@ -505,11 +540,23 @@ class NorkaWindow(Handy.ApplicationWindow):
         filter_markdown.set_name(_("Text Files"))
         filter_markdown.add_mime_type("text/plain")
         dialog.add_filter(filter_markdown)
+
+        filter_archives = Gtk.FileFilter()
+        filter_archives.set_name(_("Archives"))
+        for mime_type in ("application/zip", "application/x-tar", "application/x-compressed-tar",
+                          "application/x-bzip-compressed-tar", "application/x-xz-compressed-tar"):
+            filter_archives.add_mime_type(mime_type)
+        dialog.add_filter(filter_archives)
+
+        dialog.set_select_multiple(True)
         dialog_result = dialog.run()
 
         if dialog_result == Gtk.ResponseType.ACCEPT:
-            file_path = dialog.get_filename()
-            self.import_document(file_path)
+            file_paths = dialog.get_filenames()
+            if any(Importer.is_bulk_source(file_path) for file_path in file_paths):
+                self.import_sources(file_paths)
+            else:
+                self.import_documents(file_paths)
 
         dialog.destroy()
 
@@ -533,43 +580,88 @@ class NorkaWindow(Handy.ApplicationWindow):
         if not os.path.exists(file_path):
             return False
 
+        doc_ids = self.import_documents([file_path])
+        return doc_ids[0] if doc_ids else False
+
+    def import_documents(self, file_paths: List[str]) -> List[int]:
+        """Import files from filesystem in a single transaction.
+        Creates new document in storage for every file and fill it with file's contents.
+
+        :param file_paths: paths to files to import
+        :return: IDs of created documents
+        """
         self.header.show_spinner(True)
         try:
-            _doc_id = None
-            with open(file_path, 'r') as _file:
-                lines = _file.readlines()
-                filename = os.path.basename(file_path)[:file_path.rfind('.')]
-
-                _doc = Document(title=filename,
-                                content=''.join(lines),
-                                folder=self.document_grid.current_folder_path)
-                _doc_id = self.storage.add(_doc)
-
-                self.document_grid.reload_items()
-            return _doc_id or True
-        except Exception as e:
-            print(e)
-            return False
+            documents = []
+            for file_path in file_paths:
+                try:
+                    with open(file_path, 'r') as _file:
+                        content = _file.read()
+                except Exception as e:
+                    Logger.error(e)
+                    continue
+
+                documents.append(Document(title=os.path.splitext(os.path.basename(file_path))[0],
+                                          content=content,
+                                          folder=self.document_grid.current_folder_path))
+            return self.storage.add_many(documents)
         finally:
             self.check_grid_items()
             self.header.show_spinner(False)
 
+    def import_sources(self, sources: List[str]) -> None:
+        """Import directories, archives and glob patterns in background.
+        Folder hierarchy of the sources is recreated in the current folder.
+
+        :param sources: paths to files, directories or archives and glob patterns
+        """
+        importer = Importer(self.storage)
+        importer.connect('progress', self.on_import_progress)
+
+        self.header.show_spinner(True, _("Importing…"))
+        GObjectWorker.call(importer.run,
+                           args=(sources, self.document_grid.current_folder_path),
+                           callback=self.on_import_finished,
+                           errorback=self.on_import_failed,
+                           priority=PRIORITY_BACKGROUND)
+
+        self.disconnect_toast()
+        self.toast.set_title(_("Import started."))
+        self.toast.set_default_action(None)
+        self.toast.send_notification()
+
+    def on_import_progress(self, importer: Importer, done: int, total: int, rate: float) -> None:
+        self.header.show_spinner(True, _("Imported {} of {} files ({:.0f} per second)").format(done, total, rate))
+
+    def on_import_finished(self, result: ImportResult) -> None:
+        self.header.show_spinner(False)
+        self.check_grid_items()
+
+        title = _("Imported {} documents in {:.1f} s.").format(result.documents, result.elapsed)
+        if result.failed:
+            title += ' ' + _("{} files failed.").format(result.failed)
+        self.toast.set_title(title)
+        self.toast.send_notification()
+
+    def on_import_failed(self, error: Exception) -> None:
+        Logger.error(getattr(error, 'traceback', error))
+        self.header.show_spinner(False)
+        self.toast.set_title(_("Import failed."))
+        self.toast.send_notification()
+
     def on_folder_create_activated(self, sender: Gtk.Widget, title: str):
         sender.destroy()
 
         self.storage.add_folder(title,
                                 path=self.document_grid.current_folder_path)
-        self.document_grid.reload_items(
-            path=self.document_grid.current_folder_path)
         self.check_grid_items()
 
     def on_folder_rename_activated(self, sender: Gtk.Widget, title: str):
         sender.destroy()
 
         folder = self.document_grid.selected_folder
-        if folder and self.storage.rename_folder(folder, title):
-            self.document_grid.reload_items(
-                path=self.document_grid.current_folder_path)
+        if folder:
+            self.storage.rename_folder(folder, title)
 
     def on_document_rename(self,
                            sender: Gtk.Widget = None,
@@ -584,7 +676,7 @@ class NorkaWindow(Handy.ApplicationWindow):
         if self.document_grid.is_folder_selected:
             item = self.document_grid.selected_folder
         else:
-            item = self.document_grid.selected_document
+            item = self.document_grid.selected_document_summary
         if not item:
             return
 
@@ -605,8 +697,7 @@ class NorkaWindow(Handy.ApplicationWindow):
         if not doc_id:
             return
 
-        if self.storage.update(doc_id=doc_id, data={'title': title}):
-            self.document_grid.reload_items()
+        self.storage.update(doc_id=doc_id, data={'title': title})
 
     def on_document_archive_activated(self,
                                       sender: Gtk.Widget = None,
@@ -621,7 +712,6 @@ class NorkaWindow(Handy.ApplicationWindow):
         if doc_id:
             if self.storage.update(doc_id=doc_id, data={'archived': True}):
                 self.check_grid_items()
-                self.document_grid.reload_items()
 
     def on_document_unarchive_activated(self,
                                         sender: Gtk.Widget = None,
@@ -636,7 +726,6 @@ class NorkaWindow(Handy.ApplicationWindow):
         if doc_id:
             if self.storage.update(doc_id=doc_id, data={'archived': False}):
                 self.check_grid_items()
-                self.document_grid.reload_items()
 
     def on_document_delete_activated(self,
                                      sender: Gtk.Widget = None,
@@ -650,7 +739,7 @@ class NorkaWindow(Handy.ApplicationWindow):
         if self.document_grid.is_folder_selected:
             item = self.document_grid.selected_folder
         else:
-            item = self.document_grid.selected_document
+            item = self.document_grid.selected_document_summary
 
         if item:
             prompt = MessageDialog(
@@ -667,7 +756,6 @@ class NorkaWindow(Handy.ApplicationWindow):
                     self.storage.delete_folder(item)
                 else:
                     self.storage.delete(item.document_id)
-                self.document_grid.reload_items()
                 self.check_grid_items()
 
     def on_export_plaintext(self,
@@ -936,10 +1024,11 @@ class NorkaWindow(Handy.ApplicationWindow):
         if dialog_result == Gtk.ResponseType.ACCEPT:
             self.header.show_spinner(True)
 
-            backup_service = BackupService(settings=self.settings)
+            backup_service = BackupService(settings=self.settings, storage=self.storage)
             GObjectWorker.call(backup_service.save,
                                args=(dialog.get_filename(),),
-                               callback=self.on_backup_finished)
+                               callback=self.on_backup_finished,
+                               priority=PRIORITY_BACKGROUND)
 
             self.toast.set_title(_("Backup started."))
             self.toast.send_notification()
@@ -957,6 +1046,88 @@ class NorkaWindow(Handy.ApplicationWindow):
             self.toast.set_title(_("Backup failed."))
         self.toast.send_notification()
 
+    @property
+    def snapshot_service(self) -> SnapshotService:
+        return SnapshotService(self.storage,
+                               keep_daily=self.settings.get_int('snapshot-keep-daily'),
+                               keep_weekly=self.settings.get_int('snapshot-keep-weekly'))
+
+    def on_snapshot(self, sender: Gtk.Widget = None, event=None) -> None:
+        self.header.show_spinner(True, _("Making snapshot…"))
+        GObjectWorker.call(self.snapshot_service.create,
+                           callback=self.on_snapshot_finished,
+                           errorback=self.on_snapshot_failed,
+                           priority=PRIORITY_BACKGROUND)
+
+    def on_snapshot_finished(self, snapshot_path: str) -> None:
+        self.header.show_spinner(False)
+        self.disconnect_toast()
+        self.toast.set_title(_("Snapshot saved."))
+        self.toast.set_default_action(_("Open folder"))
+        self.uri_to_open = f"file://{os.path.dirname(snapshot_path)}"
+        self.toast.connect("default-action", self.open_uri)
+        self.toast.send_notification()
+
+    def on_snapshot_failed(self, error: Exception) -> None:
+        Logger.error(getattr(error, 'traceback', error))
+        self.header.show_spinner(False)
+        self.disconnect_toast()
+        self.toast.set_title(_("Snapshot failed."))
+        self.toast.set_default_action(None)
+        self.toast.send_notification()
+
+    def on_restore_snapshot(self, sender: Gtk.Widget = None, event=None) -> None:
+        service = self.snapshot_service
+        dialog = Gtk.FileChooserNative.new(_("Select snapshot to restore"), self,
+                                           Gtk.FileChooserAction.OPEN)
+        if os.path.isdir(service.snapshot_dir):
+            dialog.set_current_folder(service.snapshot_dir)
+
+        filter_snapshots = Gtk.FileFilter()
+        filter_snapshots.set_name(_("Snapshots"))
+        for extension in service.EXTENSIONS.values():
+            filter_snapshots.add_pattern(f'*{extension}')
+        dialog.add_filter(filter_snapshots)
+
+        dialog_result = dialog.run()
+        snapshot_path = dialog.get_filename()
+        dialog.destroy()
+
+        if dialog_result != Gtk.ResponseType.ACCEPT or not snapshot_path:
+            return
+
+        prompt = MessageDialog(
+            _("Restore snapshot “{}”?").format(os.path.basename(snapshot_path)),
+            _("All the changes made after the snapshot will be lost"),
+            "dialog-warning",
+        )
+        result = prompt.run()
+        prompt.destroy()
+
+        if result == Gtk.ResponseType.APPLY:
+            if self.is_document_editing:
+                self.on_document_close_activated()
+
+            self.header.show_spinner(True, _("Restoring snapshot…"))
+            GObjectWorker.call(service.restore,
+                               args=(snapshot_path,),
+                               callback=self.on_restore_snapshot_finished,
+                               errorback=self.on_snapshot_failed)
+
+    def on_restore_snapshot_finished(self, result=None) -> None:
+        # Reopen the storage to apply migrations the snapshot might miss
+        self.storage.close()
+        self.storage.init()
+        self.storage.invalidate_folder_tree()
+        self.storage.emit('bulk-changed')
+
+        self.header.show_spinner(False)
+        self.check_grid_items()
+        self.disconnect_toast()
+        self.toast.set_title(_("Snapshot restored."))
+        self.toast.set_default_action(None)
+        self.toast.send_notification()
+
     def search_activated(self, sender, event=None):
         if self.screens.get_visible_child_name() == 'document-grid':
             self.on_document_search_activated(sender, event)
@@ -998,6 +1169,24 @@ class NorkaWindow(Handy.ApplicationWindow):
                 and self.editor.search_revealer.get_child_revealed():
             self.editor.search_backward(sender=sender, event=event)
 
+    def on_toggle_outline(self,
+                          sender: Gtk.Widget = None,
+                          event=None) -> None:
+        if self.screens.get_visible_child_name() == 'editor-grid':
+            self.editor.toggle_outline()
+
+    def on_next_section(self,
+                        sender: Gtk.Widget = None,
+                        event=None) -> None:
+        if self.screens.get_visible_child_name() == 'editor-grid':
+            self.editor.jump_to_next_section()
+
+    def on_previous_section(self,
+                            sender: Gtk.Widget = None,
+                            event=None) -> None:
+        if self.screens.get_visible_child_name() == 'editor-grid':
+            self.editor.jump_to_previous_section()
+
     def on_zoom_in(self, sender, event) -> None:
         self.zooming(Gdk.ScrollDirection.UP)
 
@@ -1077,6 +1266,7 @@ class NorkaWindow(Handy.ApplicationWindow):
             self.extended_stats_dialog.document = self.editor.document
         self.extended_stats_dialog.present()
         self.update_document_stats(None)
+        self.update_library_stats()
 
     def on_extended_stats_dialog_close(self, dialog: Gtk.Widget = None) -> None:
         self.extended_stats_dialog = None
@@ -1116,7 +1306,6 @@ class NorkaWindow(Handy.ApplicationWindow):
             # connect signal handlers
             self.editor.scrolled.get_vscrollbar().connect(
                 'value-changed', self.scroll_preview)
-            self.editor.buffer.connect('changed', self.preview.buffer_changed)
             self.editor.connect('document-load', self.preview.show_preview)
             self.editor.connect('document-close', self.preview.show_empty_page)
             self.preview.connect('destroy', self.on_preview_close)
@@ -1141,6 +1330,22 @@ class NorkaWindow(Handy.ApplicationWindow):
     def on_preview_close(self, sender):
         self.preview = None
 
+    def on_editor_buffer_changed(self, buffer: Gtk.TextBuffer) -> None:
+        # Preview is rendered once the document is loaded, not for every loaded chunk
+        if self.preview and not self.editor.is_loading:
+            self.preview.buffer_changed(buffer)
+
+    def on_editor_document_load(self, editor: Editor, doc_id: int) -> None:
+        if self.preview:
+            self.preview.buffer_changed(editor.buffer)
+
+    def on_editor_document_load_failed(self, editor: Editor, doc_id: int) -> None:
+        self.on_document_close_activated(editor)
+        self.disconnect_toast()
+        self.toast.set_title(_("Document could not be loaded."))
+        self.toast.set_default_action(None)
+        self.toast.send_notification()
+
     def update_document_stats(self, editor):
         stats = self.editor.stats
         document_path = self.editor.document.folder if self.editor.document else None
@@ -1148,6 +1353,17 @@ class NorkaWindow(Handy.ApplicationWindow):
         if self.extended_stats_dialog:
             self.extended_stats_dialog.update_stats(stats)
 
+    def update_library_stats(self) -> None:
+        if self.editor.document:
+            path = self.editor.document.folder
+        else:
+            path = self.document_grid.current_folder_path
+        self.extended_stats_dialog.update_library_stats(self.library_stats, path)
+
+    def on_library_stats_changed(self, library_stats: LibraryStats) -> None:
+        if self.extended_stats_dialog:
+            self.update_library_stats()
+
     def editor_loading(self, editor: Editor, is_loading: bool) -> None:
         if is_loading:
             self.header.loader_spinner.start()
@@ -0,0 +1,75 @@
+from unittest import TestCase
+from unittest.mock import patch
+
+from norka.services.autosave import AutosaveScheduler
+
+
+class AutosaveSchedulerTests(TestCase):
+
+    def setUp(self) -> None:
+        self.now = 100.0
+        self.saved = 0
+        self.scheduler = AutosaveScheduler(self._save, idle_delay=2.0, max_latency=10.0)
+
+        patcher = patch('norka.services.autosave.time.monotonic', lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.scheduler.cancel)
+
+    def _save(self):
+        self.saved += 1
+        return True
+
+    def test_coalesces_changes(self):
+        for _ in range(100):
+            self.scheduler.schedule()
+        timeout_id = self.scheduler._timeout_id
+
+        self.now += 2.0
+        self.scheduler._on_timeout()
+
+        self.assertTrue(timeout_id)
+        self.assertEqual(self.saved, 1)
+        self.assertFalse(self.scheduler.pending)
+        self.assertEqual(self.scheduler.metrics.saves, 1)
+        self.assertEqual(self.scheduler.metrics.changes, 100)
+
+    def test_waits_for_idle(self):
+        self.scheduler.schedule()
+        self.now += 1.5
+        self.scheduler.schedule()
+
+        self.now += 0.5
+        self.scheduler._on_timeout()
+        self.assertEqual(self.saved, 0)
+        self.assertTrue(self.scheduler._timeout_id)
+
+        self.now += 1.5
+        self.scheduler._on_timeout()
+        self.assertEqual(self.saved, 1)
+        self.assertAlmostEqual(self.scheduler.metrics.last_latency, 3.5)
+
+    def test_max_latency(self):
+        self.scheduler.schedule()
+        for _ in range(10):
+            self.now += 1.0
+            self.scheduler.schedule()
+            if self.scheduler._due_time() <= self.now:
+                self.scheduler._on_timeout()
+
+        self.assertEqual(self.saved, 1)
+        self.assertAlmostEqual(self.scheduler.metrics.max_latency, 10.0)
+
+    def test_flush_and_cancel(self):
+        self.scheduler.flush()
+        self.assertEqual(self.saved, 0)
+
+        self.scheduler.schedule()
+        self.scheduler.cancel()
+        self.scheduler.flush()
+        self.assertEqual(self.saved, 0)
+
+        self.scheduler.schedule()
+        self.scheduler.flush()
+        self.assertEqual(self.saved, 1)
+        self.assertFalse(self.scheduler._timeout_id)
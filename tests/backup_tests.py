@@ -0,0 +1,87 @@
+import json
+import os
+import tempfile
+from unittest import TestCase
+
+from norka.define import STORAGE_NAME
+from norka.models.document import Document
+from norka.services.backup import BackupService
+from norka.services.storage import Storage
+
+
+class BackupServiceTests(TestCase):
+
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.backup_dir = os.path.join(self.tmp_dir.name, 'backup')
+        os.mkdir(self.backup_dir)
+
+        self.storage = Storage(os.path.join(self.tmp_dir.name, STORAGE_NAME))
+        self.storage.init()
+        self.addCleanup(self.storage.close)
+
+        self.service = BackupService(settings=None, storage=self.storage)
+
+    def _files(self):
+        result = {}
+        for root, _dirs, files in os.walk(self.backup_dir):
+            for name in files:
+                if name != BackupService.MANIFEST_NAME:
+                    file_path = os.path.join(root, name)
+                    with open(file_path, encoding='utf-8') as _file:
+                        result[os.path.relpath(file_path, self.backup_dir)] = _file.read()
+        return result
+
+    def test_incremental_backup(self):
+        self.storage.add_folder('Folder')
+        first_id = self.storage.add(Document('First', 'First content', '/'))
+        second_id = self.storage.add(Document('Second', 'Second content', '/Folder'))
+        self.storage.add(Document('Second', 'Same title', '/Folder'))
+
+        self.assertEqual(self.service.save(self.backup_dir), self.backup_dir)
+        self.assertEqual(self._files(), {
+            'First.md': 'First content',
+            'Folder/Second.md': 'Second content',
+            'Folder/Second (2).md': 'Same title',
+        })
+
+        # Unchanged documents are not rewritten
+        mtime = os.stat(os.path.join(self.backup_dir, 'First.md')).st_mtime_ns
+        self.storage.update(second_id, {'content': 'Changed'})
+        self.service.save(self.backup_dir)
+        self.assertEqual(os.stat(os.path.join(self.backup_dir, 'First.md')).st_mtime_ns, mtime)
+        self.assertEqual(self._files()['Folder/Second.md'], 'Changed')
+
+        # Moved, archived and deleted documents
+        self.storage.move(first_id, '/Folder')
+        self.storage.update(second_id, {'archived': True})
+        self.storage.delete(second_id + 1)
+        self.service.save(self.backup_dir)
+        self.assertEqual(self._files(), {
+            'Folder/First.md': 'First content',
+            'Folder/Second-archived.md': 'Changed',
+        })
+
+        with open(os.path.join(self.backup_dir, BackupService.MANIFEST_NAME)) as manifest_file:
+            manifest = json.load(manifest_file)
+        self.assertEqual(sorted(manifest['documents']), sorted([str(first_id), str(second_id)]))
+
+    def test_swapped_titles(self):
+        first_id = self.storage.add(Document('A', 'Content A', '/'))
+        second_id = self.storage.add(Document('B', 'Content B', '/'))
+        self.service.save(self.backup_dir)
+
+        self.storage.update(first_id, {'title': 'B'})
+        self.storage.update(second_id, {'title': 'A'})
+        self.service.save(self.backup_dir)
+
+        self.assertEqual(self._files(), {'B.md': 'Content A', 'A.md': 'Content B'})
+
+    def test_missing_file_is_restored(self):
+        self.storage.add(Document('Note', 'Content', '/'))
+        self.service.save(self.backup_dir)
+
+        os.remove(os.path.join(self.backup_dir, 'Note.md'))
+        self.service.save(self.backup_dir)
+        self.assertEqual(self._files(), {'Note.md': 'Content'})
@@ -0,0 +1,65 @@
+import os.path
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from unittest import TestCase, skipIf
+
+from gi.repository import GLib
+
+from norka.define import STORAGE_NAME
+from norka.models.document import Document
+from norka.services.storage import Storage
+
+try:
+    from norka.widgets.document_grid import DocumentGrid
+except ImportError:
+    DocumentGrid = None
+
+
+@skipIf(DocumentGrid is None, 'Gtk is not available')
+class DocumentRowTests(TestCase):
+
+    def setUp(self) -> None:
+        self.storage = Storage(os.path.join('test-grid-' + STORAGE_NAME))
+        self.storage.init()
+        self.storage.add(Document('Test Document', "# Simple test content"))
+
+    def tearDown(self) -> None:
+        self.storage.close()
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(self.storage.file_path + suffix):
+                os.remove(self.storage.file_path + suffix)
+
+    def test_document_row(self):
+        record = next(iter(self.storage.iter_documents(path='/')))
+        grid = SimpleNamespace(thumbnails=SimpleNamespace(peek=lambda *args: None), placeholder_icon=None)
+
+        row = DocumentGrid.document_row(grid, record)
+        self.assertEqual(row[1:4], ['Test Document', record.excerpt, record.document_id])
+        self.assertIn('Created', row[4])
+        self.assertIn('Modified', row[4])
+
+
+@skipIf(DocumentGrid is None, 'Gtk is not available')
+class ScheduleThumbnailsTests(TestCase):
+
+    def test_batches_keep_their_rows(self):
+        batches = [[(1, 'first', 'row 1'), (2, 'second', 'row 2')], [(3, 'third', 'row 3')]]
+        rendered = []
+        executor = ThreadPoolExecutor(max_workers=2)
+        self.addCleanup(executor.shutdown)
+
+        grid = SimpleNamespace(THUMBNAILS_WORKERS=2, rendering_batches=0, thumbnails_generation=0,
+                               thumbnails_executor=executor,
+                               next_thumbnails_batch=lambda: batches.pop(0) if batches else [],
+                               render_thumbnails=lambda batch: [(doc_id, excerpt, None) for doc_id, excerpt in batch])
+        grid.on_thumbnails_done = lambda *args: DocumentGrid.on_thumbnails_done(grid, *args)
+        grid.on_thumbnails_rendered = lambda generation, row_refs, future: rendered.append((row_refs, future.result()))
+
+        DocumentGrid.schedule_thumbnails(grid)
+        executor.shutdown(wait=True)
+        while GLib.MainContext.default().iteration(False):
+            pass
+
+        self.assertEqual(len(rendered), 2)
+        for row_refs, results in rendered:
+            self.assertEqual(set(row_refs), {doc_id for doc_id, _excerpt, _pixbuf in results})
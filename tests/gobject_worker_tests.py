@@ -0,0 +1,104 @@
+import threading
+from unittest import TestCase
+
+from gi.repository import GLib
+
+from norka.gobject_worker import WorkerPool, Task, PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE
+
+
+class WorkerPoolTests(TestCase):
+
+    def setUp(self) -> None:
+        self.pool = WorkerPool(max_workers=2)
+        self.addCleanup(self.pool.shutdown)
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.order = []
+
+    def _block(self, name):
+        self.started.set()
+        self.release.wait(5)
+        self.order.append(name)
+        return name
+
+    def _record(self, name):
+        self.order.append(name)
+        return name
+
+    @staticmethod
+    def _dispatch():
+        """Runs callbacks queued to the main loop by finished tasks."""
+        while GLib.MainContext.default().iteration(False):
+            pass
+
+    def test_callback(self):
+        results = []
+        task = self.pool.submit(sum, ((1, 2, 3),), callback=results.append)
+
+        self.assertEqual(task.result(5), 6)
+        self._dispatch()
+        self.assertEqual(results, [6])
+        self.assertEqual(self.pool.metrics['sum'].calls, 1)
+
+    def test_errorback(self):
+        errors = []
+        task = self.pool.submit(int, ('nan',), errorback=errors.append)
+
+        with self.assertRaises(ValueError):
+            task.result(5)
+        self._dispatch()
+        self.assertIsInstance(errors[0], ValueError)
+        self.assertTrue(errors[0].traceback)
+        self.assertEqual(self.pool.metrics['int'].failed, 1)
+
+    def test_priorities(self):
+        background = self.pool.submit(self._block, ('background',), priority=PRIORITY_BACKGROUND)
+        self.started.wait(5)
+        queued = self.pool.submit(self._record, ('queued',), priority=PRIORITY_BACKGROUND)
+        interactive = self.pool.submit(self._record, ('interactive',), priority=PRIORITY_INTERACTIVE)
+
+        # The last free worker is kept for non-background tasks
+        self.assertEqual(interactive.result(5), 'interactive')
+        self.assertEqual(queued.state, Task.PENDING)
+
+        self.release.set()
+        background.result(5)
+        queued.result(5)
+        self.assertEqual(self.order, ['interactive', 'background', 'queued'])
+
+    def test_default_workers(self):
+        pool = WorkerPool()
+        self.addCleanup(pool.shutdown)
+        # One worker is always left for interactive tasks, even on single CPU machines
+        self.assertGreaterEqual(pool.max_workers, 2)
+
+    def test_cancel(self):
+        blockers = [self.pool.submit(self._block, (i,)) for i in range(2)]
+        task = self.pool.submit(self._record, ('cancelled',))
+
+        self.assertTrue(task.cancel())
+        self.assertTrue(task.cancelled())
+        self.assertFalse(blockers[0].cancel())
+
+        self.release.set()
+        for blocker in blockers:
+            blocker.result(5)
+        self.assertNotIn('cancelled', self.order)
+        self.assertEqual(self.pool.metrics['WorkerPoolTests._record'].cancelled, 1)
+
+    def test_dedup(self):
+        results = []
+        first = self.pool.submit(self._block, ('same',), callback=results.append)
+        second = self.pool.submit(self._block, ('same',), callback=results.append)
+        other = self.pool.submit(self._block, ('same',), callback=results.append, dedup=False)
+
+        self.assertIs(first, second)
+        self.assertIsNot(first, other)
+        self.assertEqual(len(self.pool.tasks), 2)
+
+        self.release.set()
+        first.result(5)
+        other.result(5)
+        self._dispatch()
+        self.assertEqual(results, ['same'] * 3)
+        self.assertEqual(self.order, ['same'] * 2)
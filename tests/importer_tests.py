@@ -0,0 +1,148 @@
+import io
+import os
+import tarfile
+import tempfile
+import zipfile
+from unittest import TestCase
+
+from gi.repository import GLib
+
+from norka.define import STORAGE_NAME
+from norka.services.importer import Importer
+from norka.services.storage import Storage
+
+
+class ImporterTests(TestCase):
+
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+
+        self.storage = Storage(os.path.join(self.tmp_dir.name, STORAGE_NAME))
+        self.storage.init()
+        self.addCleanup(self.storage.close)
+
+        self.importer = Importer(self.storage, workers=2)
+
+    def _write(self, relative_path: str, data: bytes) -> str:
+        file_path = os.path.join(self.tmp_dir.name, relative_path)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        with open(file_path, 'wb') as _file:
+            _file.write(data)
+        return file_path
+
+    def _titles(self, path: str):
+        return sorted(doc.title for doc in self.storage.iter_documents(path=path))
+
+    def test_import_directory(self):
+        self._write('notes/first.md', b'# First')
+        self._write('notes/sub/second.txt', 'Second – note'.encode('utf-8'))
+        self._write('notes/sub/deeper/third.md', 'Caf\xe9'.encode('latin-1'))
+        self._write('notes/sub/image.png', b'\x89PNG')
+        self._write('notes/.hidden.md', b'hidden')
+
+        result = self.importer.run([os.path.join(self.tmp_dir.name, 'notes')])
+
+        self.assertEqual((result.documents, result.folders, result.failed), (3, 3, 0))
+        self.assertEqual(self._titles('/notes'), ['first'])
+        self.assertEqual(self._titles('/notes/sub'), ['second'])
+        self.assertEqual(self._titles('/notes/sub/deeper'), ['third'])
+
+        doc = next(self.storage.iter_documents(path='/notes/sub/deeper', with_content=True))
+        self.assertEqual(doc.content, 'Caf\xe9')
+
+        # Existing folders are reused
+        result = self.importer.run([os.path.join(self.tmp_dir.name, 'notes')], path='/')
+        self.assertEqual((result.documents, result.folders), (3, 0))
+        self.assertEqual(self._titles('/notes'), ['first', 'first'])
+
+    def test_import_in_chunks(self):
+        for i in range(5):
+            self._write(f'chunks/{i}/note.md', f'Note {i}'.encode('utf-8'))
+        self.importer.CHUNK_SIZE = 2
+
+        result = self.importer.run([os.path.join(self.tmp_dir.name, 'chunks')])
+
+        self.assertEqual((result.documents, result.folders, result.failed), (5, 6, 0))
+        self.assertEqual(self._titles(None), ['note'] * 5)
+
+    def test_failed_import_refreshes_storage(self):
+        class FailingImporter(Importer):
+            @classmethod
+            def _decode(cls, item):
+                if item.title == 'broken':
+                    raise RuntimeError('Read failed')
+                return super()._decode(item)
+
+        self._write('failing/a/first.md', b'first')
+        self._write('failing/b/broken.md', b'broken')
+        changes = []
+        self.storage.connect('bulk-changed', lambda storage: changes.append(storage))
+        importer = FailingImporter(self.storage, workers=1)
+        importer.CHUNK_SIZE = 1
+        # Load the folder tree, so it has to be refreshed after the import
+        self.assertIsNone(self.storage.folder_tree.get('/failing/a'))
+
+        with self.assertRaises(RuntimeError):
+            importer.run([os.path.join(self.tmp_dir.name, 'failing')])
+        while GLib.MainContext.default().iteration(False):
+            pass
+
+        # The chunk committed before the failure is kept and announced
+        self.assertEqual(len(changes), 1)
+        self.assertEqual(self._titles('/failing/a'), ['first'])
+        self.assertIsNotNone(self.storage.folder_tree.get('/failing/a'))
+
+    def test_ensure_existing_folders(self):
+        storage = Storage(self.storage.file_path)
+        storage.open()
+        self.addCleanup(storage.conn.close)
+        self.assertIsNone(storage.folder_tree.get('/notes'))
+
+        # Created by another connection after the import loaded its folder tree
+        self.storage.add_folder('notes')
+
+        self.assertEqual(Importer._ensure_folders(storage, '/', ('notes', 'sub')), ('/notes/sub', 1))
+        self.assertIsNotNone(storage.folder_tree.get('/notes/sub'))
+
+    def test_import_glob(self):
+        self._write('glob/a/one.md', b'one')
+        self._write('glob/b/two.md', b'two')
+        self._write('glob/b/three.txt', b'three')
+
+        result = self.importer.run([os.path.join(self.tmp_dir.name, 'glob', '**', '*.md')])
+
+        self.assertEqual(result.documents, 2)
+        self.assertEqual(self._titles('/a'), ['one'])
+        self.assertEqual(self._titles('/b'), ['two'])
+
+    def test_import_archives(self):
+        zip_path = os.path.join(self.tmp_dir.name, 'zipped.zip')
+        with zipfile.ZipFile(zip_path, 'w') as archive:
+            archive.writestr('root.md', '# Root')
+            archive.writestr('folder/nested.md', '# Nested')
+
+        tar_path = os.path.join(self.tmp_dir.name, 'packed.tar.gz')
+        with tarfile.open(tar_path, 'w:gz') as archive:
+            data = b'# Packed'
+            info = tarfile.TarInfo('dir/packed.md')
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+
+        result = self.importer.run([zip_path, tar_path], path='/')
+
+        self.assertEqual(result.documents, 3)
+        self.assertEqual(self._titles('/zipped'), ['root'])
+        self.assertEqual(self._titles('/zipped/folder'), ['nested'])
+        self.assertEqual(self._titles('/packed/dir'), ['packed'])
+
+    def test_decode(self):
+        self.assertEqual(Importer.decode('Привет'.encode('utf-8')), 'Привет')
+        self.assertEqual(Importer.decode('﻿BOM'.encode('utf-8')), 'BOM')
+        self.assertEqual(Importer.decode('Wide'.encode('utf-16')), 'Wide')
+        self.assertEqual(Importer.decode(b'Caf\xe9'), 'Caf\xe9')
+
+    def test_is_bulk_source(self):
+        self.assertTrue(Importer.is_bulk_source(self.tmp_dir.name))
+        self.assertTrue(Importer.is_bulk_source('/notes/*.md'))
+        self.assertFalse(Importer.is_bulk_source(self._write('single.md', b'')))
@@ -0,0 +1,83 @@
+import os
+from unittest import TestCase
+
+from gi.repository import GLib
+
+from norka.define import STORAGE_NAME
+from norka.gobject_worker import GObjectWorker
+from norka.models.document import Document
+from norka.services.library_stats import LibraryStats
+from norka.services.storage import Storage
+
+
+class LibraryStatsTests(TestCase):
+
+    def setUp(self) -> None:
+        self.storage = Storage('test-stats-' + STORAGE_NAME)
+        self.storage.init()
+
+        self.short_id = self.storage.add(Document('Short', 'One two three.'))
+        self.long_id = self.storage.add(Document('Long', '# Title\n\n' + 'Word ' * 100, '/notes'))
+        self.nested_id = self.storage.add(Document('Nested', '**Four** five six seven.', '/notes/old'))
+
+        self.changes = 0
+        self.library_stats = LibraryStats(self.storage)
+        self.library_stats.connect('changed', self._on_changed)
+
+    def tearDown(self) -> None:
+        self._wait()
+        self.storage.close()
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(self.storage.file_path + suffix):
+                os.remove(self.storage.file_path + suffix)
+
+    def _on_changed(self, library_stats):
+        self.changes += 1
+
+    def _wait(self):
+        """Waits for background counts and runs their callbacks queued to the main loop."""
+        dispatched = True
+        while dispatched:
+            for task in GObjectWorker.pool().tasks:
+                task.result(10)
+            # Callbacks may start new tasks, so wait again until nothing is dispatched
+            dispatched = False
+            while GLib.MainContext.default().iteration(False):
+                dispatched = True
+
+    def test_refresh(self):
+        self.library_stats.refresh()
+        self._wait()
+
+        self.assertEqual(self.changes, 1)
+        self.assertEqual(self.library_stats.document(self.short_id), (14, 3, 1, 1))
+        self.assertEqual(self.library_stats.document(self.long_id)[1], 101)
+
+        # Unchanged documents are not counted again
+        self.assertEqual(self.library_stats.count(), [])
+
+    def test_aggregates(self):
+        self.library_stats.refresh()
+        self._wait()
+
+        self.assertEqual(self.library_stats.words(), 108)
+        self.assertEqual(self.library_stats.words('/notes'), 105)
+        self.assertEqual(self.library_stats.words('/notes/old'), 4)
+        self.assertEqual([(folder.path, folder.words) for folder in self.library_stats.folders()],
+                         [('/', 3), ('/notes', 101), ('/notes/old', 4)])
+
+        longest = self.library_stats.longest(limit=2)
+        self.assertEqual([document.title for document in longest], ['Long', 'Nested'])
+        self.assertEqual(longest[0].read_time, (0, 0, 30))
+
+    def test_update_and_delete(self):
+        self.library_stats.refresh()
+        self._wait()
+
+        self.storage.update(self.short_id, {'content': 'Now there are five words.'})
+        self._wait()
+        self.assertEqual(self.library_stats.document(self.short_id)[1], 5)
+
+        self.storage.delete(self.short_id)
+        self.assertIsNone(self.library_stats.document(self.short_id))
+        self.assertEqual(self.library_stats.words(), 105)
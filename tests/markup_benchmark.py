@@ -0,0 +1,57 @@
+"""Micro-benchmark comparing markup stripping with sequential regex passes and the single-pass tokenizer.
+
+Inputs double in size, so time of a linear algorithm doubles as well. Run from the project root::
+
+    python -m tests.markup_benchmark [max_size]
+"""
+import re
+import sys
+import timeit
+
+from norka import markup_tokenizer
+from norka.markup_regex import (
+    ITALIC_ASTERISK, ITALIC_UNDERSCORE, BOLD_ITALIC, BOLD, STRIKETHROUGH, IMAGE, LINK, LINK_ALT,
+    HORIZONTAL_RULE, LIST, MATH, TABLE, CODE_BLOCK, HEADER_UNDER, HEADER, BLOCK_QUOTE, ORDERED_LIST, FOOTNOTE_ID,
+    FOOTNOTE
+)
+
+# Patterns and their order as they were applied by the stats counter before the tokenizer
+REGEXP_REPLACE = (
+    BOLD_ITALIC, ITALIC_ASTERISK, ITALIC_UNDERSCORE, BOLD, STRIKETHROUGH, IMAGE, LINK, LINK_ALT, LIST, ORDERED_LIST,
+    BLOCK_QUOTE, HEADER, HEADER_UNDER, CODE_BLOCK, TABLE, MATH, FOOTNOTE_ID, FOOTNOTE
+)
+
+INPUTS = {
+    'prose': lambda size: ('Some **bold** and *italic* text with a [link](http://example.com). ' * size)[:size],
+    'brackets': lambda size: ('[' * (size // 2)) + ('](' * (size // 4)),
+    'asterisks': lambda size: '*a ' * (size // 3),
+    'backticks': lambda size: '`a ' * (size // 3),
+}
+
+
+def strip_regexp(text: str) -> str:
+    for regexp in REGEXP_REPLACE:
+        text = re.sub(regexp, r"\g<text>", text)
+    return re.sub(HORIZONTAL_RULE, "", text)
+
+
+def main(max_size: int = 64000, regexp_limit: float = 1.0) -> None:
+    for name, make_input in INPUTS.items():
+        print(name)
+        slow = False
+        size = 500
+        while size <= max_size:
+            text = make_input(size)
+            tokenizer = min(timeit.repeat(lambda: markup_tokenizer.strip_markup(text), number=1, repeat=3))
+            line = f'{size:>10} chars  tokenizer: {tokenizer * 1000:9.2f}ms'
+            if not slow:
+                regexp = timeit.timeit(lambda: strip_regexp(text), number=1)
+                line += f'  regexp: {regexp * 1000:9.2f}ms'
+                # Skip larger inputs once sequential passes get too slow to wait for
+                slow = regexp > regexp_limit
+            print(line)
+            size *= 2
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 64000)
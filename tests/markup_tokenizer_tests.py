@@ -0,0 +1,46 @@
+import time
+from unittest import TestCase
+
+from norka.markup_tokenizer import strip_markup, count
+
+
+class MarkupTokenizerTests(TestCase):
+
+    def test_inline(self):
+        self.assertEqual(strip_markup('Some **bold**, *italic*, _under_ and ~~gone~~ text.'),
+                         'Some bold, italic, under and gone text.')
+        self.assertEqual(strip_markup('A [link](http://example.com "Title") and ![alt](image.png).'),
+                         'A link and alt.')
+        self.assertEqual(strip_markup('<https://example.com> and `code *stays*`'),
+                         'https://example.com and code *stays*')
+        self.assertEqual(strip_markup('snake_case_name, 2 * 3 and \\*escaped\\*'),
+                         'snake_case_name, 2 * 3 and *escaped*')
+        self.assertEqual(strip_markup('Note[^1] and [plain] text'), 'Note and [plain] text')
+
+    def test_blocks(self):
+        text = '# Header #\n\n> Quote\n- item\n1. first\n- [x] done\n\nSetext\n---\n\n***\n\n[^1]: Note.'
+        self.assertEqual(strip_markup(text), 'Header\n\nQuote\nitem\nfirst\ndone\n\nSetext\n\n\n\n\nNote.')
+
+    def test_fenced_code(self):
+        text = 'Before\n```python\n# not a header\n**not bold**\n```\nAfter'
+        self.assertEqual(strip_markup(text), 'Before\n\n# not a header\n**not bold**\n\nAfter')
+
+    def test_table(self):
+        text = 'Intro\n\n|a|b|\n|---|---|\n|c|d|\n\nEnd.'
+        self.assertEqual(strip_markup(text), 'Intro\n\n|a|b|\n|c|d|\n\nEnd.')
+        # The table is a single paragraph
+        self.assertEqual(count(text)[3], 3)
+
+    def test_unbalanced(self):
+        self.assertEqual(strip_markup('[[a] **b `c'), '[[a] **b `c')
+        self.assertEqual(strip_markup(''), '')
+
+    def test_count(self):
+        self.assertEqual(count('# Title\n\nFirst **sentence**. Second [one](url)!'), (32, 5, 3, 2))
+
+    def test_linear_time(self):
+        # Such input takes minutes with backtracking regexps
+        text = '[' * 50000 + '](' * 25000
+        started = time.monotonic()
+        self.assertEqual(strip_markup(text), text)
+        self.assertLess(time.monotonic() - started, 2.0)
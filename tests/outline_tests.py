@@ -0,0 +1,111 @@
+import random
+from unittest import TestCase
+
+from norka.services.outline import Outline, Heading
+
+TEXT = """# Title
+
+Intro paragraph.
+
+## Section one
+
+Text.
+
+Setext heading
+==============
+
+```python
+# not a heading
+```
+
+Another one
+-----------
+
+### Deep #
+"""
+
+
+class OutlineTests(TestCase):
+
+    def setUp(self) -> None:
+        self.text = TEXT
+        self.outline = Outline()
+        self.outline.reset(self.text)
+
+    def _replace(self, start: int, end: int, new_text: str) -> None:
+        """Applies the edit the way buffer signals report it and rescans dirty lines.
+        """
+        line = self.text.count('\n', 0, start)
+        removed = self.text.count('\n', start, end)
+        self.outline.replace_lines(line, removed, new_text.count('\n'))
+        self.text = self.text[:start] + new_text + self.text[end:]
+
+    def _rescan(self):
+        lines = self.text.split('\n')
+        self.outline.rescan(lines.__getitem__, len(lines))
+
+    def _assert_consistent(self):
+        expected = Outline()
+        expected.reset(self.text)
+        self.assertEqual(self.outline.headings, expected.headings)
+
+    def test_headings(self):
+        self.assertEqual(self.outline.headings, [
+            Heading(0, 1, 'Title'),
+            Heading(4, 2, 'Section one'),
+            Heading(8, 1, 'Setext heading'),
+            Heading(15, 2, 'Another one'),
+            Heading(18, 3, 'Deep'),
+        ])
+
+    def test_typing(self):
+        offset = self.text.index('Text.')
+        for i, char in enumerate('# New\n\n'):
+            self._replace(offset + i, offset + i, char)
+            self._rescan()
+        self.assertIn(Heading(6, 1, 'New'), self.outline.headings)
+        self._assert_consistent()
+
+    def test_code_fence(self):
+        offset = self.text.index('```\n\nAnother')
+        self._replace(offset, offset + 4, '')
+        self._rescan()
+        # Everything after the unclosed fence is code now
+        self.assertEqual([heading.title for heading in self.outline.headings],
+                         ['Title', 'Section one', 'Setext heading'])
+        self._assert_consistent()
+
+    def test_setext_underline(self):
+        offset = self.text.index('==============')
+        self._replace(offset, offset + 14, 'plain text')
+        self._rescan()
+        self.assertNotIn('Setext heading', [heading.title for heading in self.outline.headings])
+        self._assert_consistent()
+
+    def test_several_edits_before_rescan(self):
+        self._replace(0, 0, 'Prelude\n\n')
+        offset = self.text.index('Another one')
+        self._replace(offset, offset + 7, 'Other')
+        self._replace(len(self.text), len(self.text), '\n# End')
+        self._rescan()
+        self._assert_consistent()
+
+    def test_random_edits(self):
+        rnd = random.Random(42)
+        pieces = ['\n', '\n\n', '# H', '## Sub\n', 'text', '===', '---', '```', ' ', 'word\n']
+        for _ in range(300):
+            start = rnd.randint(0, len(self.text))
+            end = min(len(self.text), start + rnd.choice((0, 0, 1, 3, 12)))
+            self._replace(start, end, rnd.choice(pieces))
+            if rnd.random() < 0.7:
+                self._rescan()
+                self._assert_consistent()
+
+    def test_navigation(self):
+        self.assertEqual(self.outline.section_at(0), 0)
+        self.assertEqual(self.outline.section_at(7), 1)
+        self.assertEqual(self.outline.section_at(100), 4)
+        self.assertEqual(self.outline.next_heading(4).line, 8)
+        self.assertEqual(self.outline.previous_heading(4).line, 0)
+        self.assertIsNone(self.outline.previous_heading(0))
+        self.assertIsNone(self.outline.next_heading(18))
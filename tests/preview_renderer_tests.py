@@ -0,0 +1,83 @@
+from unittest import TestCase
+
+from norka.services.preview_renderer import PreviewRenderer
+
+TEXT = """# Title
+
+First paragraph
+continues here.
+
+- one
+- two
+
+- three
+  with continuation
+
+    indented code
+
+```python
+def foo():
+
+    pass
+```
+
+Last paragraph."""
+
+
+class PreviewRendererTests(TestCase):
+
+    def setUp(self) -> None:
+        self.rendered = []
+        self.renderer = PreviewRenderer(self._render)
+
+    def _render(self, block: str) -> str:
+        self.rendered.append(block)
+        return f'<p>{block}</p>'
+
+    def test_split(self):
+        blocks = PreviewRenderer.split(TEXT)
+
+        self.assertEqual(len(blocks), 5)
+        self.assertEqual(blocks[0], '# Title')
+        self.assertTrue(blocks[2].startswith('- one'))
+        self.assertTrue(blocks[2].endswith('    indented code'))
+        self.assertIn('\n\n    pass', blocks[3])
+        self.assertEqual(blocks[4], 'Last paragraph.')
+
+    def test_split_references(self):
+        text = 'See [docs][1].\n\nMore text.\n\n[1]: https://example.com'
+        self.assertEqual(PreviewRenderer.split(text), [text])
+        self.assertEqual(PreviewRenderer.split('\n\n'), [])
+
+    def test_cache(self):
+        self.renderer.render(TEXT, self.renderer.next_generation())
+        self.assertEqual(len(self.rendered), 5)
+
+        result = self.renderer.render(TEXT.replace('Last', 'Final'), self.renderer.next_generation())
+        self.assertEqual(len(self.rendered), 6)
+        self.assertEqual(result.blocks[-1][1], '<p>Final paragraph.</p>')
+
+    def test_stale_render(self):
+        generation = self.renderer.next_generation()
+        self.renderer.next_generation()
+
+        self.assertIsNone(self.renderer.render(TEXT, generation))
+        self.assertEqual(self.rendered, [])
+
+    def test_patch(self):
+        result = self.renderer.render(TEXT, self.renderer.next_generation())
+        self.renderer.reset(result.blocks)
+
+        text = TEXT.replace('First paragraph', 'Changed paragraph')
+        result = self.renderer.render(text, self.renderer.next_generation())
+        self.assertEqual(self.renderer.patch(result.blocks), (1, 1, ['<p>Changed paragraph\ncontinues here.</p>']))
+
+        text = text.replace('# Title\n\n', '# Title\n\nNew paragraph\n\n')
+        result = self.renderer.render(text, self.renderer.next_generation())
+        self.assertEqual(self.renderer.patch(result.blocks), (1, 0, ['<p>New paragraph</p>']))
+
+        result = self.renderer.render(text, self.renderer.next_generation())
+        self.assertEqual(self.renderer.patch(result.blocks), (6, 0, []))
+
+        result = self.renderer.render('', self.renderer.next_generation())
+        self.assertEqual(self.renderer.patch(result.blocks), (0, 6, []))
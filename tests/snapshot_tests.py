@@ -0,0 +1,83 @@
+import gzip
+import os
+import sqlite3
+import tempfile
+from datetime import datetime, timedelta
+from unittest import TestCase
+
+from norka.define import STORAGE_NAME
+from norka.models.document import Document
+from norka.services.snapshot import SnapshotService
+from norka.services.storage import Storage
+
+
+class SnapshotServiceTests(TestCase):
+
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+
+        self.storage = Storage(os.path.join(self.tmp_dir.name, STORAGE_NAME))
+        self.storage.init()
+        self.addCleanup(self.storage.close)
+
+        self.service = SnapshotService(self.storage, os.path.join(self.tmp_dir.name, 'snapshots'),
+                                       compression='gzip', keep_daily=3, keep_weekly=2)
+
+    def test_create_and_restore(self):
+        doc_id = self.storage.add(Document('Note', 'Original', '/'))
+        progress = []
+
+        snapshot_path = self.service.create(progress=lambda remaining, total: progress.append(remaining))
+
+        self.assertTrue(snapshot_path.endswith('.db.gz'))
+        self.assertEqual(progress[-1], 0)
+        self.service.verify(snapshot_path)
+
+        self.storage.update(doc_id, {'content': 'Changed'})
+        self.storage.add(Document('Another', 'Content', '/'))
+
+        self.service.restore(snapshot_path)
+
+        self.assertEqual(self.storage.get(doc_id).content, 'Original')
+        self.assertEqual(self.storage.count_documents('/'), 1)
+
+    def test_snapshots_in_same_second(self):
+        os.makedirs(self.service.snapshot_dir)
+        created = datetime(2021, 3, 31, 12)
+
+        first = self.service._snapshot_path(created)
+        open(first, 'wb').close()
+        second = self.service._snapshot_path(created)
+        open(second, 'wb').close()
+
+        self.assertEqual(os.path.basename(second), 'norka-20210331-120000-1.db.gz')
+        self.assertEqual([snapshot.path for snapshot in self.service.list()], [second, first])
+
+    def test_damaged_snapshot(self):
+        snapshot_path = os.path.join(self.tmp_dir.name, 'norka-20200101-000000.db.gz')
+        with gzip.open(snapshot_path, 'wb') as snapshot:
+            snapshot.write(b'SQLite format 3\x00' + b'\x00' * 1000)
+
+        with self.assertRaises(sqlite3.DatabaseError):
+            self.service.restore(snapshot_path)
+
+    def test_rotate(self):
+        os.makedirs(self.service.snapshot_dir)
+        now = datetime(2021, 3, 31, 12)
+        names = []
+        for hours in range(0, 24 * 30, 12):
+            created = now - timedelta(hours=hours)
+            name = f'norka-{created.strftime(SnapshotService.TIME_FORMAT)}.db.gz'
+            open(os.path.join(self.service.snapshot_dir, name), 'wb').close()
+            names.append(name)
+
+        self.service.rotate()
+
+        kept = sorted(os.path.basename(snapshot.path) for snapshot in self.service.list())
+        self.assertEqual(kept, sorted([
+            'norka-20210331-120000.db.gz',  # daily
+            'norka-20210330-120000.db.gz',  # daily
+            'norka-20210329-120000.db.gz',  # daily, also the newest of its week
+            'norka-20210328-120000.db.gz',  # weekly
+        ]))
@@ -0,0 +1,121 @@
+from unittest import TestCase
+
+from norka.services.stats_counter import StatsCounter
+from norka.services.text_blocks import TextBlocks
+
+TEXT = """# Header
+
+First paragraph with **bold** text. And a second sentence!
+It continues on the next line.
+
+
+* list item
+* another [link](https://example.com) item
+
+Last paragraph, no trailing newline"""
+
+
+class TextBlocksTests(TestCase):
+
+    def setUp(self) -> None:
+        self.text = ''
+        self.blocks = TextBlocks()
+        self._replace(0, 0, TEXT)
+
+    def _line(self, offset: int) -> int:
+        return self.text.count('\n', 0, offset)
+
+    def _replace(self, start: int, end: int, new_text: str) -> None:
+        """Emulates buffer delete and insert signals followed by the changed one."""
+        if end > start:
+            self.blocks.replace_lines(self._line(start), self.text.count('\n', start, end), 0)
+        self.text = self.text[:start] + self.text[end:]
+        if new_text:
+            self.blocks.replace_lines(self._line(start), 0, new_text.count('\n'))
+        self.text = self.text[:start] + new_text + self.text[start:]
+
+        lines = self.text.split('\n')
+        for index, start_line, line_count in reversed(self.blocks.dirty()):
+            self.blocks.resolve(index, '\n'.join(lines[start_line:start_line + line_count]))
+
+    def _assert_consistent(self):
+        self.assertEqual(list(self.blocks.keys), [hash(block) for block in TextBlocks.split(self.text)])
+        self.assertEqual(sum(line_count for line_count, _ in self.blocks.blocks), self.text.count('\n') + 1)
+
+    def test_split(self):
+        self.assertEqual(TextBlocks.split('a\nb\n\n\nc\n'), ['a\nb\n\n', 'c\n'])
+        self.assertEqual(TextBlocks.split('\n\na'), ['\n', 'a'])
+
+    def test_initial(self):
+        self.assertEqual(len(self.blocks), 4)
+        self._assert_consistent()
+
+    def test_typing(self):
+        offset = self.text.index('It continues')
+        for i, char in enumerate('New words. '):
+            self._replace(offset + i, offset + i, char)
+            self.assertEqual(len(self.blocks.dirty()), 0)
+        self._assert_consistent()
+
+    def test_split_and_merge_paragraphs(self):
+        offset = self.text.index('It continues')
+        self._replace(offset, offset, '\n\n')
+        self.assertEqual(len(self.blocks), 5)
+        self._assert_consistent()
+
+        self._replace(offset, offset + 2, '')
+        self.assertEqual(len(self.blocks), 4)
+        self._assert_consistent()
+
+        start = self.text.index('\n\n\n* list')
+        self._replace(start, start + 3, ' ')
+        self.assertEqual(len(self.blocks), 3)
+        self._assert_consistent()
+
+    def test_replace_everything(self):
+        self._replace(0, len(self.text), 'Short text.')
+        self.assertEqual(len(self.blocks), 1)
+        self._assert_consistent()
+
+    def test_reset(self):
+        # Edits are not tracked while a document is loaded in chunks
+        self.text += '\n\nLoaded later.'
+        self.blocks.reset(self.text.count('\n') + 1)
+        self.assertEqual(len(self.blocks.dirty()), 1)
+
+        self._replace(0, 0, '')
+        self._assert_consistent()
+
+
+class StatsCounterTests(TestCase):
+
+    def test_blocks_sum_matches_full_count(self):
+        blocks = [StatsCounter.count_text(block) for block in TextBlocks.split(TEXT)]
+        self.assertEqual(tuple(map(sum, zip(*blocks))), StatsCounter.count_text(TEXT))
+
+    def test_read_time(self):
+        self.assertEqual(StatsCounter.read_time(0), (0, 0, 0))
+        self.assertEqual(StatsCounter.read_time(300), (0, 1, 30))
+        self.assertEqual(StatsCounter.read_time(12000), (1, 0, 0))
+
+    def test_shared_memory_transport(self):
+        results = []
+        counter = StatsCounter(None)
+        counter.SHARED_MEMORY_THRESHOLD = 0
+        self.addCleanup(counter.stop)
+
+        def count(blocks):
+            counter.count(blocks)
+            self.assertTrue(counter.parent_conn.poll(10))
+            counter.on_counted(None, None, results.append)
+            return results[-1]
+
+        blocks = dict(enumerate(TextBlocks.split(TEXT + '\n\nÜnïcode — text.')))
+        self.assertEqual(count(blocks), {key: StatsCounter.count_text(text) for key, text in blocks.items()})
+        segment = counter.segment.name
+
+        # Larger text grows the segment and the worker attaches to the new one
+        big = {0: 'Word. ' * (1 << 18)}
+        self.assertEqual(count(big), {0: StatsCounter.count_text(big[0])})
+        self.assertNotEqual(counter.segment.name, segment)
+        self.assertEqual(counter.generation, 2)
@@ -0,0 +1,52 @@
+"""Micro-benchmark comparing bulk document listing with :class:`Document` and :class:`DocumentRecord`.
+
+Run from the project root::
+
+    python -m tests.storage_benchmark [documents_count]
+"""
+import os
+import sys
+import tempfile
+import timeit
+
+from norka.define import STORAGE_NAME
+from norka.models.document import Document
+from norka.services.storage import Storage
+
+
+def populate(storage: Storage, count: int) -> None:
+    """Fills the storage with `count` documents in a single transaction.
+    """
+    content = '# Benchmark document\n\n' + 'Lorem ipsum dolor sit amet. ' * 20
+    with storage.conn:
+        storage.conn.executemany(
+            "INSERT INTO documents (title, content, path, created, modified) "
+            "VALUES (?, ?, '/', datetime('now'), datetime('now'))",
+            ((f'Document {i}', content) for i in range(count)))
+
+
+def list_objects(storage: Storage) -> int:
+    cursor = storage.conn.execute(f"SELECT {Storage.SUMMARY_COLUMNS} FROM documents WHERE path='/' AND archived=0")
+    return len([Document.new_with_summary_row(row) for row in cursor])
+
+
+def list_records(storage: Storage) -> int:
+    return sum(1 for _ in storage.iter_documents(path='/'))
+
+
+def main(count: int = 50000, repeat: int = 3) -> None:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        storage = Storage(os.path.join(tmp_dir, STORAGE_NAME))
+        storage.init()
+        populate(storage, count)
+
+        for name, func in (('Document', list_objects), ('DocumentRecord', list_records)):
+            assert func(storage) == count
+            best = min(timeit.repeat(lambda: func(storage), number=1, repeat=repeat))
+            print(f'{name:>16}: {best:.3f}s for {count} documents ({best / count * 1e6:.2f}µs per row)')
+
+        storage.conn.close()
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50000)
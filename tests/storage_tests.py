@@ -1,6 +1,11 @@
 import os.path
+import sqlite3
+import threading
+from datetime import datetime
 from unittest import TestCase
 
+from gi.repository import GLib
+
 from norka.define import STORAGE_NAME, DB_VERSION
 from norka.models.document import Document
 from norka.models.folder import Folder
@@ -19,7 +24,10 @@ class StorageTests(TestCase):
 
     def tearDown(self) -> None:
         print(f'Unlinking {self.storage.file_path}')
-        os.remove(self.storage.file_path)
+        self.storage.close()
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(self.storage.file_path + suffix):
+                os.remove(self.storage.file_path + suffix)
 
     def _create_document(self, path: str = "/"):
         document = Document('Test Document', "# Simple test content", path)
@@ -103,3 +111,352 @@ class StorageTests(TestCase):
         folder = self.storage.get_folder(folder_id)
         self.assertEqual(folder.title, 'Test Folder')
         self.assertEqual(folder.path, '/')
+
+    def test_search_documents(self):
+        doc_id = self._create_document()
+        self.storage.add(Document('Shopping list', 'Milk and bread'))
+
+        results = self.storage.search('simp')
+        self.assertEqual([result.document_id for result in results], [doc_id])
+
+    def test_search_content_snippet(self):
+        doc_id = self.storage.add(Document('Notes', 'The quick brown fox jumps over the lazy dog'))
+
+        results = self.storage.search('brown fox')
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0].document_id, doc_id)
+        self.assertIn('\x02brown\x03', results[0].snippet)
+
+    def test_search_updated_document(self):
+        doc_id = self._create_document()
+        self.storage.update(doc_id, {'content': 'Completely different text'})
+
+        self.assertEqual(self.storage.search('simple'), [])
+        self.assertEqual(len(self.storage.search('different')), 1)
+
+    def test_search_deleted_document(self):
+        doc_id = self._create_document()
+        self.storage.delete(doc_id)
+
+        self.assertEqual(self.storage.search('simple'), [])
+
+    def test_list_documents_without_content(self):
+        doc_id = self._create_document()
+        self._create_document('/non-root')
+
+        docs = self.storage.list_documents()
+        self.assertEqual([doc.document_id for doc in docs], [doc_id])
+        self.assertIsNone(docs[0].content)
+        self.assertEqual(docs[0].excerpt, "# Simple test content")
+
+    def test_excerpt_follows_content(self):
+        doc_id = self._create_document()
+        self.storage.update(doc_id, {'content': 'x' * 1000})
+
+        doc = self.storage.get_summary(doc_id)
+        self.assertEqual(doc.excerpt, 'x' * Storage.EXCERPT_LENGTH)
+
+    def test_get_content(self):
+        doc_id = self._create_document()
+        self.storage.writer.update(doc_id, {'content': 'x' * 1000})
+        self.storage.flush()
+
+        with self.storage.read_only() as reader:
+            self.assertEqual(reader.get_content(doc_id), 'x' * 1000)
+            self.assertIsNone(reader.get_content(doc_id + 1))
+
+    def test_list_archived(self):
+        self._create_document()
+        doc_id = self._create_document('/non-root')
+        self.storage.update(doc_id, {'archived': True})
+
+        docs = self.storage.list_archived()
+        self.assertEqual([doc.document_id for doc in docs], [doc_id])
+
+    def test_page_documents(self):
+        doc_ids = [self._create_document() for _ in range(5)]
+        self._create_document('/non-root')
+
+        first = self.storage.page_documents(path='/', limit=2)
+        self.assertEqual([doc.document_id for doc in first], doc_ids[:2])
+        self.assertIsNone(first[0].content)
+
+        second = self.storage.page_documents(path='/', after_id=first[-1].document_id, limit=2)
+        self.assertEqual([doc.document_id for doc in second], doc_ids[2:4])
+
+        backwards = self.storage.page_documents(path='/', after_id=doc_ids[2], limit=10, desc=True)
+        self.assertEqual([doc.document_id for doc in backwards], doc_ids[1::-1])
+
+    def test_iter_documents(self):
+        doc_ids = [self._create_document() for _ in range(7)]
+        doc_ids.append(self._create_document('/non-root'))
+        self.storage.update(doc_ids[3], {'archived': True})
+
+        docs = list(self.storage.iter_documents(path='/', batch_size=2))
+        self.assertEqual([doc.document_id for doc in docs], doc_ids[:3] + doc_ids[4:7])
+
+        docs = list(self.storage.iter_documents(path=None, with_archived=True, with_content=True, batch_size=3))
+        self.assertEqual([doc.document_id for doc in docs], doc_ids)
+        self.assertTrue(all(doc.content is not None for doc in docs))
+
+        docs = list(self.storage.iter_documents(path=None, only_archived=True))
+        self.assertEqual([doc.document_id for doc in docs], [doc_ids[3]])
+
+        docs = list(self.storage.iter_documents(path='/', after_id=doc_ids[0], limit=3, batch_size=2))
+        self.assertEqual([doc.document_id for doc in docs], [doc_ids[1], doc_ids[2], doc_ids[4]])
+
+    def test_document_record_to_document(self):
+        doc_id = self._create_document('/non-root')
+
+        record = self.storage.page_documents(path='/non-root', with_content=True)[0]
+        document = record.to_document()
+        self.assertIsInstance(document, Document)
+        self.assertEqual(document.document_id, doc_id)
+        self.assertEqual(document.content, record.content)
+        self.assertEqual(document.absolute_path, '/non-root/Test Document')
+
+    def test_document_record_timestamps(self):
+        self._create_document()
+
+        record = next(iter(self.storage.iter_documents(path='/')))
+        self.assertIsInstance(record.created, str)
+        self.assertIsInstance(record.modified, str)
+        self.assertIsInstance(datetime.fromisoformat(record.created), datetime)
+
+    def test_writer_coalesces_updates(self):
+        doc_id = self._create_document()
+        other_id = self._create_document()
+
+        written = []
+        self.storage.connect('document-updated', lambda storage, updated_id: written.append(updated_id))
+
+        # Hold the writer, so all the updates are queued before it takes them
+        with self.storage.writer._lock:
+            for i in range(10):
+                self.storage.writer.update(doc_id, {'content': f'content {i}'})
+            self.storage.writer.update(doc_id, {'title': 'New title'})
+            self.storage.writer.update(other_id, {'archived': True})
+
+        self.assertTrue(self.storage.writer.flush(timeout=5))
+        self.assertFalse(self.storage.writer.busy)
+        while GLib.MainContext.default().iteration(False):
+            pass
+        # One write per document
+        self.assertEqual(written, [doc_id, other_id])
+
+        doc = self.storage.get(doc_id)
+        self.assertEqual((doc.title, doc.content), ('New title', 'content 9'))
+        self.assertTrue(self.storage.get(other_id).archived)
+
+        self.storage.close()
+        self.assertIsNone(self.storage.conn)
+        self.assertIsNone(self.storage._writer)
+
+    def test_get_applies_queued_updates(self):
+        doc_id = self._create_document()
+
+        with self.storage.writer._lock:
+            self.storage.writer.update(doc_id, {'content': 'Queued', 'title': 'Queued title'})
+            # Nothing is committed while the writer is held, reads must not wait for it
+            self.assertEqual(self.storage.get(doc_id).content, 'Queued')
+            self.assertEqual(self.storage.get_summary(doc_id).title, 'Queued title')
+            self.assertTrue(self.storage.writer.busy)
+
+        self.assertTrue(self.storage.writer.flush(timeout=5))
+        self.assertEqual(self.storage.get(doc_id).content, 'Queued')
+
+    def test_pragmas(self):
+        self.assertEqual(self.storage.conn.execute('PRAGMA journal_mode').fetchone()[0], 'wal')
+        self.assertEqual(self.storage.conn.execute('PRAGMA synchronous').fetchone()[0], 1)
+        self.assertEqual(self.storage.conn.execute('PRAGMA temp_store').fetchone()[0], 2)
+
+    def test_read_only(self):
+        doc_id = self._create_document('/non-root')
+
+        with self.storage.read_only() as reader:
+            # Reads see committed data while the main connection keeps writing
+            self.storage.update(doc_id, {'content': 'Updated'})
+            self.assertEqual(reader.get(doc_id).content, 'Updated')
+            self.assertEqual([doc.document_id for doc in reader.iter_documents(path=None)], [doc_id])
+
+            with self.assertRaises(sqlite3.OperationalError):
+                reader.conn.execute('DELETE FROM documents')
+
+        with self.storage.read_only() as first, self.storage.read_only() as second:
+            self.assertIsNot(first.conn, second.conn)
+            self.assertIsNotNone(first.get(doc_id))
+
+    def test_close_readers_while_borrowed(self):
+        doc_id = self._create_document()
+        readers = self.storage.readers
+
+        with readers.connection() as conn:
+            readers.close()
+        with self.assertRaises(sqlite3.ProgrammingError):
+            conn.execute('SELECT 1')
+
+        # Closed connections are not returned to the pool
+        with readers.connection() as other:
+            self.assertIsNot(other, conn)
+            self.assertEqual(other.execute('SELECT id FROM documents').fetchone()[0], doc_id)
+
+    def test_batch(self):
+        signals = []
+        self.storage.connect('document-added', lambda _storage, doc_id, path: signals.append(doc_id))
+
+        with self.storage.batch():
+            doc_id = self._create_document()
+            with self.storage.batch():
+                self.storage.add_folder('Folder')
+                self.storage.move(doc_id, '/Folder')
+            self.assertEqual(signals, [])
+            self.assertTrue(self.storage.conn.in_transaction)
+
+        self.assertFalse(self.storage.conn.in_transaction)
+        self.assertEqual(signals, [doc_id])
+        self.assertEqual(self.storage.get(doc_id).folder, '/Folder')
+
+    def test_batch_rollback(self):
+        with self.assertRaises(RuntimeError):
+            with self.storage.batch():
+                self._create_document()
+                self.storage.add_folder('Folder')
+                raise RuntimeError()
+
+        self.assertEqual(self.storage.count_all('/'), 0)
+        self.assertIsNone(self.storage.folder_tree.get('/Folder'))
+
+    def test_batch_rollback_keeps_other_threads_changes(self):
+        results = []
+        thread = threading.Thread(target=lambda: results.append(self._create_document('/other')))
+
+        with self.assertRaises(RuntimeError):
+            with self.storage.batch():
+                self._create_document()
+                thread.start()
+                # The other thread waits for the batch instead of writing into it
+                thread.join(0.2)
+                self.assertTrue(thread.is_alive())
+                raise RuntimeError()
+
+        thread.join(5)
+        self.assertEqual(self.storage.count_all('/'), 0)
+        self.assertEqual([doc.document_id for doc in self.storage.iter_documents(path='/other')], results)
+
+    def test_add_many(self):
+        signals = []
+        self.storage.connect('document-added', lambda *args: signals.append('document-added'))
+        self.storage.connect('bulk-changed', lambda *args: signals.append('bulk-changed'))
+
+        documents = [Document(f'Document {i}', 'Content', '/') for i in range(Storage.BATCH_SIGNALS_LIMIT + 1)]
+        doc_ids = self.storage.add_many(documents)
+
+        self.assertEqual(len(doc_ids), len(documents))
+        self.assertEqual(self.storage.count_documents('/'), len(documents))
+        self.assertEqual(signals, ['bulk-changed'])
+
+    def test_folder_queries_use_indexes(self):
+        self.storage.add_folder('Folder')
+        self._create_document('/Folder')
+
+        statements = []
+        self.storage.conn.set_trace_callback(statements.append)
+
+        self.storage.count_all('/Folder')
+        self.storage.count_documents('/Folder', with_archived=True)
+        self.storage.get_folders('/Folder')
+        self.storage.list_documents('/Folder')
+        self.storage.list_documents('/Folder', desc=True)
+        self.storage.page_documents('/Folder', after_id=1, limit=10)
+
+        self.storage.conn.set_trace_callback(None)
+
+        self.assertTrue(statements)
+        for statement in statements:
+            plan = self.storage.conn.execute(f'EXPLAIN QUERY PLAN {statement}').fetchall()
+            details = [row[-1] for row in plan]
+            with self.subTest(statement=statement):
+                scans = [detail for detail in details if detail.startswith('SCAN') and detail != 'SCAN CONSTANT ROW']
+                self.assertFalse(scans, details)
+                self.assertTrue([detail for detail in details if 'INDEX' in detail], details)
+
+    def test_delete_folder_keeps_siblings(self):
+        folder_id = self.storage.add_folder('a')
+        self.storage.add_folder('ab')
+        self._create_document('/a')
+        sibling_doc_id = self._create_document('/ab')
+
+        self.storage.delete_folder(self.storage.get_folder(folder_id))
+
+        self.assertEqual([folder.title for folder in self.storage.get_folders('/')], ['ab'])
+        self.assertIsNotNone(self.storage.get(sibling_doc_id))
+
+    def test_rename_folder(self):
+        folder_id = self.storage.add_folder('a')
+        self.storage.add_folder('b', '/a')
+        self.storage.add_folder('ab')
+        doc_id = self._create_document('/a/b')
+        sibling_doc_id = self._create_document('/ab')
+
+        self.assertTrue(self.storage.rename_folder(self.storage.get_folder(folder_id), 'c'))
+
+        self.assertEqual([folder.title for folder in self.storage.get_folders('/c')], ['b'])
+        self.assertEqual(self.storage.get(doc_id).folder, '/c/b')
+        self.assertEqual(self.storage.get(sibling_doc_id).folder, '/ab')
+        self.assertIsNotNone(self.storage.folder_tree.get('/c/b'))
+        self.assertIsNone(self.storage.folder_tree.get('/a/b'))
+
+    def test_move_folder(self):
+        folder_id = self.storage.add_folder('a')
+        self.storage.add_folder('b', '/a')
+        target_id = self.storage.add_folder('target')
+        doc_id = self._create_document('/a/b')
+
+        self.assertTrue(self.storage.move_folder(self.storage.get_folder(folder_id), '/target'))
+
+        self.assertEqual(self.storage.get(doc_id).folder, '/target/a/b')
+        self.assertEqual(self.storage.folder_tree.get('/target/a').parent_id, target_id)
+        self.assertEqual(self.storage.count_subtree('/target'), (2, 1))
+
+    def test_move_folder_into_itself(self):
+        folder_id = self.storage.add_folder('a')
+        self.storage.add_folder('b', '/a')
+
+        self.assertFalse(self.storage.move_folder(self.storage.get_folder(folder_id), '/a/b'))
+        self.assertEqual([folder.title for folder in self.storage.get_folders('/')], ['a'])
+
+    def test_delete_nested_folders(self):
+        folder_id = self.storage.add_folder('a')
+        self.storage.add_folder('b', '/a')
+        doc_id = self._create_document('/a/b')
+
+        self.assertTrue(self.storage.delete_folder(self.storage.get_folder(folder_id)))
+
+        self.assertIsNone(self.storage.get(doc_id))
+        self.assertEqual(self.storage.count_subtree('/'), (0, 0))
+        self.storage.invalidate_folder_tree()
+        self.assertEqual(self.storage.folder_tree.nodes, {})
+
+    def test_change_signals(self):
+        events = []
+        for signal in ('document-added', 'document-updated', 'document-moved', 'document-deleted',
+                       'folder-added', 'folder-moved', 'folder-deleted'):
+            self.storage.connect(signal, lambda storage, *args, name=signal: events.append((name, *args)))
+
+        doc_id = self._create_document()
+        self.storage.update(doc_id, {'title': 'Updated title'})
+        folder_id = self.storage.add_folder('a')
+        self.storage.move(doc_id, '/a')
+        self.storage.rename_folder(self.storage.get_folder(folder_id), 'b')
+        self.storage.delete(doc_id)
+        self.storage.delete_folder(self.storage.get_folder(folder_id))
+
+        self.assertEqual(events, [
+            ('document-added', doc_id, '/'),
+            ('document-updated', doc_id),
+            ('folder-added', '/a'),
+            ('document-moved', doc_id, '/a'),
+            ('folder-moved', '/a', '/b'),
+            ('document-deleted', doc_id),
+            ('folder-deleted', '/b'),
+        ])
@@ -0,0 +1,76 @@
+import os
+import tempfile
+from unittest import TestCase, skipIf
+
+try:
+    from gi.repository.GdkPixbuf import Pixbuf, Colorspace
+    from norka.services.thumbnail_cache import ThumbnailCache
+except ImportError:
+    ThumbnailCache = None
+
+
+@skipIf(ThumbnailCache is None, 'GdkPixbuf is not available')
+class ThumbnailCacheTests(TestCase):
+
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.rendered = []
+
+    def _render(self, text: str):
+        self.rendered.append(text)
+        pixbuf = Pixbuf.new(Colorspace.RGB, False, 8, 4, 4)
+        pixbuf.fill(0x336699ff)
+        return pixbuf
+
+    def _cache(self, capacity: int = 512):
+        return ThumbnailCache(self._render, capacity=capacity, cache_dir=self.tmp_dir.name)
+
+    def test_memory_hit_and_miss(self):
+        cache = self._cache()
+        thumbnail = object()
+
+        self.assertIsNone(cache.peek(1, 'text'))
+        cache.put(1, 'text', thumbnail)
+        self.assertIs(cache.peek(1, 'text'), thumbnail)
+        # Changed text misses
+        self.assertIsNone(cache.peek(1, 'changed text'))
+        self.assertIsNone(cache.peek(2, 'text'))
+
+    def test_eviction_order(self):
+        cache = self._cache(capacity=2)
+        cache.put(1, 'first', 'first')
+        cache.put(2, 'second', 'second')
+
+        # Peeking makes the first one the most recently used
+        self.assertEqual(cache.peek(1, 'first'), 'first')
+        cache.put(3, 'third', 'third')
+
+        self.assertIsNone(cache.peek(2, 'second'))
+        self.assertEqual(cache.peek(1, 'first'), 'first')
+        self.assertEqual(cache.peek(3, 'third'), 'third')
+
+    def test_disk_round_trip(self):
+        pixbuf = self._cache().load_or_render(1, 'text')
+        self.assertEqual(self.rendered, ['text'])
+        self.assertTrue(os.path.exists(os.path.join(self.tmp_dir.name, '1', ThumbnailCache.key('text') + '.png')))
+
+        # Another cache instance, e.g. after restart, loads the file instead of rendering
+        loaded = self._cache().get(1, 'text')
+        self.assertEqual(self.rendered, ['text'])
+        self.assertEqual((loaded.get_width(), loaded.get_height()), (pixbuf.get_width(), pixbuf.get_height()))
+
+        # Only the latest thumbnail of the document is kept on disk
+        self._cache().load_or_render(1, 'changed')
+        self.assertEqual(os.listdir(os.path.join(self.tmp_dir.name, '1')), [ThumbnailCache.key('changed') + '.png'])
+
+    def test_invalidate(self):
+        cache = self._cache()
+        cache.get(1, 'text')
+
+        cache.invalidate(1)
+
+        self.assertIsNone(cache.peek(1, 'text'))
+        self.assertFalse(os.path.exists(os.path.join(self.tmp_dir.name, '1')))
+        cache.get(1, 'text')
+        self.assertEqual(self.rendered, ['text', 'text'])